@@ -1,43 +1,69 @@
 import os
+import asyncio
 from typing_extensions import TypedDict
 from typing import Annotated, List, Literal
 
 # Correção dos imports
 from langchain_core.messages import BaseMessage, ToolMessage, HumanMessage
-from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import StructuredTool
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode
 
+from bm25 import HYBRID_FETCH_K, HYBRID_SEARCH, hybrid_merge, keyword_search_for
+from llm_client import create_chat_model
+from retrieval_cache import get_retrieval_cache
+
 class AgentState(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
 
 class AgentPolicy:
     """Define a política do agente, incluindo o modelo, ferramentas e fluxo de trabalho."""
-    def __init__(self, retriever):
-        self.llm = ChatOpenAI(
-            model_name='google/gemma-3-12b',
-            openai_api_base="http://172.30.64.1:1234/v1",
-            openai_api_key="lm-studio",
-            temperature=0.0
-        )
+    def __init__(self, retriever, index_id: str = None):
+        # Cliente HTTP compartilhado entre as sessões (pool de conexões keep-alive)
+        self.llm = create_chat_model(temperature=0.0)
         
         self.retriever = retriever
+        # Consultas repetidas ao mesmo índice (hash do PDF) reaproveitam embedding e busca
+        self.index_id = index_id
+        self.retrieval_cache = get_retrieval_cache()
+        # Termos exatos (códigos de norma, nomes de sistemas) que o embedding não distingue vêm da BM25
+        self.keyword_search = keyword_search_for(retriever.vectorstore) if HYBRID_SEARCH else None
         self.tools = [self.build_rag_tool()]
         self.model_with_tools = self.llm.bind_tools(self.tools)
         self.graph = self.build_graph()
 
     def build_rag_tool(self):
         """Define a ferramenta de RAG para consulta das políticas de segurança."""
-        @tool
         def check_security_policy(query: str) -> str:
             """Consulta as políticas de segurança da empresa."""
-            results = self.retriever.invoke(query)
-            if not results:
-                return "Nenhum resultado encontrado."
-            return "\n\n".join([doc.page_content for doc in results])
-        return check_security_policy
+            return self.format_results(self.search(query))
+
+        async def acheck_security_policy(query: str) -> str:
+            # Embedding e buscas usam a CPU: fora do event loop
+            return self.format_results(await asyncio.to_thread(self.search, query))
+
+        # Com `coroutine`, o ToolNode usa a versão assíncrona quando o grafo roda com ainvoke
+        return StructuredTool.from_function(func=check_security_policy, coroutine=acheck_security_policy)
+
+    def search(self, query: str) -> list:
+        """Busca vetorial, fundida por RRF com a busca BM25 quando a busca híbrida está ativa."""
+        vectorstore = self.retriever.vectorstore
+        search_kwargs = self.retriever.search_kwargs
+        if self.keyword_search is None:
+            return self.retrieval_cache.search(self.index_id, vectorstore, query, search_kwargs)
+
+        k = search_kwargs.get('k', 4)
+        fetch_k = max(k, HYBRID_FETCH_K)
+        vector_docs = self.retrieval_cache.search(self.index_id, vectorstore, query, {**search_kwargs, 'k': fetch_k})
+        return hybrid_merge(vector_docs, self.keyword_search(query, fetch_k), k)
+
+    @staticmethod
+    def format_results(results) -> str:
+        if not results:
+            return "Nenhum resultado encontrado."
+        return "\n\n".join([doc.page_content for doc in results])
     
     def should_continue(self, state: AgentState) -> Literal["tools", END]:
         """Determina se o agente deve chamar uma ferramenta ou encerrar a conversa."""
@@ -50,10 +76,15 @@ class AgentPolicy:
         response = self.model_with_tools.invoke(state['messages'])
         return {"messages": [response]}
 
+    async def acall_model(self, state: AgentState):
+        response = await self.model_with_tools.ainvoke(state['messages'])
+        return {"messages": [response]}
+
     def build_graph(self):
         workflow = StateGraph(AgentState)
         
-        workflow.add_node("agent", self.call_model)
+        # invoke usa call_model e ainvoke usa acall_model, sem prender uma thread durante a chamada ao LLM
+        workflow.add_node("agent", RunnableLambda(self.call_model, afunc=self.acall_model, name="agent"))
         workflow.add_node("tools", ToolNode(self.tools))
         
         workflow.set_entry_point("agent")
@@ -62,5 +93,5 @@ class AgentPolicy:
         
         return workflow.compile()
 
-def create_agent(retriever):
-    return AgentPolicy(retriever).graph
\ No newline at end of file
+def create_agent(retriever, index_id: str = None):
+    return AgentPolicy(retriever, index_id=index_id).graph
\ No newline at end of file
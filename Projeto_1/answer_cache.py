@@ -0,0 +1,152 @@
+import os
+import time
+import itertools
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class CachedAnswer:
+    """Resposta armazenada para uma pergunta sobre um documento."""
+
+    __slots__ = ('doc_hash', 'question', 'vector', 'answer', 'latency', 'created_at', 'hits')
+
+    def __init__(self, doc_hash: str, question: str, vector: np.ndarray, answer: str, latency: float):
+        self.doc_hash = doc_hash
+        self.question = question
+        self.vector = vector
+        self.answer = answer
+        self.latency = latency
+        self.created_at = time.time()
+        self.hits = 0
+
+
+class AnswerCache:
+    """Cache semântico de respostas do chat por documento.
+
+    A chave é o hash do PDF e o embedding normalizado da pergunta: uma
+    pergunta nova reaproveita a resposta de outra sobre o mesmo documento
+    quando a similaridade de cosseno atinge `threshold`. As entradas de
+    todos os documentos dividem um limite de quantidade com evicção LRU.
+    O cache vale por processo; cada worker mantém o seu.
+    """
+
+    def __init__(self, embeddings, threshold: float = None, max_entries: int = None, enabled: bool = None):
+        self.embeddings = embeddings
+        self.threshold = threshold if threshold is not None else float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.92))
+        self.max_entries = max_entries if max_entries is not None else int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 1000))
+        self.enabled = enabled if enabled is not None else os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+
+        self._entries = OrderedDict()
+        self._by_doc = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        # A mesma pergunta é embedada na consulta e de novo ao salvar a resposta
+        self._embed = lru_cache(maxsize=256)(self._embed_question)
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.saved_seconds = 0.0
+
+    def _embed_question(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _normalize(question: str) -> str:
+        return " ".join(question.lower().split())
+
+    def lookup(self, doc_hash: str, question: str, bypass: bool = False):
+        """Retorna (resposta, similaridade) da pergunta mais parecida acima do limiar, ou None."""
+        if not self.enabled or not doc_hash:
+            return None
+        if bypass:
+            with self._lock:
+                self.bypassed += 1
+            return None
+
+        vector = self._embed(self._normalize(question))
+        with self._lock:
+            entries = list(self._by_doc.get(doc_hash, {}).items())
+            if entries:
+                similarities = np.stack([entry.vector for _, entry in entries]) @ vector
+                best = int(np.argmax(similarities))
+                similarity = float(similarities[best])
+            if not entries or similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id, entry = entries[best]
+            self._entries.move_to_end(entry_id)
+            entry.hits += 1
+            self.hits += 1
+            self.saved_seconds += entry.latency
+
+        logger.info(f"Resposta do cache para '{question}' (similar a '{entry.question}', {similarity:.3f})")
+        return entry.answer, similarity
+
+    def store(self, doc_hash: str, question: str, answer: str, latency: float):
+        """Guarda a resposta gerada pelo agente e o tempo que ela custou."""
+        if not self.enabled or not doc_hash or not answer:
+            return
+
+        vector = self._embed(self._normalize(question))
+        with self._lock:
+            # Uma resposta nova (ex.: após bypass) substitui a de perguntas equivalentes
+            for entry_id, entry in list(self._by_doc.get(doc_hash, {}).items()):
+                if float(entry.vector @ vector) >= self.threshold:
+                    self._remove(entry_id)
+
+            entry_id = next(self._ids)
+            self._entries[entry_id] = CachedAnswer(doc_hash, question, vector, answer, latency)
+            self._by_doc.setdefault(doc_hash, {})[entry_id] = self._entries[entry_id]
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, doc_hash: str = None) -> int:
+        """Remove as respostas de um documento, ou de todos, e retorna quantas foram removidas."""
+        with self._lock:
+            if doc_hash is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._by_doc.clear()
+            else:
+                entry_ids = list(self._by_doc.get(doc_hash, {}))
+                for entry_id in entry_ids:
+                    self._remove(entry_id)
+                removed = len(entry_ids)
+
+        logger.info(f"Cache de respostas invalidado ({doc_hash[:12] if doc_hash else 'todos'}): {removed} entradas")
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'documents': len(self._by_doc),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'saved_seconds': round(self.saved_seconds, 2),
+            }
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        doc_entries = self._by_doc[entry.doc_hash]
+        del doc_entries[entry_id]
+        if not doc_entries:
+            del self._by_doc[entry.doc_hash]
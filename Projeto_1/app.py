@@ -1,12 +1,26 @@
 import os
-from flask import Flask, render_template, request, jsonify, session
+import sys
+import hmac
+import time
+import threading
+from flask import Flask, Response, render_template, request, jsonify, session, stream_with_context
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import uuid
 from langchain_core.messages import HumanMessage
 
 from rag import RAG
+from corpus import Corpus
+from index_cache import IndexCache
+from ingestion import IngestionQueue, QueueFullError
+from sessions import SessionManager
+from session_backend import create_session_backend
+from embeddings import get_embeddings, warmup_embeddings
+from answer_cache import AnswerCache
+from retrieval_cache import get_retrieval_cache
+from llm_gateway import get_gateway
 from agentes_ia import create_agent
+from streaming import ChatStream, SSE_HEADERS, sse
 from log import get_logger
 
 logger = get_logger(__name__)
@@ -14,13 +28,93 @@ logger = get_logger(__name__)
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_UPLOAD_MB'] = int(os.environ.get('MAX_UPLOAD_MB', 16))
+app.config['MAX_CONTENT_LENGTH'] = app.config['MAX_UPLOAD_MB'] * 1024 * 1024
 app.config['ALLOWED_EXTENSIONS'] = {'pdf'}
+app.config['INGESTION_STREAMING'] = os.environ.get('INGESTION_STREAMING', 'false').lower() == 'true'
+app.config['PDF_PARSE_WORKERS'] = int(os.environ.get('PDF_PARSE_WORKERS', 1))
+# Corpus compartilhado: cada PDF é indexado uma vez e as sessões selecionam documentos dele
+app.config['CORPUS_MODE'] = os.environ.get('CORPUS_MODE', 'false').lower() == 'true'
 
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Criados por init_services(), nunca na importação: os processos de parsing e as
+# ferramentas que importam este módulo não carregam o modelo, o corpus nem o backend
+session_backend = None
+corpus = None
+sessions = None
+index_cache = None
+answer_cache = None
+retrieval_cache = None
+ingestion_queue = None
+services_lock = threading.Lock()
 
-agents = {}
-chat_histories = {}
+
+def init_services():
+    """Inicializa os serviços do app uma única vez por processo."""
+    global session_backend, corpus, sessions, index_cache, answer_cache, retrieval_cache, ingestion_queue
+    if ingestion_queue is not None:
+        return
+    with services_lock:
+        if ingestion_queue is not None:
+            return
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        session_backend = create_session_backend()
+        corpus = Corpus() if app.config['CORPUS_MODE'] else None
+        sessions = SessionManager(create_agent, backend=session_backend, corpus=corpus)
+        index_cache = IndexCache()
+        answer_cache = AnswerCache(get_embeddings())
+        retrieval_cache = get_retrieval_cache()
+        # Carrega o modelo de embeddings uma única vez, antes das primeiras requisições
+        warmup_embeddings()
+        # Por último: marca os serviços como prontos
+        ingestion_queue = IngestionQueue(ingest_pdf, backend=session_backend)
+
+
+def create_app():
+    """Inicializa os serviços e retorna o app Flask (ex.: `gunicorn 'app:create_app()'`)."""
+    init_services()
+    return app
+
+
+@app.before_request
+def ensure_services():
+    # Servidores que importam `app:app` diretamente inicializam na primeira requisição
+    init_services()
+
+
+def ingest_pdf(job):
+    """Constrói o índice do PDF e registra o agente da sessão quando estiver pronto."""
+    if corpus is not None:
+        doc_id = corpus.add_pdf(
+            job.filepath, job.filename, progress=job.update_progress, parse_workers=app.config['PDF_PARSE_WORKERS']
+        )
+        sessions.add_documents(job.session_id, [doc_id], filename=job.filename)
+        logger.info(f"Agente criado para sessão {job.session_id} sobre o documento {doc_id[:12]} do corpus")
+        return
+
+    rag = RAG(
+        job.filepath,
+        index_cache=index_cache,
+        progress=job.update_progress,
+        streaming=app.config['INGESTION_STREAMING'],
+        parse_workers=app.config['PDF_PARSE_WORKERS'],
+    )
+    if rag.retriever is None:
+        raise ValueError('Erro ao processar o PDF')
+
+    sessions.add(job.session_id, rag.retriever, filename=job.filename, doc_hash=rag.doc_hash)
+    logger.info(f"Agente criado para sessão: {job.session_id}")
+
+
+def resolve_chat_session(session_id, job_id):
+    """Retorna (sessão, None) ou (None, (mensagem de erro, status HTTP)) para o chat."""
+    chat_session = sessions.get(session_id) if session_id else None
+    if chat_session is not None:
+        return chat_session, None
+
+    job = ingestion_queue.status(job_id or '')
+    if job is not None and job['status'] in ('queued', 'processing'):
+        return None, ('O documento ainda está sendo processado. Aguarde alguns instantes.', 409)
+    return None, ('Nenhum documento carregado. Por favor, faça upload de um PDF primeiro.', 400)
 
 
 def allowed_file(filename):
@@ -29,15 +123,29 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
 
+def check_admin_token():
+    """Retorna a resposta de erro se a requisição não traz o `ADMIN_TOKEN`, ou None se autorizada.
+
+    Sem `ADMIN_TOKEN` configurado as operações administrativas ficam desativadas.
+    """
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if not admin_token:
+        return jsonify({'error': 'Operação administrativa desativada: defina ADMIN_TOKEN'}), 403
+    provided = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(provided.encode(), admin_token.encode()):
+        return jsonify({'error': 'Não autorizado'}), 401
+    return None
+
+
 @app.route('/')
 def index():
     """Renderiza a página principal."""
-    return render_template('index.html')
+    return render_template('index.html', max_upload_mb=app.config['MAX_UPLOAD_MB'])
 
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    """Endpoint para upload de PDF e inicialização do agente RAG."""
+    """Endpoint para upload de PDF; a ingestão roda em segundo plano e retorna um job."""
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'Nenhum arquivo enviado'}), 400
@@ -62,30 +170,72 @@ def upload_file():
         
         logger.info(f"Arquivo salvo: {filepath}")
         
-        rag = RAG(filepath)
-        if rag.retriever is None:
-            return jsonify({'error': 'Erro ao processar o PDF'}), 500
-        
-        agent = create_agent(rag.retriever)
-        
-        # Armazenar agente e inicializar histórico
-        agents[session_id] = agent
-        chat_histories[session_id] = []
-        
-        logger.info(f"Agente criado para sessão: {session_id}")
+        job = ingestion_queue.submit(session_id, filepath, filename)
+        session['job_id'] = job.job_id
         
         return jsonify({
             'success': True,
             'session_id': session_id,
+            'job_id': job.job_id,
             'filename': filename,
-            'message': 'PDF processado com sucesso! Você pode começar a fazer perguntas.'
-        })
+            'message': 'PDF recebido. O processamento foi iniciado.'
+        }), 202
+    
+    except QueueFullError:
+        return jsonify({'error': 'Servidor ocupado processando outros documentos. Tente novamente em instantes.'}), 503
     
     except Exception as e:
         logger.error(f"Erro no upload: {str(e)}", exc_info=True)
         return jsonify({'error': f'Erro ao processar arquivo: {str(e)}'}), 500
 
 
+@app.route('/api/upload/<job_id>/status', methods=['GET'])
+def upload_status(job_id):
+    """Endpoint para consultar o progresso de um job de ingestão."""
+    job = ingestion_queue.status(job_id)
+    
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    
+    # O job_id na URL não autoriza acesso à sessão: o session_id fica só no cookie de quem enviou o PDF
+    job.pop('session_id', None)
+    return jsonify({'success': True, **job})
+
+
+@app.route('/api/corpus', methods=['GET'])
+def list_corpus():
+    """Endpoint com os documentos do corpus compartilhado."""
+    if corpus is None:
+        return jsonify({'error': 'Modo corpus desativado (CORPUS_MODE=false)'}), 404
+    
+    return jsonify({'success': True, 'documents': corpus.list_documents(), 'stats': corpus.stats()})
+
+
+@app.route('/api/corpus/select', methods=['POST'])
+def select_corpus_documents():
+    """Endpoint para conversar sobre um subconjunto de documentos do corpus."""
+    if corpus is None:
+        return jsonify({'error': 'Modo corpus desativado (CORPUS_MODE=false)'}), 404
+    
+    data = request.get_json(silent=True)
+    doc_ids = data.get('doc_ids') if isinstance(data, dict) else None
+    if not doc_ids or not isinstance(doc_ids, list) or not all(isinstance(doc_id, str) for doc_id in doc_ids):
+        return jsonify({'error': '"doc_ids" deve ser uma lista de ids (strings)'}), 400
+    
+    try:
+        session_id = session.get('session_id') or str(uuid.uuid4())
+        filename = ", ".join(corpus.documents[doc_id]['filename'] for doc_id in doc_ids if doc_id in corpus.documents)
+        sessions.add_documents(session_id, doc_ids, filename=filename)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    
+    session['session_id'] = session_id
+    session.pop('job_id', None)
+    logger.info(f"Sessão {session_id} selecionou {len(doc_ids)} documentos do corpus")
+    
+    return jsonify({'success': True, 'session_id': session_id, 'doc_ids': doc_ids})
+
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Endpoint para processar mensagens do chat."""
@@ -96,18 +246,19 @@ def chat():
             return jsonify({'error': 'Mensagem não fornecida'}), 400
         
         session_id = session.get('session_id')
+        chat_session, error = resolve_chat_session(session_id, session.get('job_id'))
         
-        if not session_id or session_id not in agents:
-            return jsonify({'error': 'Nenhum documento carregado. Por favor, faça upload de um PDF primeiro.'}), 400
+        if chat_session is None:
+            message, status = error
+            return jsonify({'error': message}), status
         
         user_message = data['message']
         
-        # Obter agente e histórico
-        agent = agents[session_id]
-        history = chat_histories[session_id]
+        # Obter agente da sessão (reconstruído do backend se necessário)
+        agent = chat_session.agent
         
         # Adicionar mensagem do usuário ao histórico
-        history.append({
+        sessions.append_message(session_id, {
             'role': 'user',
             'content': user_message,
             'timestamp': datetime.now().isoformat()
@@ -115,16 +266,24 @@ def chat():
         
         logger.info(f"Processando mensagem da sessão {session_id}: {user_message}")
         
-        # Processar com o agente      
-        result = agent.invoke({
-            "messages": [HumanMessage(content=user_message)]
-        })
+        # Perguntas equivalentes sobre o mesmo documento reaproveitam a resposta
+        cached = answer_cache.lookup(chat_session.doc_hash, user_message, bypass=data.get('cache') is False)
         
-        # Extrair resposta
-        assistant_message = result['messages'][-1].content
+        if cached is not None:
+            assistant_message, _ = cached
+        else:
+            # Processar com o agente
+            start = time.perf_counter()
+            result = agent.invoke({
+                "messages": [HumanMessage(content=user_message)]
+            })
+            
+            # Extrair resposta
+            assistant_message = result['messages'][-1].content
+            answer_cache.store(chat_session.doc_hash, user_message, assistant_message, time.perf_counter() - start)
         
         # Adicionar resposta ao histórico
-        history.append({
+        sessions.append_message(session_id, {
             'role': 'assistant',
             'content': assistant_message,
             'timestamp': datetime.now().isoformat()
@@ -134,7 +293,8 @@ def chat():
         
         return jsonify({
             'success': True,
-            'response': assistant_message
+            'response': assistant_message,
+            'cached': cached is not None
         })
     
     except Exception as e:
@@ -142,18 +302,68 @@ def chat():
         return jsonify({'error': f'Erro ao processar mensagem: {str(e)}'}), 500
 
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Endpoint de chat com a resposta enviada token a token via Server-Sent Events."""
+    data = request.get_json(silent=True)
+    
+    if not data or 'message' not in data:
+        return jsonify({'error': 'Mensagem não fornecida'}), 400
+    
+    session_id = session.get('session_id')
+    chat_session, error = resolve_chat_session(session_id, session.get('job_id'))
+    
+    if chat_session is None:
+        message, status = error
+        return jsonify({'error': message}), status
+    
+    user_message = data['message']
+    sessions.append_message(session_id, {
+        'role': 'user',
+        'content': user_message,
+        'timestamp': datetime.now().isoformat()
+    })
+    
+    logger.info(f"Processando mensagem em streaming da sessão {session_id}: {user_message}")
+    
+    def generate():
+        stream = ChatStream(session_id)
+        cached = answer_cache.lookup(chat_session.doc_hash, user_message, bypass=data.get('cache') is False)
+        
+        if cached is not None:
+            yield from stream.replay(cached[0])
+        else:
+            try:
+                for chunk, metadata in chat_session.agent.stream(ChatStream.inputs(user_message), stream_mode="messages"):
+                    yield from stream.events(chunk, metadata)
+            except Exception as e:
+                logger.error(f"Erro no chat em streaming: {str(e)}", exc_info=True)
+                yield sse('error', {'error': f'Erro ao processar mensagem: {str(e)}'})
+                return
+            answer_cache.store(chat_session.doc_hash, user_message, stream.response, stream.elapsed)
+        
+        sessions.append_message(session_id, {
+            'role': 'assistant',
+            'content': stream.response,
+            'timestamp': datetime.now().isoformat()
+        })
+        yield stream.done(cached=cached is not None)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
 @app.route('/api/history', methods=['GET'])
 def get_history():
     """Endpoint para obter o histórico de chat."""
     try:
         session_id = session.get('session_id')
         
-        if not session_id or session_id not in chat_histories:
+        if not session_id:
             return jsonify({'history': []})
         
         return jsonify({
             'success': True,
-            'history': chat_histories[session_id]
+            'history': sessions.history(session_id)
         })
     
     except Exception as e:
@@ -169,9 +379,9 @@ def clear_session():
         
         if session_id:
             # Remover agente e histórico
-            agents.pop(session_id, None)
-            chat_histories.pop(session_id, None)
+            sessions.remove(session_id)
             session.pop('session_id', None)
+            session.pop('job_id', None)
             
             logger.info(f"Sessão limpa: {session_id}")
         
@@ -185,11 +395,50 @@ def clear_session():
         return jsonify({'error': 'Erro ao limpar sessão'}), 500
 
 
+@app.route('/api/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    """Endpoint para descartar as respostas e buscas em cache do documento da sessão (ou de todos, com `all`)."""
+    denied = check_admin_token()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    
+    if data.get('all'):
+        removed = answer_cache.invalidate()
+        searches = retrieval_cache.invalidate()
+    else:
+        doc_hash = data.get('doc_hash')
+        if not doc_hash:
+            chat_session = sessions.get(session['session_id']) if session.get('session_id') else None
+            if chat_session is None:
+                return jsonify({'error': 'Nenhum documento carregado. Informe o doc_hash.'}), 400
+            doc_hash = chat_session.doc_hash
+        removed = answer_cache.invalidate(doc_hash)
+        searches = retrieval_cache.invalidate(doc_hash)
+    
+    return jsonify({'success': True, 'removed': removed, 'removed_searches': searches})
+
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Endpoint com o uso estimado de memória das sessões ativas e as métricas dos caches e do LLM."""
+    stats = {
+        **sessions.stats(),
+        'answer_cache': answer_cache.stats(),
+        'retrieval_cache': retrieval_cache.stats(),
+        'llm_gateway': get_gateway().stats(),
+    }
+    if corpus is not None:
+        stats['corpus'] = corpus.stats()
+    return jsonify(stats)
+
+
 @app.errorhandler(413)
 def request_entity_too_large(error):
     """Handler para arquivos muito grandes."""
-    return jsonify({'error': 'Arquivo muito grande. Tamanho máximo: 16MB'}), 413
+    return jsonify({'error': f"Arquivo muito grande. Tamanho máximo: {app.config['MAX_UPLOAD_MB']}MB"}), 413
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Os processos de parsing ("spawn") reexecutariam este arquivo como script principal
+    sys.exit("Inicie o servidor com `python run.py` (ou `gunicorn 'app:create_app()'`)")
@@ -0,0 +1,168 @@
+"""Modo de execução assíncrono (ASGI).
+
+A rota de chat, que passa a maior parte do tempo esperando o LLM, roda em
+Quart com `ainvoke`: enquanto o LM Studio gera a resposta, o event loop atende
+outras requisições em vez de prender uma thread por chat. As demais rotas
+continuam no app Flask, servido pelo mesmo processo via adaptador WSGI, e
+compartilham as sessões, a fila de ingestão e o cookie de sessão.
+
+Uso (a partir de Projeto_1/):
+    hypercorn asgi:application --bind 0.0.0.0:5000
+"""
+import time
+import asyncio
+from datetime import datetime
+
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart, request, jsonify, session
+from langchain_core.messages import HumanMessage
+
+import app as flask_module
+from app import resolve_chat_session
+from streaming import ChatStream, SSE_HEADERS, sse
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# O hypercorn importa este módulo em cada worker: os serviços são criados aqui
+flask_app = flask_module.create_app()
+sessions = flask_module.sessions
+answer_cache = flask_module.answer_cache
+
+quart_app = Quart(__name__)
+# Mesma chave e nome de cookie do Flask: a sessão criada no upload vale aqui
+quart_app.config['SECRET_KEY'] = flask_app.config['SECRET_KEY']
+quart_app.config['SESSION_COOKIE_NAME'] = flask_app.config['SESSION_COOKIE_NAME']
+# O padrão de 60s cortaria respostas em streaming longas; o limite fica com o LLM_TIMEOUT
+quart_app.config['RESPONSE_TIMEOUT'] = None
+
+ASYNC_ROUTES = {'/api/chat', '/api/chat/stream'}
+
+
+@quart_app.route('/api/chat', methods=['POST'])
+async def chat():
+    """Endpoint assíncrono para processar mensagens do chat."""
+    try:
+        data = await request.get_json()
+
+        if not data or 'message' not in data:
+            return jsonify({'error': 'Mensagem não fornecida'}), 400
+
+        session_id = session.get('session_id')
+        # Pode reconstruir o índice do disco: fora do event loop
+        chat_session, error = await asyncio.to_thread(resolve_chat_session, session_id, session.get('job_id'))
+
+        if chat_session is None:
+            message, status = error
+            return jsonify({'error': message}), status
+
+        user_message = data['message']
+
+        sessions.append_message(session_id, {
+            'role': 'user',
+            'content': user_message,
+            'timestamp': datetime.now().isoformat()
+        })
+
+        logger.info(f"Processando mensagem da sessão {session_id}: {user_message}")
+
+        # O embedding da pergunta usa a CPU: fora do event loop
+        cached = await asyncio.to_thread(
+            answer_cache.lookup, chat_session.doc_hash, user_message, bypass=data.get('cache') is False
+        )
+
+        if cached is not None:
+            assistant_message, _ = cached
+        else:
+            start = time.perf_counter()
+            result = await chat_session.agent.ainvoke({
+                "messages": [HumanMessage(content=user_message)]
+            })
+
+            assistant_message = result['messages'][-1].content
+            await asyncio.to_thread(
+                answer_cache.store, chat_session.doc_hash, user_message, assistant_message, time.perf_counter() - start
+            )
+
+        sessions.append_message(session_id, {
+            'role': 'assistant',
+            'content': assistant_message,
+            'timestamp': datetime.now().isoformat()
+        })
+
+        logger.info(f"Resposta gerada para sessão {session_id}")
+
+        return jsonify({
+            'success': True,
+            'response': assistant_message,
+            'cached': cached is not None
+        })
+
+    except Exception as e:
+        logger.error(f"Erro no chat: {str(e)}", exc_info=True)
+        return jsonify({'error': f'Erro ao processar mensagem: {str(e)}'}), 500
+
+
+@quart_app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Endpoint assíncrono de chat com a resposta enviada token a token via Server-Sent Events."""
+    data = await request.get_json(silent=True)
+
+    if not data or 'message' not in data:
+        return jsonify({'error': 'Mensagem não fornecida'}), 400
+
+    session_id = session.get('session_id')
+    chat_session, error = await asyncio.to_thread(resolve_chat_session, session_id, session.get('job_id'))
+
+    if chat_session is None:
+        message, status = error
+        return jsonify({'error': message}), status
+
+    user_message = data['message']
+    sessions.append_message(session_id, {
+        'role': 'user',
+        'content': user_message,
+        'timestamp': datetime.now().isoformat()
+    })
+
+    logger.info(f"Processando mensagem em streaming da sessão {session_id}: {user_message}")
+
+    async def generate():
+        stream = ChatStream(session_id)
+        cached = await asyncio.to_thread(
+            answer_cache.lookup, chat_session.doc_hash, user_message, bypass=data.get('cache') is False
+        )
+
+        if cached is not None:
+            for event in stream.replay(cached[0]):
+                yield event.encode()
+        else:
+            try:
+                async for chunk, metadata in chat_session.agent.astream(ChatStream.inputs(user_message), stream_mode="messages"):
+                    for event in stream.events(chunk, metadata):
+                        yield event.encode()
+            except Exception as e:
+                logger.error(f"Erro no chat em streaming: {str(e)}", exc_info=True)
+                yield sse('error', {'error': f'Erro ao processar mensagem: {str(e)}'}).encode()
+                return
+            await asyncio.to_thread(answer_cache.store, chat_session.doc_hash, user_message, stream.response, stream.elapsed)
+
+        sessions.append_message(session_id, {
+            'role': 'assistant',
+            'content': stream.response,
+            'timestamp': datetime.now().isoformat()
+        })
+        yield stream.done(cached=cached is not None).encode()
+
+    return generate(), 200, {'Content-Type': 'text/event-stream', **SSE_HEADERS}
+
+
+flask_asgi = WsgiToAsgi(flask_app)
+
+
+async def application(scope, receive, send):
+    """Encaminha as rotas assíncronas ao Quart e todo o resto ao Flask."""
+    if scope['type'] == 'http' and scope['path'] not in ASYNC_ROUTES:
+        await flask_asgi(scope, receive, send)
+    else:
+        await quart_app(scope, receive, send)
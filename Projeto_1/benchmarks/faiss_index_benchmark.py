@@ -0,0 +1,138 @@
+"""Benchmark de índices FAISS: recall vs. latência em relação à busca exata (flat).
+
+Constrói cada tipo de índice de `faiss_index.py` sobre os mesmos vetores e,
+para cada valor de `nprobe` (IVF) ou `efSearch` (HNSW), mede o recall@k
+contra o índice flat e a latência de consultas individuais, como as feitas
+pelo agente. Também reporta o tempo de construção e o tamanho do índice.
+
+Sem `--vectors`, gera embeddings sintéticos agrupados e normalizados, com a
+dimensão do MiniLM; com `--vectors` usa uma matriz salva com `numpy.save`
+(ex.: embeddings reais dos chunks do corpus).
+
+Uso (a partir de Projeto_1/):
+    python benchmarks/faiss_index_benchmark.py --count 1000000
+    python benchmarks/faiss_index_benchmark.py --vectors corpus.npy --types ivf hnsw
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from faiss_index import build_index, factory_string, index_config, set_search_params  # noqa: E402
+
+BLOCK = 100_000
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Vetores normalizados em torno de `clusters` centros, como embeddings de textos de poucos temas."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = np.empty((count, dim), dtype=np.float32)
+    for start in range(0, count, BLOCK):
+        end = min(start + BLOCK, count)
+        block = centers[rng.integers(0, clusters, end - start)]
+        block += 0.8 * rng.standard_normal(block.shape, dtype=np.float32)
+        vectors[start:end] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return vectors
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def search_one_by_one(index, queries: np.ndarray, k: int):
+    """Busca cada consulta isoladamente, retornando os ids e as latências em ms."""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids[i] = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return ids, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", help="Arquivo .npy com os vetores do corpus")
+    parser.add_argument("--count", type=int, default=200_000, help="Vetores sintéticos")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=4, help="Resultados por consulta (o retriever usa 4)")
+    parser.add_argument("--types", nargs="+", default=["ivf", "ivfsq", "ivfpq", "hnsw", "sq", "pq"])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--threads", type=int, default=1, help="Threads do FAISS por consulta")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+
+    if args.vectors:
+        vectors = np.ascontiguousarray(np.load(args.vectors, mmap_mode="r"), dtype=np.float32)
+    else:
+        vectors = synthetic_vectors(args.count + args.queries, args.dim, args.clusters, args.seed)
+    # As consultas ficam fora do índice, como perguntas novas sobre o corpus
+    queries, vectors = vectors[:args.queries], vectors[args.queries:]
+    count, dim = vectors.shape
+    print(f"{count} vetores de dimensão {dim}, {len(queries)} consultas, k={args.k}\n")
+
+    results = []
+
+    def run(label: str, config: dict, knobs: list):
+        start = time.perf_counter()
+        index = build_index(vectors, config)
+        build_s = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(index)) / 1024 / 1024
+        for knob, value in knobs:
+            if knob:
+                config = {**config, knob: value}
+                set_search_params(index, config)
+            ids, latencies = search_one_by_one(index, queries, args.k)
+            latencies.sort()
+            results.append({
+                'index': label,
+                'param': f"{knob}={value}" if knob else "-",
+                'build_s': build_s,
+                'size_mb': size_mb,
+                'recall': recall_at_k(ids, truth) if truth is not None else 1.0,
+                'p50_ms': statistics.median(latencies),
+                'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+            })
+            r = results[-1]
+            print(f"{r['index']:>18} {r['param']:>14}  recall@{args.k} {r['recall']:.3f}  p50 {r['p50_ms']:.3f} ms")
+        return index
+
+    # A linha de base exata define o recall dos demais
+    truth = None
+    base = {**index_config(), 'min_vectors': 0}
+    flat = run("Flat", {**base, 'type': "flat"}, [(None, None)])
+    _, truth = flat.search(queries, args.k)
+    del flat
+
+    for index_type in args.types:
+        config = {**base, 'type': index_type}
+        label = factory_string(dim, count, config)
+        if index_type.startswith("ivf"):
+            knobs = [('nprobe', n) for n in args.nprobe]
+        elif index_type == "hnsw":
+            knobs = [('ef_search', ef) for ef in args.ef_search]
+        else:
+            knobs = [(None, None)]
+        run(label, config, knobs)
+
+    print(f"\n{'índice':>18} {'parâmetro':>14} {'recall':>7} {'p50 (ms)':>9} {'p95 (ms)':>9} {'build (s)':>10} {'tamanho (MB)':>13}")
+    for r in results:
+        print(f"{r['index']:>18} {r['param']:>14} {r['recall']:>7.3f} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} "
+              f"{r['build_s']:>10.1f} {r['size_mb']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
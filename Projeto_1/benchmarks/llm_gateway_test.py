@@ -0,0 +1,156 @@
+"""Teste do gateway do LLM contra o servidor falso da OpenAI.
+
+Sobe o `mock_openai_server.py` e chama o LLM pelo `create_chat_model`, com
+os mesmos clientes HTTP do app, em três fases com `--calls` chamadas
+simultâneas cada:
+
+* concorrência: perguntas distintas; o pico de requisições simultâneas no
+  servidor não pode passar de `LLM_GATEWAY_CONCURRENCY`;
+* agrupamento: a mesma pergunta; deve chegar uma única vez ao servidor;
+* novas tentativas: perguntas distintas com `--fail-rate` das requisições
+  respondidas com 503; as chamadas devem terminar com sucesso após o backoff.
+
+Mostra a latência das chamadas e as métricas do gateway (espera na fila,
+novas tentativas, agrupadas) e termina com código 1 se alguma verificação
+falhar. Com `--sync`, as chamadas saem de threads pelo cliente síncrono.
+
+Requer `pip install hypercorn quart`.
+
+Uso (a partir de Projeto_1/):
+    python benchmarks/llm_gateway_test.py
+    LLM_GATEWAY_CONCURRENCY=8 python benchmarks/llm_gateway_test.py --calls 100 --latency 0.5 --sync
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import statistics
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+
+def mock_request(base_url: str, path: str, body: dict = None) -> dict:
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(f"{base_url}{path}", data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def wait_for_mock(base_url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            return mock_request(base_url, "/stats")
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError("Servidor falso não respondeu a tempo")
+
+
+async def run_calls(model, questions: list[str], sync: bool) -> tuple[list[float], int]:
+    """Dispara as perguntas ao mesmo tempo; retorna as latências (ms) e o número de erros.
+
+    Todas as fases rodam no mesmo event loop: o cliente assíncrono compartilhado
+    fica preso ao loop em que foi usado primeiro.
+    """
+    def timed(question):
+        start = time.perf_counter()
+        try:
+            model.invoke(question)
+            return (time.perf_counter() - start) * 1000, False
+        except Exception:
+            return (time.perf_counter() - start) * 1000, True
+
+    async def atimed(question):
+        start = time.perf_counter()
+        try:
+            await model.ainvoke(question)
+            return (time.perf_counter() - start) * 1000, False
+        except Exception:
+            return (time.perf_counter() - start) * 1000, True
+
+    def run_threads():
+        with ThreadPoolExecutor(max_workers=len(questions)) as pool:
+            return list(pool.map(timed, questions))
+
+    if sync:
+        results = await asyncio.to_thread(run_threads)
+    else:
+        results = await asyncio.gather(*(atimed(question) for question in questions))
+    return sorted(latency for latency, _ in results), sum(error for _, error in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=40, help="Chamadas simultâneas por fase")
+    parser.add_argument("--latency", type=float, default=1.0, help="Tempo de geração simulado (s)")
+    parser.add_argument("--fail-rate", type=float, default=0.2, help="Fração de 503 na fase de novas tentativas")
+    parser.add_argument("--port", type=int, default=1299)
+    parser.add_argument("--sync", action="store_true", help="Usa o cliente síncrono, com uma thread por chamada")
+    args = parser.parse_args()
+
+    mock_url = f"http://127.0.0.1:{args.port}"
+    # Lido na importação do llm_client
+    os.environ["LLM_BASE_URL"] = f"{mock_url}/v1"
+    # Com 20% de 503, a chance de uma chamada esgotar 5 novas tentativas é de 0,006%
+    os.environ.setdefault("LLM_MAX_RETRIES", "5")
+    from llm_client import create_chat_model  # noqa: E402
+    from llm_gateway import get_gateway  # noqa: E402
+
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARK_DIR, "mock_openai_server.py"),
+         "--port", str(args.port), "--latency", str(args.latency), "--tokens", "10"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    failures = []
+    loop = asyncio.new_event_loop()
+    try:
+        wait_for_mock(mock_url)
+        model = create_chat_model(temperature=0.0)
+        gateway = get_gateway()
+        print(f"{args.calls} chamadas por fase, latência {args.latency}s, cliente {'síncrono' if args.sync else 'assíncrono'}, "
+              f"até {gateway.max_concurrency} simultâneas, fila de {gateway.max_queue}\n")
+
+        phases = [
+            ('concorrência', [f"Pergunta {i}" for i in range(args.calls)], 0.0),
+            ('agrupamento', ["Pergunta repetida"] * args.calls, 0.0),
+            ('novas tentativas', [f"Pergunta com falha {i}" for i in range(args.calls)], args.fail_rate),
+        ]
+        print(f"{'fase':>17} {'erros':>6} {'p50 (ms)':>9} {'p95 (ms)':>9} {'pico servidor':>14} "
+              f"{'requisições':>12} {'503':>5} {'retries':>8} {'agrupadas':>10} {'fila p95 (ms)':>14}")
+        for name, questions, fail_rate in phases:
+            mock_request(mock_url, "/stats/reset", {'fail_rate': fail_rate, 'retry_after': 0})
+            before = gateway.stats()
+            latencies, errors = loop.run_until_complete(run_calls(model, questions, args.sync))
+            server = mock_request(mock_url, "/stats")
+            after = gateway.stats()
+
+            print(f"{name:>17} {errors:>6} {statistics.median(latencies):>9.0f} "
+                  f"{latencies[int(len(latencies) * 0.95) - 1]:>9.0f} {server['max_in_flight']:>14} "
+                  f"{server['requests']:>12} {server['failed']:>5} {after['retries'] - before['retries']:>8} "
+                  f"{after['coalesced'] - before['coalesced']:>10} {after['queue_wait_p95_ms']:>14.0f}")
+
+            if server['max_in_flight'] > gateway.max_concurrency:
+                failures.append(f"{name}: {server['max_in_flight']} requisições simultâneas no servidor")
+            if name == 'agrupamento' and server['requests'] != 1:
+                failures.append(f"{name}: a mesma pergunta chegou {server['requests']} vezes ao servidor")
+            if errors:
+                failures.append(f"{name}: {errors} chamadas falharam")
+    finally:
+        loop.close()
+        mock.terminate()
+        mock.wait()
+
+    print(f"\nGateway: {json.dumps(get_gateway().stats())}")
+    if failures:
+        print("\nFalhas:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Teste de carga do backend de sessões compartilhado com múltiplos workers.
+
+Sobe o app com gunicorn (`pip install gunicorn`) e `SESSION_BACKEND=sqlite`
+para cada quantidade de workers, cria uma sessão com um upload e dispara
+requisições concorrentes a `/api/history` com o cookie dessa sessão. Como os
+workers não compartilham memória, cada requisição só é atendida corretamente
+se o worker encontrar a sessão no backend.
+
+Uma fração `--chat-ratio` das requisições vai para `/api/chat` (sem o cache
+de respostas), com o LLM servido por `mock_openai_server.py` (`pip install
+quart hypercorn`): o primeiro chat que cai em cada worker reconstrói ali o
+retriever e o agente da sessão a partir do índice salvo.
+
+Uso (a partir de Projeto_1/):
+    python benchmarks/session_load_test.py --pdf uploads/politica.pdf --workers 1 2 4
+    python benchmarks/session_load_test.py --pdf uploads/politica.pdf --chat-ratio 0.5 --llm-latency 0.5
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from http.cookiejar import CookieJar
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def wait_for_server(base_url: str, timeout: float = 300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"{base_url}/api/stats", timeout=2)
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError("Servidor não respondeu a tempo")
+
+
+def multipart_body(pdf_path: str):
+    boundary = "----session-load-test"
+    with open(pdf_path, "rb") as f:
+        content = f.read()
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{os.path.basename(pdf_path)}\"\r\n"
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def create_session(base_url: str, pdf_path: str) -> str:
+    """Faz o upload, aguarda o índice ficar pronto e retorna o cookie da sessão."""
+    jar = CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+
+    body, content_type = multipart_body(pdf_path)
+    request = urllib.request.Request(f"{base_url}/api/upload", data=body, headers={"Content-Type": content_type})
+    job_id = json.load(opener.open(request))["job_id"]
+
+    while True:
+        job = json.load(opener.open(f"{base_url}/api/upload/{job_id}/status"))
+        if job["status"] == "ready":
+            break
+        if job["status"] == "error":
+            raise RuntimeError(job["error"])
+        time.sleep(0.5)
+
+    return "; ".join(f"{cookie.name}={cookie.value}" for cookie in jar)
+
+
+def run_load(base_url: str, cookie: str, concurrency: int, duration: float, chat_ratio: float = 0.0) -> dict:
+    """Dispara requisições por `duration` segundos e conta sucessos e falhas.
+
+    Cada requisição vai para `/api/chat` com probabilidade `chat_ratio` e para
+    `/api/history` nas demais.
+    """
+    deadline = time.time() + duration
+
+    def request_for(n: int, i: int):
+        if random.random() < chat_ratio:
+            body = json.dumps({"message": f"Qual a política de senhas? ({n}.{i})", "cache": False}).encode()
+            headers = {"Cookie": cookie, "Content-Type": "application/json"}
+            return "chat", urllib.request.Request(f"{base_url}/api/chat", data=body, headers=headers)
+        return "history", urllib.request.Request(f"{base_url}/api/history", headers={"Cookie": cookie})
+
+    def client(n: int):
+        counts = {"history": 0, "chat": 0, "errors": 0, "chat_errors": 0}
+        chat_latencies = []
+        i = 0
+        while time.time() < deadline:
+            kind, request = request_for(n, i)
+            i += 1
+            start = time.perf_counter()
+            try:
+                data = json.load(urllib.request.urlopen(request, timeout=60))
+                ok = bool(data.get("success"))
+            except OSError:
+                ok = False
+            if not ok:
+                counts["errors"] += 1
+                counts["chat_errors"] += kind == "chat"
+                continue
+            counts[kind] += 1
+            if kind == "chat":
+                chat_latencies.append(time.perf_counter() - start)
+        return counts, chat_latencies
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+
+    totals = {key: sum(counts[key] for counts, _ in results) for key in ("history", "chat", "errors", "chat_errors")}
+    chat_latencies = sorted(latency for _, latencies in results for latency in latencies)
+    ok = totals["history"] + totals["chat"]
+    return {
+        "requests": ok,
+        "errors": totals["errors"],
+        "rps": round(ok / duration, 1),
+        "chats": totals["chat"],
+        "chat_errors": totals["chat_errors"],
+        "chat_p50_s": round(chat_latencies[len(chat_latencies) // 2], 3) if chat_latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", required=True, help="PDF usado para criar a sessão")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--chat-ratio", type=float, default=0.1, help="Fração das requisições enviadas a /api/chat")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Tempo de geração do LLM falso (s)")
+    parser.add_argument("--llm-port", type=int, default=1298)
+    args = parser.parse_args()
+
+    if shutil.which("gunicorn") is None:
+        sys.exit("gunicorn não encontrado: pip install gunicorn")
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    pdf_path = os.path.abspath(args.pdf)
+    results = []
+
+    for workers in args.workers:
+        state_dir = tempfile.mkdtemp(prefix="session-load-")
+        env = {
+            **os.environ,
+            "SESSION_BACKEND": "sqlite",
+            "SESSION_DB_PATH": os.path.join(state_dir, "sessions.db"),
+            "SESSION_SPILL_DIR": os.path.join(state_dir, "indices"),
+            "SECRET_KEY": "session-load-test",
+            "LLM_BASE_URL": f"http://127.0.0.1:{args.llm_port}/v1",
+        }
+        processes = []
+        if args.chat_ratio > 0:
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(BENCHMARK_DIR, "mock_openai_server.py"),
+                 "--port", str(args.llm_port), "--latency", str(args.llm_latency), "--tokens", "10"],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            ))
+        processes.append(subprocess.Popen(
+            ["gunicorn", "-w", str(workers), "--threads", "4", "-t", "120", "-b", f"127.0.0.1:{args.port}", "app:create_app()"],
+            cwd=PROJECT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        try:
+            wait_for_server(base_url)
+            cookie = create_session(base_url, pdf_path)
+            result = run_load(base_url, cookie, args.concurrency, args.duration, args.chat_ratio)
+            results.append({"workers": workers, **result})
+            print(f"workers={workers}: {result}")
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+    base_rps = results[0]["rps"] or 1
+    print(f"\n{'workers':>8} {'req/s':>10} {'escala':>8} {'erros':>8} {'chats':>7} {'erros chat':>11} {'chat p50 (s)':>13}")
+    for r in results:
+        print(f"{r['workers']:>8} {r['rps']:>10} {r['rps'] / base_rps:>7.2f}x {r['errors']:>8} "
+              f"{r['chats']:>7} {r['chat_errors']:>11} {r['chat_p50_s']!s:>13}")
+
+
+if __name__ == "__main__":
+    main()
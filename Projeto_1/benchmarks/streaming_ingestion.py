@@ -0,0 +1,108 @@
+"""Benchmark de ingestão: pipeline completo em memória vs. modo streaming.
+
+Cada modo roda em um subprocesso próprio para que o pico de RSS medido seja
+apenas o daquele modo. Sem `--pdf`, um PDF sintético é gerado com pypdf.
+
+Uso (a partir de Projeto_1/):
+    python benchmarks/streaming_ingestion.py --pages 1000
+    python benchmarks/streaming_ingestion.py --pdf uploads/politica.pdf
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LINES_PER_PAGE = 45
+
+
+def make_synthetic_pdf(path: str, pages: int):
+    """Gera um PDF com texto extraível em todas as páginas."""
+    from pypdf import PdfWriter
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    font_ref = writer._add_object(font)
+
+    for page_number in range(pages):
+        page = writer.add_blank_page(width=612, height=792)
+        lines = [
+            f"({page_number}.{i} Politica de seguranca: senhas, acessos, backups e incidentes {page_number * LINES_PER_PAGE + i}) '"
+            for i in range(LINES_PER_PAGE)
+        ]
+        content = DecodedStreamObject()
+        content.set_data(("BT /F1 10 Tf 14 TL 40 760 Td " + " ".join(lines) + " ET").encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font_ref})
+        })
+
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def run_mode(pdf_path: str, streaming: bool):
+    """Executa a ingestão no processo atual e imprime as métricas em JSON."""
+    from embeddings import warmup_embeddings
+    from rag import RAG
+
+    warmup_embeddings()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    rag = RAG(pdf_path, streaming=streaming)
+    elapsed = time.perf_counter() - start
+
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "mode": "streaming" if streaming else "batch",
+        "wall_time_s": round(elapsed, 2),
+        "peak_rss_mb": round(rss_peak / 1024, 1),
+        "ingestion_rss_delta_mb": round((rss_peak - rss_before) / 1024, 1),
+        "chunks": rag.retriever.vectorstore.index.ntotal,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF a ser indexado (padrão: PDF sintético)")
+    parser.add_argument("--pages", type=int, default=1000, help="Páginas do PDF sintético")
+    parser.add_argument("--mode", choices=["batch", "streaming"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.pdf, args.mode == "streaming")
+        return
+
+    pdf_path = args.pdf
+    if not pdf_path:
+        pdf_path = os.path.join("uploads", f"benchmark_{args.pages}p.pdf")
+        if not os.path.exists(pdf_path):
+            os.makedirs("uploads", exist_ok=True)
+            print(f"Gerando PDF sintético com {args.pages} páginas em {pdf_path}...")
+            make_synthetic_pdf(pdf_path, args.pages)
+
+    results = []
+    for mode in ("batch", "streaming"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--pdf", pdf_path, "--mode", mode],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"\n{'modo':<10} {'tempo (s)':>10} {'pico RSS (MB)':>14} {'Δ ingestão (MB)':>16} {'chunks':>8}")
+    for r in results:
+        print(f"{r['mode']:<10} {r['wall_time_s']:>10} {r['peak_rss_mb']:>14} {r['ingestion_rss_delta_mb']:>16} {r['chunks']:>8}")
+
+
+if __name__ == "__main__":
+    main()
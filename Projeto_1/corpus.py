@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.vectorstores import VectorStore
+
+from bm25 import BM25Index
+from embeddings import EMBEDDING_MODEL, embedding_id, get_embeddings
+from faiss_index import convert_vectorstore, create_vectorstore, search_parameters, set_search_params
+from index_cache import file_sha256
+from rag import embed_texts, split_pdf
+from log import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+BM25_FILENAME = "bm25.json"
+LOCK_FILENAME = "corpus.lock"
+# Tentativas de carregar a versão do manifesto quando outro worker a remove durante a leitura
+LOAD_ATTEMPTS = 3
+
+
+class Corpus:
+    """Índice FAISS persistente e compartilhado com os chunks de todos os documentos.
+
+    Cada documento é identificado pelo SHA-256 do PDF (`doc_id`) e indexado uma
+    única vez: seus chunks levam o `doc_id` nos metadados e as sessões buscam
+    apenas nos documentos selecionados. O índice só recebe acréscimos; cada
+    acréscimo grava uma nova versão em `v<N>/` e o `manifest.json` aponta para
+    a versão atual, então outros workers recarregam o corpus quando o manifesto
+    muda e buscas em andamento continuam na versão que já tinham. As
+    `keep_versions` versões mais recentes ficam no disco para os workers que
+    ainda estão carregando uma delas; se mesmo assim a versão sumir, o
+    manifesto é relido. Cada versão guarda também o índice BM25 dos chunks,
+    usado na busca híbrida. O manifesto registra o `embedding_id()` do modelo
+    que gerou os vetores, e um corpus de outro modelo ou backend não é
+    carregado, para não misturar vetores incompatíveis.
+
+    Cada acréscimo copia e regrava o índice inteiro (custo proporcional ao
+    tamanho do corpus, não ao do PDF novo); para cargas iniciais grandes,
+    indexe os documentos antes de abrir o corpus para os usuários.
+    """
+
+    def __init__(self, corpus_dir: str = None, embeddings=None, exact_max_vectors: int = None, keep_versions: int = None):
+        self.corpus_dir = corpus_dir or os.environ.get("CORPUS_DIR", "./corpus")
+        self.embeddings = embeddings or get_embeddings()
+        self.embedding_id = embedding_id()
+        # Seleções pequenas são buscadas de forma exata nos próprios vetores, sem filtrar o índice inteiro
+        self.exact_max_vectors = exact_max_vectors if exact_max_vectors is not None else int(os.environ.get("CORPUS_EXACT_MAX_VECTORS", 20000))
+        # A atual e ao menos a anterior, que outro worker pode estar carregando
+        self.keep_versions = max(2, keep_versions or int(os.environ.get("CORPUS_KEEP_VERSIONS", 2)))
+
+        self.vectorstore = None
+        self.bm25 = None
+        self.documents = {}
+        self._positions = {}
+        self._manifest_mtime = None
+        self._lock = threading.Lock()
+
+        os.makedirs(self.corpus_dir, exist_ok=True)
+        self._refresh()
+
+    @staticmethod
+    def selection_key(doc_ids: list[str]) -> str:
+        """Identifica um conjunto de documentos (o próprio `doc_id` quando há um só)."""
+        doc_ids = sorted(set(doc_ids))
+        if len(doc_ids) == 1:
+            return doc_ids[0]
+        return hashlib.sha256("|".join(doc_ids).encode("utf-8")).hexdigest()
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.corpus_dir, MANIFEST_FILENAME)
+
+    def _refresh(self):
+        """Recarrega o corpus do disco se outro processo gravou uma nova versão."""
+        try:
+            mtime = os.path.getmtime(self._manifest_path)
+        except FileNotFoundError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+
+        with self._lock:
+            start = time.perf_counter()
+            for attempt in range(LOAD_ATTEMPTS):
+                mtime = os.path.getmtime(self._manifest_path)
+                if mtime == self._manifest_mtime:
+                    return
+                with open(self._manifest_path, encoding="utf-8") as f:
+                    manifest = json.load(f)
+                self._check_embedding(manifest)
+                try:
+                    vectorstore = self._load_version(manifest['version'])
+                    bm25 = self._load_bm25(manifest['version'], vectorstore)
+                    break
+                except (OSError, RuntimeError):
+                    # A versão foi removida por um worker que gravou outras mais novas: relê o manifesto
+                    if os.path.isdir(self._version_path(manifest['version'])) or attempt == LOAD_ATTEMPTS - 1:
+                        raise
+                    logger.warning(f"Versão {manifest['version']} do corpus removida durante a leitura; relendo o manifesto")
+            self.vectorstore, self.bm25, self._positions = vectorstore, bm25, self._build_positions(vectorstore)
+            self.documents = manifest['documents']
+            self._manifest_mtime = mtime
+            logger.info(
+                f"Corpus carregado: {len(self.documents)} documentos, {vectorstore.index.ntotal} chunks "
+                f"em {time.perf_counter() - start:.2f}s"
+            )
+
+    def _check_embedding(self, manifest: dict):
+        # Corpora anteriores ao registro do modelo só podiam ter sido gerados pelo PyTorch
+        stored = manifest.get('embedding', EMBEDDING_MODEL)
+        if stored != self.embedding_id:
+            raise ValueError(
+                f"Corpus em {self.corpus_dir} indexado com '{stored}', mas o modelo configurado é "
+                f"'{self.embedding_id}': use outro CORPUS_DIR ou reindexe os documentos"
+            )
+
+    def _version_path(self, version: int) -> str:
+        return os.path.join(self.corpus_dir, f"v{version}")
+
+    def _load_version(self, version: int) -> FAISS:
+        path = self._version_path(version)
+        return self._prepare(FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True))
+
+    def _load_bm25(self, version: int, vectorstore: FAISS) -> BM25Index:
+        """Índice BM25 da versão; corpora criados sem ele têm o índice montado a partir do docstore."""
+        bm25 = BM25Index.load(os.path.join(self._version_path(version), BM25_FILENAME))
+        if bm25 is None:
+            bm25 = BM25Index()
+            self._index_chunks(bm25, vectorstore, range(vectorstore.index.ntotal))
+        return bm25
+
+    @staticmethod
+    def _index_chunks(bm25: BM25Index, vectorstore: FAISS, positions):
+        ids = [vectorstore.index_to_docstore_id[position] for position in positions]
+        docs = [vectorstore.docstore.search(docstore_id) for docstore_id in ids]
+        bm25.add(ids, [doc.page_content for doc in docs], [doc.metadata.get("doc_id") for doc in docs])
+
+    @staticmethod
+    def _prepare(vectorstore: FAISS) -> FAISS:
+        set_search_params(vectorstore.index)
+        try:
+            # O IVF só reconstrói vetores por posição com o mapa direto
+            faiss.extract_index_ivf(vectorstore.index).make_direct_map()
+        except RuntimeError:
+            pass
+        return vectorstore
+
+    @staticmethod
+    def _build_positions(vectorstore: FAISS) -> dict:
+        """Mapeia cada `doc_id` para as posições dos seus vetores no índice."""
+        positions = {}
+        for position, docstore_id in vectorstore.index_to_docstore_id.items():
+            doc_id = vectorstore.docstore.search(docstore_id).metadata.get("doc_id")
+            positions.setdefault(doc_id, []).append(position)
+        return {doc_id: np.array(sorted(p), dtype=np.int64) for doc_id, p in positions.items()}
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusão entre processos (workers) durante a gravação de uma nova versão."""
+        with open(os.path.join(self.corpus_dir, LOCK_FILENAME), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def has(self, doc_id: str) -> bool:
+        self._refresh()
+        return doc_id in self.documents
+
+    def add_pdf(self, pdf_path: str, filename: str = None, progress=None, parse_workers: int = 1) -> str:
+        """Indexa o PDF no corpus, se ainda não estiver lá, e retorna o seu `doc_id`."""
+        doc_id = file_sha256(pdf_path)
+        if self.has(doc_id):
+            logger.info(f"Documento {doc_id[:12]} já está no corpus; nenhum embedding gerado")
+            return doc_id
+
+        chunks = split_pdf(pdf_path, progress, parse_workers)
+        if not chunks:
+            raise ValueError("Não foi possível dividir o documento em chunks")
+        for chunk in chunks:
+            chunk.metadata["doc_id"] = doc_id
+        texts = [chunk.page_content for chunk in chunks]
+        vectors = embed_texts(texts, self.embeddings, progress)
+        metadatas = [chunk.metadata for chunk in chunks]
+
+        with self._file_lock():
+            self._refresh()
+            if doc_id in self.documents:
+                return doc_id
+
+            version = 1
+            if self.vectorstore is None:
+                vectorstore = create_vectorstore(texts, vectors, self.embeddings, metadatas=metadatas)
+                bm25 = BM25Index()
+            else:
+                # A versão em uso continua intacta para as buscas em andamento
+                with open(self._manifest_path, encoding="utf-8") as f:
+                    version = json.load(f)['version'] + 1
+                vectorstore = self._load_version(version - 1)
+                bm25 = self._load_bm25(version - 1, vectorstore)
+                vectorstore.add_embeddings(zip(texts, vectors), metadatas=metadatas)
+                vectorstore = convert_vectorstore(vectorstore)
+            self._prepare(vectorstore)
+
+            # Os vetores novos ocupam as últimas posições do índice
+            start = vectorstore.index.ntotal - len(texts)
+            self._index_chunks(bm25, vectorstore, range(start, vectorstore.index.ntotal))
+
+            documents = {
+                **self.documents,
+                doc_id: {'filename': filename or os.path.basename(pdf_path), 'chunks': len(chunks), 'added_at': time.time()},
+            }
+            self._write_version(version, vectorstore, bm25, documents)
+
+            positions = {**self._positions, doc_id: np.arange(start, start + len(texts), dtype=np.int64)}
+            with self._lock:
+                self.vectorstore, self.bm25, self._positions = vectorstore, bm25, positions
+                self.documents = documents
+                self._manifest_mtime = os.path.getmtime(self._manifest_path)
+
+        logger.info(f"Documento {doc_id[:12]} adicionado ao corpus com {len(chunks)} chunks")
+        return doc_id
+
+    def _write_version(self, version: int, vectorstore: FAISS, bm25: BM25Index, documents: dict):
+        path = self._version_path(version)
+        vectorstore.save_local(path)
+        bm25.save(os.path.join(path, BM25_FILENAME))
+
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({'version': version, 'embedding': self.embedding_id, 'documents': documents}, f)
+        os.replace(tmp_path, self._manifest_path)
+
+        # Só versões que nenhum manifesto recente aponta; a anterior pode estar sendo carregada por outro worker
+        for name in os.listdir(self.corpus_dir):
+            if name.startswith("v") and name[1:].isdigit() and int(name[1:]) <= version - self.keep_versions:
+                shutil.rmtree(os.path.join(self.corpus_dir, name), ignore_errors=True)
+
+    def view(self, doc_ids: list[str]) -> "CorpusView":
+        """Vectorstore somente leitura restrito aos documentos informados."""
+        self._refresh()
+        with self._lock:
+            vectorstore, bm25, positions = self.vectorstore, self.bm25, self._positions
+        missing = [doc_id for doc_id in doc_ids if doc_id not in positions]
+        if missing:
+            raise KeyError(f"Documentos fora do corpus: {', '.join(missing)}")
+        return CorpusView(self, doc_ids, vectorstore, np.concatenate([positions[doc_id] for doc_id in doc_ids]), bm25)
+
+    def retriever(self, doc_ids: list[str], k: int = 4):
+        return self.view(doc_ids).as_retriever(search_type="similarity", search_kwargs={"k": k})
+
+    def list_documents(self) -> list[dict]:
+        self._refresh()
+        return [{'doc_id': doc_id, **info} for doc_id, info in self.documents.items()]
+
+    def stats(self) -> dict:
+        self._refresh()
+        index = self.vectorstore.index if self.vectorstore is not None else None
+        return {
+            'documents': len(self.documents),
+            'chunks': index.ntotal if index is not None else 0,
+            'index': type(faiss.downcast_index(index)).__name__ if index is not None else None,
+        }
+
+
+class CorpusView(VectorStore):
+    """Busca no corpus restrita a um subconjunto de documentos.
+
+    Com até `exact_max_vectors` vetores selecionados, os vetores são copiados
+    para a visão e a busca é exata sobre eles; acima disso, a busca roda no
+    índice do corpus com um `IDSelector`, que descarta os demais documentos
+    durante a própria busca em vez de filtrar os resultados depois. A busca
+    BM25 usa o índice lexical do corpus, restrita aos chunks da seleção.
+    """
+
+    def __init__(self, corpus: Corpus, doc_ids: list[str], vectorstore: FAISS, positions: np.ndarray, bm25: BM25Index = None):
+        self.corpus = corpus
+        self.doc_ids = list(doc_ids)
+        self.vectorstore = vectorstore
+        self.positions = positions
+        self.bm25 = bm25
+        self._docstore_ids = None
+        self.params = search_parameters(vectorstore.index, faiss.IDSelectorBatch(positions))
+        self.vectors = None
+        if len(positions) <= corpus.exact_max_vectors or self.params is None:
+            self.vectors = vectorstore.index.reconstruct_batch(positions)
+
+    @property
+    def embeddings(self):
+        return self.corpus.embeddings
+
+    @property
+    def size_bytes(self) -> int:
+        return self.positions.nbytes + (self.vectors.nbytes if self.vectors is not None else 0)
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs) -> list:
+        query = np.asarray(embedding, dtype=np.float32)
+        if self.vectors is not None:
+            distances = ((self.vectors - query) ** 2).sum(axis=1)
+            top = np.argsort(distances)[:k]
+            positions = self.positions[top]
+        else:
+            _, ids = self.vectorstore.index.search(query[None, :], k, params=self.params)
+            positions = [p for p in ids[0] if p >= 0]
+
+        return [
+            self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[int(p)])
+            for p in positions
+        ]
+
+    def keyword_search(self, query: str, k: int) -> list:
+        """Busca BM25 nos chunks dos documentos selecionados."""
+        if self.bm25 is None:
+            return []
+        if self._docstore_ids is None:
+            self._docstore_ids = {self.vectorstore.index_to_docstore_id[int(p)] for p in self.positions}
+        return [self.vectorstore.docstore.search(docstore_id) for docstore_id, _ in self.bm25.search(query, k, allowed=self._docstore_ids)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list:
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k, **kwargs)
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("Use Corpus.add_pdf para adicionar documentos ao corpus")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Use Corpus.add_pdf para adicionar documentos ao corpus")
@@ -0,0 +1,165 @@
+import os
+import math
+import time
+import uuid
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_TYPES = ("flat", "ivf", "ivfpq", "ivfsq", "hnsw", "pq", "sq")
+
+# Mínimo de pontos de treino por centroide recomendado pelo FAISS
+TRAIN_POINTS_PER_CENTROID = 39
+
+
+def index_config() -> dict:
+    """Parâmetros do índice lidos do ambiente (`FAISS_*`)."""
+    config = {
+        'type': os.environ.get("FAISS_INDEX_TYPE", "flat").lower(),
+        # Abaixo deste número de vetores a busca exata já leva menos de 1 ms
+        'min_vectors': int(os.environ.get("FAISS_MIN_ANN_VECTORS", 10000)),
+        'nlist': int(os.environ.get("FAISS_NLIST", 0)),
+        'pq_m': int(os.environ.get("FAISS_PQ_M", 48)),
+        'pq_nbits': int(os.environ.get("FAISS_PQ_NBITS", 8)),
+        'sq_type': os.environ.get("FAISS_SQ_TYPE", "SQ8"),
+        'hnsw_m': int(os.environ.get("FAISS_HNSW_M", 32)),
+        'ef_construction': int(os.environ.get("FAISS_HNSW_EF_CONSTRUCTION", 80)),
+        'nprobe': int(os.environ.get("FAISS_NPROBE", 16)),
+        'ef_search': int(os.environ.get("FAISS_EF_SEARCH", 64)),
+    }
+    if config['type'] not in INDEX_TYPES:
+        raise ValueError(f"FAISS_INDEX_TYPE inválido: {config['type']} (opções: {', '.join(INDEX_TYPES)})")
+    return config
+
+
+def cache_tag(config: dict = None) -> str:
+    """Identifica os parâmetros de construção do índice na chave do cache de índices."""
+    config = config or index_config()
+    if config['type'] == "flat":
+        return "flat"
+    build_keys = ('type', 'min_vectors', 'nlist', 'pq_m', 'pq_nbits', 'sq_type', 'hnsw_m', 'ef_construction')
+    return ",".join(f"{key}={config[key]}" for key in build_keys)
+
+
+def factory_string(dim: int, count: int, config: dict) -> str:
+    """String do `faiss.index_factory` para `count` vetores de dimensão `dim`."""
+    index_type = config['type']
+    if index_type == "flat" or count < config['min_vectors']:
+        return "Flat"
+
+    # nlist ~ 4 * sqrt(N), limitado para que cada centroide tenha pontos de treino suficientes
+    nlist = config['nlist'] or int(4 * math.sqrt(count))
+    nlist = max(1, min(nlist, count // TRAIN_POINTS_PER_CENTROID))
+
+    if index_type in ("ivfpq", "pq"):
+        if dim % config['pq_m']:
+            raise ValueError(f"FAISS_PQ_M ({config['pq_m']}) precisa dividir a dimensão dos vetores ({dim})")
+        if count < TRAIN_POINTS_PER_CENTROID * 2 ** config['pq_nbits']:
+            logger.warning(f"Poucos vetores ({count}) para treinar PQ{config['pq_m']}x{config['pq_nbits']}; usando {config['sq_type']}")
+            index_type = "ivfsq" if index_type == "ivfpq" else "sq"
+
+    pq = f"PQ{config['pq_m']}x{config['pq_nbits']}"
+    return {
+        "ivf": f"IVF{nlist},Flat",
+        "ivfpq": f"IVF{nlist},{pq}",
+        "ivfsq": f"IVF{nlist},{config['sq_type']}",
+        "hnsw": f"HNSW{config['hnsw_m']}",
+        "pq": pq,
+        "sq": config['sq_type'],
+    }[index_type]
+
+
+def build_index(vectors: np.ndarray, config: dict = None) -> faiss.Index:
+    """Cria, treina e preenche um índice FAISS com os vetores (distância L2, como o `FAISS` do LangChain)."""
+    config = config or index_config()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    spec = factory_string(dim, count, config)
+
+    start = time.perf_counter()
+    index = faiss.index_factory(dim, spec, faiss.METRIC_L2)
+    if spec.startswith("HNSW"):
+        index.hnsw.efConstruction = config['ef_construction']
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    set_search_params(index, config)
+
+    if spec != "Flat":
+        logger.info(f"Índice FAISS {spec} com {count} vetores construído em {time.perf_counter() - start:.2f}s")
+    return index
+
+
+def set_search_params(index: faiss.Index, config: dict = None):
+    """Aplica os parâmetros de busca (`nprobe` no IVF, `efSearch` no HNSW)."""
+    config = config or index_config()
+    try:
+        faiss.extract_index_ivf(index).nprobe = config['nprobe']
+    except RuntimeError:
+        pass
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = config['ef_search']
+
+
+def search_parameters(index: faiss.Index, selector):
+    """Parâmetros de busca restritos aos ids do `selector`, mantendo `nprobe`/`efSearch` do índice.
+
+    Retorna None para índices que não aceitam parâmetros de busca (PQ sem IVF).
+    """
+    try:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=faiss.extract_index_ivf(index).nprobe)
+    except RuntimeError:
+        pass
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPQ):
+        return None
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """Estima a memória ocupada pelos vetores do índice (códigos comprimidos e, no HNSW, o grafo)."""
+    try:
+        per_vector = index.sa_code_size()
+    except RuntimeError:
+        per_vector = index.d * 4
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        # Vizinhos por vetor: 2*M na camada 0 e M nas demais (poucas), ids de 4 bytes
+        per_vector += hnsw.nb_neighbors(0) * 4
+    return index.ntotal * per_vector
+
+
+def create_vectorstore(texts: list[str], vectors, embeddings, metadatas: list[dict] = None, config: dict = None) -> FAISS:
+    """Cria o vectorstore do LangChain sobre o índice configurado em vez do flat padrão."""
+    index = build_index(np.asarray(vectors, dtype=np.float32), config)
+
+    # O índice já contém os vetores na ordem dos textos: só o docstore e o mapeamento posição -> id são montados
+    metadatas = metadatas or [{} for _ in texts]
+    ids = [str(uuid.uuid4()) for _ in texts]
+    docstore = InMemoryDocstore({
+        doc_id: Document(id=doc_id, page_content=text, metadata=metadata)
+        for doc_id, text, metadata in zip(ids, texts, metadatas)
+    })
+    return FAISS(embeddings, index, docstore, dict(enumerate(ids)))
+
+
+def convert_vectorstore(vectorstore: FAISS, config: dict = None) -> FAISS:
+    """Troca o índice flat de um vectorstore já preenchido pelo índice configurado."""
+    config = config or index_config()
+    index = vectorstore.index
+    if config['type'] == "flat" or not isinstance(index, faiss.IndexFlat) or index.ntotal < config['min_vectors']:
+        return vectorstore
+
+    vectors = index.reconstruct_n(0, index.ntotal)
+    vectorstore.index = build_index(vectors, config)
+    return vectorstore
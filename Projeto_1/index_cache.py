@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+from langchain_community.vectorstores import FAISS
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+META_FILENAME = "meta.json"
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    """Calcula o SHA-256 do conteúdo de um arquivo lendo em blocos."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class IndexCache:
+    """Cache persistente de índices FAISS endereçado pelo conteúdo do PDF.
+
+    Cada entrada é um diretório `<chave>/` com o índice salvo via `save_local`
+    e um `meta.json`. O mtime do `meta.json` marca o último acesso e é usado
+    na evicção LRU, respeitando limites de quantidade de entradas e de bytes.
+    """
+
+    def __init__(self, cache_dir: str = None, max_entries: int = None, max_bytes: int = None):
+        self.cache_dir = cache_dir or os.environ.get("INDEX_CACHE_DIR", "./cache/indices")
+        self.max_entries = max_entries if max_entries is not None else int(os.environ.get("INDEX_CACHE_MAX_ENTRIES", 50))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.environ.get("INDEX_CACHE_MAX_MB", 1024)) * 1024 * 1024
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(doc_hash: str, chunk_size: int, chunk_overlap: int, embedding_model: str, index_tag: str = "flat") -> str:
+        """Gera a chave da entrada a partir do hash do PDF e dos parâmetros de indexação."""
+        params = f"{doc_hash}|{chunk_size}|{chunk_overlap}|{embedding_model}|{index_tag}"
+        return hashlib.sha256(params.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key: str, embeddings):
+        """Carrega o índice da chave informada, ou retorna None em caso de miss."""
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, META_FILENAME)
+        if not os.path.exists(meta_path):
+            return None
+
+        try:
+            start = time.perf_counter()
+            vectorstore = FAISS.load_local(entry_dir, embeddings, allow_dangerous_deserialization=True)
+            os.utime(meta_path, None)
+            logger.info(f"Índice carregado do cache ({key[:12]}) em {time.perf_counter() - start:.3f}s")
+            return vectorstore
+        except Exception as e:
+            logger.warning(f"Entrada de cache corrompida ({key[:12]}), descartando: {e}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+    def save(self, key: str, vectorstore, metadata: dict = None):
+        """Persiste o índice de forma atômica e aplica a política de evicção."""
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+
+        try:
+            vectorstore.save_local(tmp_dir)
+            with open(os.path.join(tmp_dir, META_FILENAME), "w", encoding="utf-8") as f:
+                json.dump({"key": key, "created_at": time.time(), **(metadata or {})}, f)
+            os.rename(tmp_dir, entry_dir)
+            logger.info(f"Índice salvo no cache: {key[:12]}")
+        except OSError as e:
+            # Outra requisição pode ter salvo a mesma chave primeiro
+            logger.warning(f"Não foi possível salvar o índice no cache ({key[:12]}): {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def _entries(self):
+        """Lista as entradas válidas como (último acesso, tamanho em bytes, diretório)."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            meta_path = os.path.join(entry_dir, META_FILENAME)
+            if not os.path.exists(meta_path):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(entry_dir, fname))
+                for fname in os.listdir(entry_dir)
+            )
+            entries.append((os.path.getmtime(meta_path), size, entry_dir))
+        return entries
+
+    def evict(self):
+        """Remove as entradas menos usadas recentemente até respeitar os limites."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total_bytes = sum(size for _, size, _ in entries)
+
+            while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+                _, size, entry_dir = entries.pop(0)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total_bytes -= size
+                logger.info(f"Entrada removida do cache de índices: {os.path.basename(entry_dir)[:12]}")
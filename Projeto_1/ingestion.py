@@ -0,0 +1,172 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Intervalo mínimo entre publicações do progresso no backend compartilhado (s)
+PUBLISH_INTERVAL = 0.5
+
+
+class QueueFullError(Exception):
+    """Levantada quando a fila de ingestão atingiu o limite de jobs pendentes."""
+
+
+class IngestionJob:
+    """Estado e progresso de um job de ingestão de PDF."""
+
+    def __init__(self, session_id: str, filepath: str, filename: str, publish=None):
+        self.job_id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.filepath = filepath
+        self.filename = filename
+        self.status = "queued"
+        self.stage = None
+        self.pages_parsed = 0
+        self.total_pages = None
+        self.chunks_embedded = 0
+        self.total_chunks = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.embedding_started_at = None
+        self.finished_at = None
+        self.publish = publish
+        self._last_published = 0.0
+
+    def update_progress(self, stage: str, **counters):
+        """Callback de progresso chamado pelo pipeline de ingestão."""
+        if stage == "embedding" and self.embedding_started_at is None:
+            self.embedding_started_at = time.time()
+        self.stage = stage
+        for name, value in counters.items():
+            setattr(self, name, value)
+        if self.publish and time.time() - self._last_published >= PUBLISH_INTERVAL:
+            self._last_published = time.time()
+            self.publish(self)
+
+    def eta_seconds(self):
+        """Estima o tempo restante pela taxa observada até agora.
+
+        Usa os chunks com embedding quando o total é conhecido; no modo streaming
+        o total de chunks só é conhecido no fim, então a estimativa usa as páginas.
+        """
+        if self.status != "processing":
+            return None
+        if self.total_chunks and self.chunks_embedded:
+            done, total, since = self.chunks_embedded, self.total_chunks, self.embedding_started_at
+        elif self.total_pages and self.pages_parsed:
+            done, total, since = self.pages_parsed, self.total_pages, self.started_at
+        else:
+            return None
+        elapsed = time.time() - since
+        if elapsed <= 0:
+            return None
+        return round((total - done) * elapsed / done, 1)
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.job_id,
+            'session_id': self.session_id,
+            'filename': self.filename,
+            'status': self.status,
+            'stage': self.stage,
+            'pages_parsed': self.pages_parsed,
+            'total_pages': self.total_pages,
+            'chunks_embedded': self.chunks_embedded,
+            'total_chunks': self.total_chunks,
+            'eta_seconds': self.eta_seconds(),
+            'error': self.error,
+        }
+
+
+class IngestionQueue:
+    """Fila limitada de ingestão executada por um pool de threads em segundo plano.
+
+    O `handler` recebe o `IngestionJob` e é responsável por construir o índice e
+    registrar o agente; o job só é marcado como `ready` quando ele retorna. Com
+    um `backend` de sessões, o estado dos jobs é publicado nele para que
+    qualquer worker possa responder às consultas de progresso.
+    """
+
+    def __init__(self, handler, backend=None, workers: int = None, max_pending: int = None, job_ttl: int = 3600):
+        self.handler = handler
+        self.backend = backend
+        self.workers = workers or int(os.environ.get("INGESTION_WORKERS", 2))
+        self.max_pending = max_pending or int(os.environ.get("INGESTION_MAX_PENDING", 16))
+        self.job_ttl = job_ttl
+        self.jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingestion")
+
+    def submit(self, session_id: str, filepath: str, filename: str) -> IngestionJob:
+        """Enfileira um PDF para ingestão e retorna o job imediatamente."""
+        with self._lock:
+            self._prune_finished()
+            if self._pending >= self.max_pending:
+                raise QueueFullError("Fila de processamento cheia")
+            job = IngestionJob(session_id, filepath, filename, publish=self._publish if self.backend else None)
+            self.jobs[job.job_id] = job
+            self._pending += 1
+
+        self._publish(job)
+        self._executor.submit(self._run, job)
+        logger.info(f"Job de ingestão {job.job_id} enfileirado para sessão {session_id}")
+        return job
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def status(self, job_id: str):
+        """Retorna o estado do job, consultando o backend se ele rodar em outro worker."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.backend is not None:
+            return self.backend.load_job(job_id)
+        return None
+
+    def _publish(self, job: IngestionJob):
+        if self.backend is not None:
+            self.backend.save_job(job.job_id, job.to_dict())
+
+    def _run(self, job: IngestionJob):
+        job.status = "processing"
+        job.started_at = time.time()
+        self._publish(job)
+        try:
+            self.handler(job)
+            job.status = "ready"
+            logger.info(f"Job de ingestão {job.job_id} concluído em {time.time() - job.started_at:.2f}s")
+        except Exception as e:
+            job.status = "error"
+            job.error = str(e)
+            logger.error(f"Erro no job de ingestão {job.job_id}: {str(e)}", exc_info=True)
+        finally:
+            job.finished_at = time.time()
+            self._publish(job)
+            with self._lock:
+                self._pending -= 1
+
+    def _prune_finished(self):
+        """Descarta jobs finalizados há mais de `job_ttl` segundos.
+
+        No backend, saem os jobs sem atualização há mais de `job_ttl`, inclusive
+        os publicados por outros workers e os de sessões que nunca ficaram prontas.
+        """
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished_at and now - job.finished_at > self.job_ttl
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+        if self.backend is not None:
+            removed = self.backend.delete_expired_jobs(self.job_ttl)
+            if removed:
+                logger.info(f"{removed} jobs de ingestão expirados removidos do backend")
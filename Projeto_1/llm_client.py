@@ -0,0 +1,69 @@
+import os
+import threading
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from llm_gateway import get_gateway
+from log import get_logger
+
+logger = get_logger(__name__)
+
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "http://172.30.64.1:1234/v1")
+LLM_MODEL = os.environ.get("LLM_MODEL", "google/gemma-3-12b")
+
+_http_client = None
+_http_async_client = None
+_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.environ.get("LLM_MAX_CONNECTIONS", 100)),
+        max_keepalive_connections=int(os.environ.get("LLM_MAX_KEEPALIVE", 20)),
+        keepalive_expiry=float(os.environ.get("LLM_KEEPALIVE_EXPIRY", 60)),
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(float(os.environ.get("LLM_TIMEOUT", 120)), connect=10.0)
+
+
+def get_http_clients() -> tuple[httpx.Client, httpx.AsyncClient]:
+    """Retorna os clientes HTTP (síncrono e assíncrono) compartilhados pelo processo.
+
+    Todos os agentes reutilizam o mesmo pool de conexões keep-alive com o
+    servidor do LLM, em vez de abrir conexões por sessão. O cliente assíncrono
+    fica preso ao event loop em que for usado primeiro (o do servidor ASGI).
+    As chamadas passam pelo gateway do LLM (limite de concorrência, fila,
+    novas tentativas e agrupamento de requisições idênticas).
+    """
+    global _http_client, _http_async_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                limits = _limits()
+                gateway = get_gateway()
+                _http_async_client = httpx.AsyncClient(transport=gateway.async_transport(limits), timeout=_timeout())
+                _http_client = httpx.Client(transport=gateway.transport(limits), timeout=_timeout())
+                logger.info(
+                    f"Clientes HTTP do LLM criados ({LLM_BASE_URL}, até {limits.max_connections} conexões, "
+                    f"{gateway.max_concurrency} chamadas simultâneas, {gateway.max_retries} novas tentativas)"
+                )
+    return _http_client, _http_async_client
+
+
+def create_chat_model(**kwargs) -> ChatOpenAI:
+    """Cria o ChatOpenAI apontando para o LM Studio com os clientes HTTP compartilhados."""
+    http_client, http_async_client = get_http_clients()
+    params = {
+        'model_name': LLM_MODEL,
+        'openai_api_base': LLM_BASE_URL,
+        'openai_api_key': os.environ.get("LLM_API_KEY", "lm-studio"),
+        'http_client': http_client,
+        'http_async_client': http_async_client,
+        # As novas tentativas ficam no gateway, com backoff e sem ocupar outra vaga
+        'max_retries': 0,
+    }
+    params.update(kwargs)
+    return ChatOpenAI(**params)
@@ -0,0 +1,185 @@
+import os
+import mmap
+import json
+import time
+import shutil
+import threading
+import weakref
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from bm25 import BM25Index
+from log import get_logger
+
+logger = get_logger(__name__)
+
+FORMAT_VERSION = 1
+STORE_FILENAME = "store.json"
+VECTORS_FILENAME = "vectors.npy"
+NORMS_FILENAME = "norms.npy"
+CHUNKS_FILENAME = "chunks.bin"
+OFFSETS_FILENAME = "offsets.npy"
+BM25_FILENAME = "bm25.json"
+DTYPES = ("float32", "float16")
+
+# Vetores convertidos para float32 por bloco durante a busca, sem cópia do arquivo inteiro
+SEARCH_BLOCK = 65536
+
+# Stores abertos no processo: sessões do mesmo documento usam o mesmo mapeamento
+_open_stores = weakref.WeakValueDictionary()
+_open_lock = threading.Lock()
+
+
+def is_mmap_store(path: str) -> bool:
+    return bool(path) and os.path.exists(os.path.join(path, STORE_FILENAME))
+
+
+def supports_mmap(vectorstore) -> bool:
+    """Só índices flat são gravados no formato mapeado; os ANN continuam no formato do FAISS."""
+    index = getattr(vectorstore, "index", None)
+    return isinstance(index, faiss.IndexFlat)
+
+
+def write_mmap_store(vectorstore, path: str, dtype: str = "float32"):
+    """Grava o vectorstore FAISS (flat) no formato mapeado em `path`, de forma atômica.
+
+    Os vetores vão para uma matriz `.npy` em `dtype`, os chunks (texto, metadados
+    e id) para um arquivo de registros JSON concatenados com os offsets de cada
+    um, e o índice BM25 dos chunks para `bm25.json`. O `store.json` marca o
+    store como completo.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Tipo de vetor inválido: {dtype} (opções: {', '.join(DTYPES)})")
+    start = time.perf_counter()
+    index = vectorstore.index
+    count, dim = index.ntotal, index.d
+
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(tmp_path)
+    try:
+        vectors = index.reconstruct_n(0, count) if count else np.empty((0, dim), dtype=np.float32)
+        np.save(os.path.join(tmp_path, VECTORS_FILENAME), vectors.astype(dtype))
+        # Normas calculadas sobre os vetores já convertidos, consistentes com a busca
+        np.save(os.path.join(tmp_path, NORMS_FILENAME), (vectors.astype(dtype).astype(np.float32) ** 2).sum(axis=1))
+
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        ids, texts = [], []
+        with open(os.path.join(tmp_path, CHUNKS_FILENAME), "wb") as f:
+            for position in range(count):
+                docstore_id = vectorstore.index_to_docstore_id[position]
+                doc = vectorstore.docstore.search(docstore_id)
+                record = json.dumps({'id': docstore_id, 'page_content': doc.page_content, 'metadata': doc.metadata})
+                offsets[position + 1] = offsets[position] + f.write(record.encode("utf-8"))
+                ids.append(str(position))
+                texts.append(doc.page_content)
+        np.save(os.path.join(tmp_path, OFFSETS_FILENAME), offsets)
+        BM25Index.from_documents(ids, texts).save(os.path.join(tmp_path, BM25_FILENAME))
+
+        with open(os.path.join(tmp_path, STORE_FILENAME), "w", encoding="utf-8") as f:
+            json.dump({'version': FORMAT_VERSION, 'count': count, 'dim': dim, 'dtype': dtype, 'created_at': time.time()}, f)
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        # Outro worker pode ter gravado o mesmo store primeiro
+        if not is_mmap_store(path):
+            raise
+        return
+
+    logger.info(f"Store mapeado gravado em {path} ({count} vetores {dtype}) em {time.perf_counter() - start:.2f}s")
+
+
+def open_mmap_store(path: str, embeddings) -> "MmapVectorStore":
+    """Abre o store mapeado, reaproveitando o já aberto no processo para o mesmo caminho."""
+    path = os.path.abspath(path)
+    with _open_lock:
+        store = _open_stores.get(path)
+        if store is None:
+            store = MmapVectorStore(path, embeddings)
+            _open_stores[path] = store
+    os.utime(os.path.join(path, STORE_FILENAME), None)
+    return store
+
+
+class MmapVectorStore(VectorStore):
+    """Vectorstore somente leitura sobre arquivos mapeados em memória.
+
+    Vetores, normas e offsets são abertos com `np.load(mmap_mode="r")` e os
+    chunks com `mmap`: abrir o store não lê os arquivos, e as páginas ficam
+    no page cache do sistema, compartilhadas entre as sessões e os workers
+    que usam o mesmo documento. A busca é exata (distância L2, como o
+    `IndexFlatL2`), em blocos convertidos para float32.
+    """
+
+    def __init__(self, path: str, embeddings):
+        self.path = path
+        self._embeddings = embeddings
+        with open(os.path.join(path, STORE_FILENAME), encoding="utf-8") as f:
+            self.info = json.load(f)
+        if self.info['version'] != FORMAT_VERSION:
+            raise ValueError(f"Versão do store mapeado não suportada: {self.info['version']}")
+
+        self.vectors = np.load(os.path.join(path, VECTORS_FILENAME), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, NORMS_FILENAME), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILENAME), mmap_mode="r")
+        with open(os.path.join(path, CHUNKS_FILENAME), "rb") as f:
+            self._chunks = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.info['count'] else b""
+        self._bm25 = None
+        self._bm25_lock = threading.Lock()
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    @property
+    def size_bytes(self) -> int:
+        """Os arquivos mapeados ficam no page cache, fora da memória estimada da sessão."""
+        return 0
+
+    def __len__(self) -> int:
+        return self.info['count']
+
+    def document(self, position: int) -> Document:
+        record = json.loads(self._chunks[self.offsets[position]:self.offsets[position + 1]])
+        return Document(id=record['id'], page_content=record['page_content'], metadata=record['metadata'])
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs) -> list:
+        count = len(self)
+        if not count:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+
+        # ||v - q||² = ||v||² - 2·v·q + ||q||²; o termo da consulta não altera a ordem
+        distances = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK):
+            block = np.asarray(self.vectors[start:start + SEARCH_BLOCK], dtype=np.float32)
+            distances[start:start + len(block)] = self.norms[start:start + len(block)] - 2 * (block @ query)
+
+        k = min(k, count)
+        top = np.argpartition(distances, k - 1)[:k]
+        return [self.document(int(position)) for position in top[np.argsort(distances[top])]]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list:
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k, **kwargs)
+
+    def keyword_search(self, query: str, k: int) -> list:
+        """Busca BM25 nos chunks, com o índice carregado na primeira consulta."""
+        if self._bm25 is None:
+            with self._bm25_lock:
+                if self._bm25 is None:
+                    bm25 = BM25Index.load(os.path.join(self.path, BM25_FILENAME))
+                    if bm25 is None:
+                        bm25 = BM25Index.from_documents(
+                            [str(p) for p in range(len(self))], [self.document(p).page_content for p in range(len(self))]
+                        )
+                    self._bm25 = bm25
+        return [self.document(int(position)) for position, _ in self._bm25.search(query, k)]
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("O store mapeado é somente leitura; grave um novo com write_mmap_store")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Use write_mmap_store a partir de um vectorstore FAISS")
@@ -0,0 +1,117 @@
+import os
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pypdf
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Cada worker recebe várias faixas pequenas para balancear páginas de custo desigual
+RANGES_PER_WORKER = 4
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Retorna o pool de processos compartilhado, recriando-o se o tamanho mudar.
+
+    Com "spawn", cada processo reexecuta o script principal como `__mp_main__`:
+    o servidor deve ser iniciado por `run.py`, gunicorn ou hypercorn, que só
+    importam o app fora desse caminho, para que os processos de parsing não
+    carreguem o app, o modelo de embeddings e o corpus.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # "spawn" evita herdar o estado de threads do PyTorch/Flask no fork
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def _normalize_metadata(metadata: dict) -> dict:
+    """Normaliza os metadados do PDF como o `PyPDFLoader`: chaves sem '/' e em minúsculas, datas em ISO 8601."""
+    normalized = {}
+    for key, value in metadata.items():
+        if type(value) not in (str, int):
+            value = str(value)
+        key = (key[1:] if key.startswith("/") else key).lower()
+        if key in ("creationdate", "moddate"):
+            try:
+                normalized[key] = datetime.strptime(value.replace("'", ""), "D:%Y%m%d%H%M%S%z").isoformat("T")
+            except ValueError:
+                normalized[key] = value
+        elif key == "page_count":
+            normalized["total_pages"] = normalized[key] = value
+        elif key == "file_path":
+            normalized["source"] = normalized[key] = value
+        else:
+            normalized[key] = value.strip() if isinstance(value, str) else value
+    return normalized
+
+
+def _parse_page_range(pdf_path: str, start: int, end: int, chunk_size: int, chunk_overlap: int) -> list[Document]:
+    """Extrai e divide as páginas [start, end) com os mesmos metadados do PyPDFLoader."""
+    reader = pypdf.PdfReader(pdf_path)
+    doc_metadata = _normalize_metadata(
+        {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+        | dict(reader.metadata or {})
+        | {"source": pdf_path, "total_pages": len(reader.pages)}
+    )
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    chunks = []
+    for page_number in range(start, end):
+        text = reader.pages[page_number].extract_text(extraction_mode="plain").strip()
+        page = Document(
+            page_content=text,
+            metadata=doc_metadata | {"page": page_number, "page_label": reader.page_labels[page_number]},
+        )
+        chunks.extend(text_splitter.split_documents([page]))
+    return chunks
+
+
+def parse_pdf_parallel(pdf_path: str, chunk_size: int, chunk_overlap: int, workers: int = None, progress=None) -> list[Document]:
+    """Extrai e divide o PDF em paralelo, retornando os chunks na ordem das páginas.
+
+    O splitter atua página a página (assim como `split_documents` sobre o
+    resultado do `PyPDFLoader`), então dividir o intervalo de páginas entre
+    processos produz exatamente os mesmos chunks do caminho sequencial.
+    """
+    workers = workers or os.cpu_count() or 1
+    progress = progress or (lambda stage, **counters: None)
+
+    total_pages = len(pypdf.PdfReader(pdf_path).pages)
+    if total_pages == 0:
+        return []
+
+    range_size = max(1, -(-total_pages // (workers * RANGES_PER_WORKER)))
+    ranges = [(start, min(start + range_size, total_pages)) for start in range(0, total_pages, range_size)]
+    logger.info(f"Extraindo {total_pages} páginas em {len(ranges)} faixas com {workers} processos")
+
+    pool = _get_pool(workers)
+    futures = {
+        pool.submit(_parse_page_range, pdf_path, start, end, chunk_size, chunk_overlap): index
+        for index, (start, end) in enumerate(ranges)
+    }
+
+    results = [None] * len(ranges)
+    pages_parsed = 0
+    for future in as_completed(futures):
+        index = futures[future]
+        results[index] = future.result()
+        start, end = ranges[index]
+        pages_parsed += end - start
+        progress("parsing", pages_parsed=pages_parsed, total_pages=total_pages)
+
+    return [chunk for range_chunks in results for chunk in range_chunks]
@@ -1,36 +1,116 @@
+import time
+
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
 
+from embeddings import embedding_id, get_embeddings
+from index_cache import IndexCache, file_sha256
+from faiss_index import cache_tag, convert_vectorstore, create_vectorstore, set_search_params
+from pdf_parser import parse_pdf_parallel
 from log import get_logger
 
 logger = get_logger(__name__)
 
-EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 150
+EMBED_BATCH_SIZE = 64
+
+
+def split_pdf(pdf_path: str, progress=None, parse_workers: int = 1):
+    """Extrai as páginas do PDF e as divide em chunks, em paralelo se `parse_workers > 1`."""
+    progress = progress or (lambda stage, **counters: None)
+    if parse_workers > 1:
+        return parse_pdf_parallel(pdf_path, CHUNK_SIZE, CHUNK_OVERLAP, workers=parse_workers, progress=progress)
+
+    loader = PyPDFLoader(pdf_path)
+    documents = []
+    for page in loader.lazy_load():
+        documents.append(page)
+        progress("parsing", pages_parsed=len(documents), total_pages=page.metadata.get("total_pages"))
+    
+    if not documents:
+        logger.error("Erro: Não foi possível carregar o documento PDF.")
+        return None
+
+    progress("chunking")
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size = CHUNK_SIZE, chunk_overlap = CHUNK_OVERLAP)
+    return text_splitter.split_documents(documents)
+
+
+def embed_texts(texts: list[str], embeddings, progress=None) -> list[list[float]]:
+    """Gera os embeddings em lotes de `EMBED_BATCH_SIZE`, informando o progresso."""
+    progress = progress or (lambda stage, **counters: None)
+    vectors = []
+    progress("embedding", chunks_embedded=0, total_chunks=len(texts))
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        vectors.extend(embeddings.embed_documents(texts[start:start + EMBED_BATCH_SIZE]))
+        progress("embedding", chunks_embedded=len(vectors))
+    return vectors
+
 
 class RAG:
     """Classe para implementar um agente RAG (Retrieval-Augmented Generation) usando LangChain."""
 
-    def __init__(self, pdf_path: str):
-        """Inicializa o agente RAG com o caminho do PDF a ser processado."""
+    def __init__(
+        self,
+        pdf_path: str,
+        index_cache: IndexCache = None,
+        progress=None,
+        streaming: bool = False,
+        parse_workers: int = 1,
+    ):
+        """Inicializa o agente RAG com o caminho do PDF a ser processado.
+
+        Se um `index_cache` for informado, o índice FAISS é reaproveitado quando
+        o mesmo PDF (mesmo conteúdo) já foi indexado com os mesmos parâmetros.
+        `progress(stage, **contadores)` é chamado a cada etapa da ingestão.
+        Com `streaming=True` as páginas são processadas e indexadas em lotes à
+        medida que são lidas, mantendo o pico de memória limitado.
+        Com `parse_workers > 1` (e sem streaming) a extração e o chunking das
+        páginas são distribuídos entre processos.
+        """
         self.pdf_path = pdf_path
+        self.index_cache = index_cache
+        self.streaming = streaming
+        self.parse_workers = parse_workers
+        self.progress = progress or (lambda stage, **counters: None)
+        self.doc_hash = file_sha256(pdf_path)
+
+        start = time.perf_counter()
         self.retriever = self._get_retriever()
+        logger.info(f"Retriever pronto para {self.pdf_path} em {time.perf_counter() - start:.2f}s")
 
     def _get_retriever(self):
-        """Processa o PDF, divide em chunks, gera embeddings e cria um retriever."""
+        """Obtém o índice do cache ou processa o PDF, e cria um retriever."""
+        embeddings = get_embeddings()
 
-        logger.info(f"Processando o PDF: {self.pdf_path}")
-        
-        loader = PyPDFLoader(self.pdf_path)
-        documents = loader.load()
-        
-        if not documents:
-            logger.error("Erro: Não foi possível carregar o documento PDF.")
+        cache_key = None
+        if self.index_cache is not None:
+            cache_key = IndexCache.make_key(self.doc_hash, CHUNK_SIZE, CHUNK_OVERLAP, embedding_id(), cache_tag())
+            vectorstore = self.index_cache.load(cache_key, embeddings)
+            if vectorstore is not None:
+                set_search_params(vectorstore.index)
+                return vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 4})
+
+        if self.streaming:
+            vectorstore = self._build_vectorstore_streaming(embeddings)
+        else:
+            vectorstore = self._build_vectorstore(embeddings)
+        if vectorstore is None:
             return None
 
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size = 1000, chunk_overlap = 150)
-        chunks = text_splitter.split_documents(documents)
+        if cache_key is not None:
+            self.index_cache.save(cache_key, vectorstore, {"source": self.pdf_path})
+
+        return vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 4})
+
+    def _build_vectorstore(self, embeddings):
+        """Processa o PDF, divide em chunks e gera o índice FAISS com os embeddings."""
+
+        logger.info(f"Processando o PDF: {self.pdf_path}")
+        
+        chunks = split_pdf(self.pdf_path, self.progress, self.parse_workers)
         
         if not chunks:
             logger.error("Erro: Não foi possível dividir o documento em chunks.")
@@ -38,10 +118,60 @@ class RAG:
 
         logger.info(f"Documento dividido em {len(chunks)} chunks.")
 
-        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, cache_folder="./cache")
-        vectorstore = FAISS.from_documents(chunks, embeddings)
+        texts = [chunk.page_content for chunk in chunks]
+        vectors = embed_texts(texts, embeddings, self.progress)
 
-        return vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 4})
+        # Tipo de índice (flat, IVF, HNSW, PQ/SQ) conforme FAISS_INDEX_TYPE
+        return create_vectorstore(texts, vectors, embeddings, metadatas=[chunk.metadata for chunk in chunks])
+
+    def _build_vectorstore_streaming(self, embeddings):
+        """Lê o PDF página a página, dividindo e indexando os chunks em lotes de tamanho fixo."""
+
+        logger.info(f"Processando o PDF em modo streaming: {self.pdf_path}")
+
+        loader = PyPDFLoader(self.pdf_path)
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size = CHUNK_SIZE, chunk_overlap = CHUNK_OVERLAP)
+
+        vectorstore = None
+        pending = []
+        pages_parsed = 0
+        chunks_embedded = 0
+
+        for page in loader.lazy_load():
+            pages_parsed += 1
+            self.progress("parsing", pages_parsed=pages_parsed, total_pages=page.metadata.get("total_pages"))
+            pending.extend(text_splitter.split_documents([page]))
+
+            while len(pending) >= EMBED_BATCH_SIZE:
+                batch, pending = pending[:EMBED_BATCH_SIZE], pending[EMBED_BATCH_SIZE:]
+                vectorstore = self._add_batch(vectorstore, batch, embeddings)
+                chunks_embedded += len(batch)
+                self.progress("embedding", chunks_embedded=chunks_embedded)
+
+        if pending:
+            vectorstore = self._add_batch(vectorstore, pending, embeddings)
+            chunks_embedded += len(pending)
+            self.progress("embedding", chunks_embedded=chunks_embedded)
+
+        if vectorstore is None:
+            logger.error("Erro: Não foi possível carregar o documento PDF ou dividi-lo em chunks.")
+            return None
+
+        logger.info(f"Documento indexado em {chunks_embedded} chunks ({pages_parsed} páginas).")
+        # Os lotes são adicionados a um índice flat; índices treináveis precisam de todos os vetores
+        return convert_vectorstore(vectorstore)
+
+    @staticmethod
+    def _add_batch(vectorstore, chunks, embeddings):
+        """Gera os embeddings de um lote e o adiciona ao índice, criando-o no primeiro lote."""
+        texts = [chunk.page_content for chunk in chunks]
+        text_embeddings = zip(texts, embeddings.embed_documents(texts))
+        metadatas = [chunk.metadata for chunk in chunks]
+
+        if vectorstore is None:
+            return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+        vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+        return vectorstore
     
 
 # if __name__ == "__main__":
@@ -0,0 +1,15 @@
+"""Servidor de desenvolvimento do Flask.
+
+Uso (a partir de Projeto_1/):
+    python run.py
+
+Com `PDF_PARSE_WORKERS > 1`, os processos de parsing ("spawn") reexecutam o
+script principal como `__mp_main__`. Este arquivo só importa o app dentro do
+bloco `__main__`, então esses processos não carregam o app, o modelo de
+embeddings nem o corpus.
+"""
+
+if __name__ == '__main__':
+    from app import create_app
+
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,244 @@
+import os
+import abc
+import json
+import time
+import sqlite3
+import threading
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class SessionBackend(abc.ABC):
+    """Interface do armazenamento de sessões compartilhado entre workers.
+
+    Guarda, por sessão, o registro com o caminho do índice FAISS salvo e os
+    metadados do documento, o histórico de chat e o estado dos jobs de
+    ingestão. Os agentes em si nunca são serializados: cada worker os
+    reconstrói a partir do índice sob demanda.
+    """
+
+    # Backends persistentes exigem que o índice seja salvo em disco no registro da sessão
+    persistent = False
+
+    @abc.abstractmethod
+    def save_session(self, session_id: str, record: dict):
+        ...
+
+    @abc.abstractmethod
+    def load_session(self, session_id: str):
+        ...
+
+    @abc.abstractmethod
+    def delete_session(self, session_id: str):
+        ...
+
+    @abc.abstractmethod
+    def expired_sessions(self, max_age: float) -> list[str]:
+        ...
+
+    @abc.abstractmethod
+    def append_message(self, session_id: str, message: dict):
+        ...
+
+    @abc.abstractmethod
+    def get_history(self, session_id: str) -> list[dict]:
+        ...
+
+    @abc.abstractmethod
+    def save_job(self, job_id: str, job: dict):
+        ...
+
+    @abc.abstractmethod
+    def load_job(self, job_id: str):
+        ...
+
+    @abc.abstractmethod
+    def delete_expired_jobs(self, max_age: float) -> int:
+        """Remove os jobs sem atualização há mais de `max_age` segundos e retorna quantos saíram."""
+
+
+class InMemorySessionBackend(SessionBackend):
+    """Backend em memória do processo: usado com um único worker e em testes."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._histories = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def save_session(self, session_id: str, record: dict):
+        with self._lock:
+            self._sessions[session_id] = {**record, 'updated_at': time.time()}
+            self._histories.setdefault(session_id, [])
+
+    def load_session(self, session_id: str):
+        with self._lock:
+            record = self._sessions.get(session_id)
+            return dict(record) if record is not None else None
+
+    def delete_session(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._histories.pop(session_id, None)
+            for job_id in [jid for jid, job in self._jobs.items() if job['session_id'] == session_id]:
+                del self._jobs[job_id]
+
+    def expired_sessions(self, max_age: float) -> list[str]:
+        now = time.time()
+        with self._lock:
+            return [sid for sid, record in self._sessions.items() if now - record['updated_at'] > max_age]
+
+    def append_message(self, session_id: str, message: dict):
+        with self._lock:
+            self._histories.setdefault(session_id, []).append(message)
+            if session_id in self._sessions:
+                self._sessions[session_id]['updated_at'] = time.time()
+
+    def get_history(self, session_id: str) -> list[dict]:
+        with self._lock:
+            return list(self._histories.get(session_id, []))
+
+    def save_job(self, job_id: str, job: dict):
+        with self._lock:
+            self._jobs[job_id] = {**job, 'updated_at': time.time()}
+
+    def load_job(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            job.pop('updated_at')
+            return job
+
+    def delete_expired_jobs(self, max_age: float) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [jid for jid, job in self._jobs.items() if now - job['updated_at'] > max_age]
+            for job_id in expired:
+                del self._jobs[job_id]
+            return len(expired)
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Backend em SQLite (modo WAL) compartilhado por todos os workers do host.
+
+    Os índices são salvos em `index_dir`, que deve estar no mesmo sistema de
+    arquivos (ou volume compartilhado) visto por todos os workers.
+    """
+
+    persistent = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            record TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            message TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at);
+        CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            job TEXT NOT NULL,
+            updated_at REAL NOT NULL DEFAULT 0
+        );
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+            # Bancos criados antes da expiração dos jobs não têm a coluna updated_at
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'updated_at' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (updated_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Uma conexão por thread; o modo WAL permite leituras concorrentes entre processos."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save_session(self, session_id: str, record: dict):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, record, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(record), time.time()),
+            )
+
+    def load_session(self, session_id: str):
+        row = self._connection().execute(
+            "SELECT record FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_session(self, session_id: str):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM jobs WHERE session_id = ?", (session_id,))
+
+    def expired_sessions(self, max_age: float) -> list[str]:
+        rows = self._connection().execute(
+            "SELECT session_id FROM sessions WHERE updated_at < ?", (time.time() - max_age,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def append_message(self, session_id: str, message: dict):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO messages (session_id, message) VALUES (?, ?)",
+                (session_id, json.dumps(message)),
+            )
+            conn.execute(
+                "UPDATE sessions SET updated_at = ? WHERE session_id = ?", (time.time(), session_id)
+            )
+
+    def get_history(self, session_id: str) -> list[dict]:
+        rows = self._connection().execute(
+            "SELECT message FROM messages WHERE session_id = ? ORDER BY id", (session_id,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def save_job(self, job_id: str, job: dict):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, session_id, job, updated_at) VALUES (?, ?, ?, ?)",
+                (job_id, job['session_id'], json.dumps(job), time.time()),
+            )
+
+    def load_job(self, job_id: str):
+        row = self._connection().execute("SELECT job FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_expired_jobs(self, max_age: float) -> int:
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM jobs WHERE updated_at < ?", (time.time() - max_age,))
+            return cursor.rowcount
+
+
+def create_session_backend(kind: str = None) -> SessionBackend:
+    """Cria o backend configurado em `SESSION_BACKEND` (`memory` ou `sqlite`)."""
+    kind = kind or os.environ.get("SESSION_BACKEND", "memory")
+    if kind == "memory":
+        return InMemorySessionBackend()
+    if kind == "sqlite":
+        db_path = os.environ.get("SESSION_DB_PATH", "./sessions/sessions.db")
+        logger.info(f"Usando backend de sessões SQLite em {db_path}")
+        return SQLiteSessionBackend(db_path)
+    raise ValueError(f"SESSION_BACKEND inválido: {kind}")
@@ -0,0 +1,336 @@
+import os
+import sys
+import time
+import shutil
+import threading
+from collections import OrderedDict
+
+from langchain_community.vectorstores import FAISS
+
+from embeddings import embedding_id, get_embeddings
+from faiss_index import index_bytes, set_search_params
+from index_cache import IndexCache
+from mmap_store import STORE_FILENAME, MmapVectorStore, is_mmap_store, open_mmap_store, supports_mmap, write_mmap_store
+from rag import CHUNK_OVERLAP, CHUNK_SIZE
+from session_backend import InMemorySessionBackend
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Estimativa fixa para o grafo LangGraph compilado, ferramentas e cliente do LLM
+AGENT_OVERHEAD_BYTES = 256 * 1024
+# Intervalo entre as limpezas de stores mapeados sem uso
+STORE_PRUNE_INTERVAL = 600
+
+
+class Session:
+    """Sessão ativa no worker: agente e retriever de um documento carregado."""
+
+    def __init__(self, session_id: str, retriever, agent, filename: str = None, doc_hash: str = None):
+        self.session_id = session_id
+        self.retriever = retriever
+        self.agent = agent
+        self.filename = filename
+        self.doc_hash = doc_hash
+        self.last_access = time.time()
+        self.size_bytes = estimate_session_bytes(self)
+
+    def to_dict(self) -> dict:
+        return {
+            'session_id': self.session_id,
+            'filename': self.filename,
+            'size_bytes': self.size_bytes,
+            'idle_seconds': round(time.time() - self.last_access, 1),
+        }
+
+
+def estimate_session_bytes(session: Session) -> int:
+    """Estima a memória ocupada pela sessão (vetores e textos dos chunks)."""
+    size = AGENT_OVERHEAD_BYTES
+    vectorstore = getattr(session.retriever, "vectorstore", None)
+    if not isinstance(vectorstore, FAISS):
+        # Sessões do corpus guardam só as posições (e, em seleções pequenas, os vetores) dos seus documentos
+        return size + getattr(vectorstore, "size_bytes", 0)
+    size += index_bytes(vectorstore.index)
+    for doc in vectorstore.docstore._dict.values():
+        size += sys.getsizeof(doc.page_content) + sys.getsizeof(doc.metadata)
+    return size
+
+
+class SessionManager:
+    """Mantém as sessões ativas do worker com expiração por inatividade e evicção LRU.
+
+    Os limites são de quantidade de sessões e de memória estimada. O registro
+    da sessão e o histórico ficam no `backend`; com um backend persistente o
+    índice é salvo em `index_dir` no registro, e qualquer worker pode
+    reconstruir o agente sob demanda. Com o backend em memória, `index_dir`
+    é opcional e só é usado para salvar o índice das sessões despejadas.
+
+    Com um `corpus`, sessões criadas por `add_documents` não têm índice
+    próprio: o registro guarda os `doc_ids` selecionados e o retriever é
+    recriado a partir do corpus compartilhado.
+
+    Com `index_dir` e `store_format="mmap"` (`SESSION_STORE_FORMAT`), índices
+    flat são gravados uma vez por documento em `index_dir/docs/` no formato
+    de `mmap_store.py` e as sessões passam a buscar no store mapeado: o
+    índice em memória é descartado, sessões e workers do mesmo documento
+    compartilham as páginas do page cache e a reconstrução após um restart
+    não lê os vetores. Stores sem acesso há mais de `spill_ttl` são removidos.
+    """
+
+    def __init__(
+        self,
+        agent_factory,
+        backend=None,
+        idle_ttl: int = None,
+        max_sessions: int = None,
+        max_bytes: int = None,
+        index_dir: str = None,
+        spill_ttl: int = 24 * 3600,
+        corpus=None,
+        store_format: str = None,
+        vector_dtype: str = None,
+    ):
+        self.agent_factory = agent_factory
+        self.corpus = corpus
+        self.backend = backend or InMemorySessionBackend()
+        self.idle_ttl = idle_ttl or int(os.environ.get("SESSION_IDLE_TTL", 3600))
+        self.max_sessions = max_sessions or int(os.environ.get("SESSION_MAX", 100))
+        self.max_bytes = max_bytes or int(os.environ.get("SESSION_MAX_MB", 2048)) * 1024 * 1024
+        self.index_dir = index_dir if index_dir is not None else os.environ.get("SESSION_SPILL_DIR")
+        if self.backend.persistent and not self.index_dir:
+            self.index_dir = "./sessions/indices"
+        self.spill_ttl = spill_ttl
+        self.store_format = (store_format or os.environ.get("SESSION_STORE_FORMAT", "mmap")).lower()
+        self.vector_dtype = vector_dtype or os.environ.get("SESSION_VECTOR_DTYPE", "float32")
+
+        self._sessions = OrderedDict()
+        self._total_bytes = 0
+        self._last_store_prune = 0.0
+        self._lock = threading.RLock()
+
+        if self.index_dir:
+            os.makedirs(self.index_dir, exist_ok=True)
+
+    def add(self, session_id: str, retriever, filename: str = None, doc_hash: str = None) -> Session:
+        """Cria o agente para o retriever e registra a sessão como a mais recente."""
+        record = {
+            'index_path': None,
+            'filename': filename,
+            'doc_hash': doc_hash,
+            'search_kwargs': retriever.search_kwargs,
+        }
+        if self.backend.persistent or self._uses_mmap(retriever.vectorstore):
+            record['index_path'] = self._save_index(session_id, retriever, doc_hash)
+        if is_mmap_store(record['index_path']):
+            retriever = self._load_retriever(record)
+        self.backend.save_session(session_id, record)
+
+        return self._activate(session_id, retriever, record)
+
+    def add_documents(self, session_id: str, doc_ids: list[str], filename: str = None) -> Session:
+        """Cria (ou substitui) a sessão sobre um subconjunto dos documentos do corpus."""
+        record = {
+            'index_path': None,
+            'filename': filename,
+            'doc_hash': self.corpus.selection_key(doc_ids),
+            'doc_ids': list(doc_ids),
+            'search_kwargs': {'k': 4},
+        }
+        retriever = self.corpus.retriever(record['doc_ids'], **record['search_kwargs'])
+        self.backend.save_session(session_id, record)
+
+        return self._activate(session_id, retriever, record)
+
+    def get(self, session_id: str):
+        """Retorna a sessão, reconstruindo-a a partir do backend se não estiver neste worker."""
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                # Outro worker pode ter removido a sessão do armazenamento compartilhado
+                if self.backend.persistent and self.backend.load_session(session_id) is None:
+                    self._drop(session_id)
+                    return None
+                session.last_access = time.time()
+                self._sessions.move_to_end(session_id)
+                self._touch_store(session.retriever)
+                return session
+
+            record = self.backend.load_session(session_id)
+            if record is None or not (record.get('index_path') or self._from_corpus(record)):
+                return None
+            return self._restore(session_id, record)
+
+    def remove(self, session_id: str):
+        """Remove a sessão do worker, do backend e do disco."""
+        with self._lock:
+            self._drop(session_id)
+            record = self.backend.load_session(session_id)
+            # Stores por documento podem estar em uso por outras sessões: saem pela limpeza por idade
+            if record is not None and record.get('index_path') and not self._is_shared_store(record['index_path']):
+                shutil.rmtree(record['index_path'], ignore_errors=True)
+            self.backend.delete_session(session_id)
+
+    def append_message(self, session_id: str, message: dict):
+        self.backend.append_message(session_id, message)
+
+    def history(self, session_id: str) -> list[dict]:
+        return self.backend.get_history(session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'active_sessions': len(self._sessions),
+                'estimated_bytes': self._total_bytes,
+                'max_sessions': self.max_sessions,
+                'max_bytes': self.max_bytes,
+                'sessions': [session.to_dict() for session in self._sessions.values()],
+            }
+
+    def _activate(self, session_id: str, retriever, record: dict) -> Session:
+        agent = self.agent_factory(retriever, index_id=record['doc_hash'])
+        session = Session(session_id, retriever, agent, filename=record['filename'], doc_hash=record['doc_hash'])
+
+        with self._lock:
+            self._drop(session_id)
+            self._sessions[session_id] = session
+            self._total_bytes += session.size_bytes
+            self._touch_store(retriever)
+            logger.info(f"Sessão {session_id} ativa ({session.size_bytes / 1024 / 1024:.1f}MB estimados)")
+            self._evict()
+        return session
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._total_bytes -= session.size_bytes
+
+    def _evict(self):
+        """Remove sessões expiradas e, em seguida, as menos usadas até respeitar os limites."""
+        now = time.time()
+        expired = [sid for sid, s in self._sessions.items() if now - s.last_access > self.idle_ttl]
+        for session_id in expired:
+            self._evict_one(session_id, reason="inatividade")
+
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes):
+            session_id = next(iter(self._sessions))
+            self._evict_one(session_id, reason="limite de memória/sessões")
+
+        for session_id in self.backend.expired_sessions(self.spill_ttl):
+            self.remove(session_id)
+        if self.index_dir and now - self._last_store_prune > STORE_PRUNE_INTERVAL:
+            self._last_store_prune = now
+            self._prune_stores()
+
+    def _evict_one(self, session_id: str, reason: str):
+        session = self._sessions[session_id]
+        self._drop(session_id)
+
+        record = self.backend.load_session(session_id)
+        if record is None:
+            return
+        if not record.get('index_path') and not self._from_corpus(record) and self.index_dir:
+            try:
+                record['index_path'] = self._save_index(session_id, session.retriever, record['doc_hash'])
+                self.backend.save_session(session_id, record)
+                logger.info(f"Sessão {session_id} salva em disco ({reason})")
+                return
+            except Exception as e:
+                logger.warning(f"Não foi possível salvar a sessão {session_id} em disco: {e}")
+        if record.get('index_path') or self._from_corpus(record):
+            logger.info(f"Sessão {session_id} liberada da memória ({reason})")
+        else:
+            self.backend.delete_session(session_id)
+            logger.info(f"Sessão {session_id} removida ({reason})")
+
+    def _from_corpus(self, record: dict) -> bool:
+        return bool(record.get('doc_ids')) and self.corpus is not None
+
+    def _uses_mmap(self, vectorstore) -> bool:
+        return bool(self.index_dir) and self.store_format == "mmap" and supports_mmap(vectorstore)
+
+    @property
+    def _store_dir(self) -> str:
+        return os.path.join(self.index_dir, "docs")
+
+    def _is_shared_store(self, path: str) -> bool:
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self._store_dir)
+
+    def _save_index(self, session_id: str, retriever, doc_hash: str = None) -> str:
+        vectorstore = retriever.vectorstore
+        if isinstance(vectorstore, MmapVectorStore):
+            return vectorstore.path
+        if not self._uses_mmap(vectorstore):
+            path = os.path.join(self.index_dir, session_id)
+            vectorstore.save_local(path)
+            return path
+
+        if doc_hash is None:
+            path = os.path.join(self.index_dir, session_id)
+        else:
+            # Mesma chave do cache de índices: mudar o chunking ou o modelo gera outro store
+            key = IndexCache.make_key(doc_hash, CHUNK_SIZE, CHUNK_OVERLAP, embedding_id(), f"mmap-{self.vector_dtype}")
+            path = os.path.join(self._store_dir, key)
+            os.makedirs(self._store_dir, exist_ok=True)
+        if not is_mmap_store(path):
+            write_mmap_store(vectorstore, path, self.vector_dtype)
+        return path
+
+    def _load_retriever(self, record: dict):
+        if is_mmap_store(record['index_path']):
+            vectorstore = open_mmap_store(record['index_path'], get_embeddings())
+        else:
+            vectorstore = FAISS.load_local(record['index_path'], get_embeddings(), allow_dangerous_deserialization=True)
+            set_search_params(vectorstore.index)
+        return vectorstore.as_retriever(search_type="similarity", search_kwargs=record['search_kwargs'])
+
+    def _touch_store(self, retriever):
+        """Atualiza o mtime do store mapeado usado pela sessão, marcando-o como em uso."""
+        vectorstore = getattr(retriever, 'vectorstore', None)
+        if not isinstance(vectorstore, MmapVectorStore):
+            return
+        try:
+            os.utime(os.path.join(vectorstore.path, STORE_FILENAME), None)
+        except FileNotFoundError:
+            pass
+
+    def _prune_stores(self):
+        """Remove os stores por documento sem acesso há mais de `spill_ttl`.
+
+        Cada acesso a uma sessão (em qualquer worker) atualiza o mtime do
+        `store.json` do seu store, e o registro de uma sessão expira após o
+        mesmo `spill_ttl`: um store mais antigo que isso não é usado por
+        nenhuma sessão válida. Os stores das sessões ativas neste worker nunca
+        são removidos.
+        """
+        if not os.path.isdir(self._store_dir):
+            return
+        in_use = {
+            os.path.abspath(session.retriever.vectorstore.path)
+            for session in self._sessions.values()
+            if isinstance(getattr(session.retriever, 'vectorstore', None), MmapVectorStore)
+        }
+        now = time.time()
+        for name in os.listdir(self._store_dir):
+            path = os.path.join(self._store_dir, name)
+            if os.path.abspath(path) in in_use:
+                continue
+            try:
+                idle = now - os.path.getmtime(os.path.join(path, STORE_FILENAME))
+            except FileNotFoundError:
+                continue
+            if idle > self.spill_ttl:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Store mapeado removido por inatividade: {name[:12]}")
+
+    def _restore(self, session_id: str, record: dict) -> Session:
+        start = time.perf_counter()
+        if self._from_corpus(record):
+            retriever = self.corpus.retriever(record['doc_ids'], **record['search_kwargs'])
+        else:
+            retriever = self._load_retriever(record)
+
+        session = self._activate(session_id, retriever, record)
+        logger.info(f"Sessão {session_id} reconstruída do disco em {time.perf_counter() - start:.3f}s")
+        return session
@@ -20,9 +20,13 @@ const elements = {
     sendBtn: document.getElementById('send-btn'),
     newDocumentBtn: document.getElementById('new-document-btn'),
     documentName: document.getElementById('document-name'),
-    loadingOverlay: document.getElementById('loading-overlay')
+    loadingOverlay: document.getElementById('loading-overlay'),
+    loadingText: document.getElementById('loading-text')
 };
 
+// Intervalo de consulta do progresso da ingestão (ms)
+const STATUS_POLL_INTERVAL = 1000;
+
 // Inicialização
 document.addEventListener('DOMContentLoaded', () => {
     setupEventListeners();
@@ -53,10 +57,11 @@ function handleFileSelect(e) {
         return;
     }
     
-    // Verificar tamanho (16MB)
-    const maxSize = 16 * 1024 * 1024;
+    // Verificar tamanho (limite configurado no servidor)
+    const maxUploadMb = parseInt(document.body.dataset.maxUploadMb, 10) || 16;
+    const maxSize = maxUploadMb * 1024 * 1024;
     if (file.size > maxSize) {
-        showStatus('Arquivo muito grande. Tamanho máximo: 16MB', 'error');
+        showStatus(`Arquivo muito grande. Tamanho máximo: ${maxUploadMb}MB`, 'error');
         elements.fileInput.value = '';
         return;
     }
@@ -103,7 +108,13 @@ async function handleFileUpload() {
             state.sessionId = data.session_id;
             state.fileName = data.filename;
             
-            showStatus(data.message, 'success');
+            const job = await waitForIngestion(data.job_id);
+            if (job.status !== 'ready') {
+                showStatus(job.error || 'Erro ao processar arquivo', 'error');
+                return;
+            }
+            
+            showStatus('PDF processado com sucesso! Você pode começar a fazer perguntas.', 'success');
             
             // Aguardar 1 segundo e mostrar chat
             setTimeout(() => {
@@ -117,10 +128,47 @@ async function handleFileUpload() {
         showStatus('Erro de conexão. Tente novamente.', 'error');
     } finally {
         showLoading(false);
+        elements.loadingText.textContent = 'Processando...';
         state.isProcessing = false;
     }
 }
 
+// Consultar o progresso da ingestão até o índice ficar pronto
+async function waitForIngestion(jobId) {
+    while (true) {
+        const response = await fetch(`/api/upload/${jobId}/status`);
+        const job = await response.json();
+        
+        if (!response.ok) {
+            return { status: 'error', error: job.error };
+        }
+        if (job.status === 'ready' || job.status === 'error') {
+            return job;
+        }
+        
+        elements.loadingText.textContent = formatProgress(job);
+        await new Promise(resolve => setTimeout(resolve, STATUS_POLL_INTERVAL));
+    }
+}
+
+// Formatar mensagem de progresso da ingestão
+function formatProgress(job) {
+    if (job.status === 'queued') {
+        return 'Aguardando na fila...';
+    }
+    if (job.stage === 'embedding' && job.total_chunks) {
+        const eta = job.eta_seconds !== null ? ` (~${Math.ceil(job.eta_seconds)}s restantes)` : '';
+        return `Gerando embeddings: ${job.chunks_embedded}/${job.total_chunks} chunks${eta}`;
+    }
+    if (job.stage === 'chunking') {
+        return 'Dividindo o documento em chunks...';
+    }
+    const total = job.total_pages ? `/${job.total_pages}` : '';
+    const eta = job.eta_seconds !== null ? ` (~${Math.ceil(job.eta_seconds)}s restantes)` : '';
+    const chunks = job.chunks_embedded ? `, ${job.chunks_embedded} chunks indexados` : '';
+    return `Lendo páginas: ${job.pages_parsed}${total}${chunks}${eta}`;
+}
+
 // Mostrar seção de chat
 function showChatSection() {
     elements.uploadSection.classList.add('hidden');
@@ -165,7 +213,7 @@ async function handleSendMessage() {
         // Adicionar indicador de digitação
         const typingId = addTypingIndicator();
         
-        const response = await fetch('/api/chat', {
+        const response = await fetch('/api/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -173,16 +221,41 @@ async function handleSendMessage() {
             body: JSON.stringify({ message })
         });
         
-        const data = await response.json();
-        
-        // Remover indicador de digitação
-        removeTypingIndicator(typingId);
-        
-        if (response.ok && data.success) {
-            addMessage('assistant', data.response);
-        } else {
+        if (!response.ok) {
+            const data = await response.json();
+            removeTypingIndicator(typingId);
             addMessage('assistant', `❌ ${data.error || 'Erro ao processar mensagem'}`, true);
+            return;
         }
+        
+        // Renderizar a resposta conforme os tokens chegam
+        let messageText = null;
+        await readServerSentEvents(response, (event, data) => {
+            if (event === 'token') {
+                if (!messageText) {
+                    removeTypingIndicator(typingId);
+                    messageText = addMessage('assistant', '');
+                }
+                messageText.textContent += data.content;
+                scrollToBottom();
+            } else if (event === 'tool') {
+                // O texto gerado antes de consultar o documento não faz parte da resposta final
+                if (messageText) {
+                    messageText.textContent = '';
+                }
+            } else if (event === 'done') {
+                removeTypingIndicator(typingId);
+                if (!messageText) {
+                    addMessage('assistant', data.response);
+                } else {
+                    messageText.textContent = data.response;
+                    scrollToBottom();
+                }
+            } else if (event === 'error') {
+                removeTypingIndicator(typingId);
+                addMessage('assistant', `❌ ${data.error}`, true);
+            }
+        });
     } catch (error) {
         console.error('Erro no chat:', error);
         removeTypingIndicator();
@@ -193,6 +266,33 @@ async function handleSendMessage() {
     }
 }
 
+// Ler um stream Server-Sent Events de uma resposta do fetch
+async function readServerSentEvents(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
 // Adicionar mensagem ao chat
 function addMessage(role, content, isError = false) {
     const messageDiv = document.createElement('div');
@@ -217,6 +317,8 @@ function addMessage(role, content, isError = false) {
     
     elements.chatMessages.appendChild(messageDiv);
     scrollToBottom();
+    
+    return messageDiv.querySelector('.message-text');
 }
 
 // Adicionar indicador de digitação
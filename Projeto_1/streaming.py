@@ -0,0 +1,82 @@
+import json
+import time
+
+from langchain_core.messages import HumanMessage, ToolMessage
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def sse(event: str, data: dict) -> str:
+    """Formata um evento Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ChatStream:
+    """Converte o stream de mensagens do grafo do agente em eventos SSE.
+
+    Produz `token` para cada pedaço de texto gerado pelo LLM, `tool` quando o
+    agente chama a ferramenta de RAG (início e fim) e `done` com a resposta
+    completa. Mede e registra o tempo até o primeiro token da resposta.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.start = time.perf_counter()
+        self.ttft = None
+        self.parts = []
+
+    @staticmethod
+    def inputs(user_message: str) -> dict:
+        return {"messages": [HumanMessage(content=user_message)]}
+
+    def events(self, chunk, metadata: dict) -> list[str]:
+        """Eventos SSE para um item de `stream_mode="messages"`."""
+        if isinstance(chunk, ToolMessage):
+            # A resposta final é a que vem depois da última consulta à ferramenta
+            self.parts = []
+            return [sse('tool', {'name': chunk.name, 'status': 'done'})]
+        if metadata.get('langgraph_node') != 'agent':
+            return []
+
+        events = [
+            sse('tool', {'name': tool_call['name'], 'status': 'start'})
+            for tool_call in getattr(chunk, 'tool_call_chunks', None) or []
+            if tool_call.get('name')
+        ]
+        if isinstance(chunk.content, str) and chunk.content:
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self.start
+                logger.info(f"Primeiro token da sessão {self.session_id} em {self.ttft:.3f}s")
+            self.parts.append(chunk.content)
+            events.append(sse('token', {'content': chunk.content}))
+        return events
+
+    def replay(self, answer: str) -> list[str]:
+        """Envia uma resposta já pronta (ex.: do cache) como um único token."""
+        self.ttft = time.perf_counter() - self.start
+        self.parts = [answer]
+        return [sse('token', {'content': answer})]
+
+    @property
+    def response(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def done(self, cached: bool = False) -> str:
+        elapsed = self.elapsed
+        ttft = f"{self.ttft:.3f}s" if self.ttft is not None else "n/d"
+        origin = " (cache)" if cached else ""
+        logger.info(f"Resposta em streaming da sessão {self.session_id}{origin}: primeiro token {ttft}, total {elapsed:.3f}s")
+        return sse('done', {
+            'response': self.response,
+            'cached': cached,
+            'ttft_ms': round(self.ttft * 1000) if self.ttft is not None else None,
+            'total_ms': round(elapsed * 1000),
+        })
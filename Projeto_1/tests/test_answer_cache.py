@@ -0,0 +1,87 @@
+import math
+
+import pytest
+
+from answer_cache import AnswerCache
+
+
+class TableEmbeddings:
+    """Embeddings fixos por texto; textos desconhecidos caem em um eixo próprio."""
+
+    def __init__(self, vectors: dict):
+        self.vectors = vectors
+        self.calls = 0
+
+    def embed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        return self.vectors.get(" ".join(text.lower().split()), [0.0, 0.0, 1.0])
+
+
+def at_angle(similarity: float) -> list[float]:
+    """Vetor com a similaridade de cosseno informada em relação a [1, 0, 0]."""
+    return [similarity, math.sqrt(1 - similarity ** 2), 0.0]
+
+
+@pytest.fixture
+def embeddings():
+    return TableEmbeddings({
+        "qual a política de senhas?": [1.0, 0.0, 0.0],
+        "qual é a política de senha?": at_angle(0.95),
+        "quem aprova acessos?": at_angle(0.80),
+    })
+
+
+def test_answer_cache_hits_above_threshold_only(embeddings):
+    cache = AnswerCache(embeddings, threshold=0.92, max_entries=10, enabled=True)
+    cache.store("doc", "Qual a política de senhas?", "12 caracteres", latency=2.0)
+
+    answer, similarity = cache.lookup("doc", "Qual é a política de senha?")
+    assert answer == "12 caracteres"
+    assert similarity == pytest.approx(0.95, abs=1e-4)
+    assert cache.lookup("doc", "Quem aprova acessos?") is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['saved_seconds']) == (1, 1, 2.0)
+
+
+def test_answer_cache_is_scoped_by_document(embeddings):
+    cache = AnswerCache(embeddings, threshold=0.92, max_entries=10, enabled=True)
+    cache.store("doc-a", "Qual a política de senhas?", "resposta a", latency=1.0)
+
+    assert cache.lookup("doc-b", "Qual a política de senhas?") is None
+    assert cache.lookup("doc-a", "  QUAL a política   de senhas? ")[0] == "resposta a"
+
+
+def test_answer_cache_invalidate(embeddings):
+    cache = AnswerCache(embeddings, threshold=0.92, max_entries=10, enabled=True)
+    cache.store("doc-a", "Qual a política de senhas?", "a", latency=1.0)
+    cache.store("doc-a", "Quem aprova acessos?", "b", latency=1.0)
+    cache.store("doc-b", "Qual a política de senhas?", "c", latency=1.0)
+
+    assert cache.invalidate("doc-a") == 2
+    assert cache.lookup("doc-a", "Qual a política de senhas?") is None
+    assert cache.lookup("doc-b", "Qual a política de senhas?")[0] == "c"
+    assert cache.invalidate() == 1
+    assert cache.stats()['entries'] == 0
+
+
+def test_answer_cache_store_replaces_equivalent_question_and_bypass(embeddings):
+    cache = AnswerCache(embeddings, threshold=0.92, max_entries=10, enabled=True)
+    cache.store("doc", "Qual a política de senhas?", "antiga", latency=1.0)
+    assert cache.lookup("doc", "Qual a política de senhas?", bypass=True) is None
+    cache.store("doc", "Qual é a política de senha?", "nova", latency=1.0)
+
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['bypassed'] == 1
+    assert cache.lookup("doc", "Qual a política de senhas?")[0] == "nova"
+
+
+def test_answer_cache_lru_limit(embeddings):
+    cache = AnswerCache(embeddings, threshold=0.92, max_entries=2, enabled=True)
+    cache.store("doc", "Qual a política de senhas?", "a", latency=1.0)
+    cache.store("doc", "Quem aprova acessos?", "b", latency=1.0)
+    cache.lookup("doc", "Qual a política de senhas?")
+    cache.store("doc", "Outra pergunta", "c", latency=1.0)
+
+    assert cache.lookup("doc", "Qual a política de senhas?")[0] == "a"
+    assert cache.lookup("doc", "Quem aprova acessos?") is None
@@ -0,0 +1,84 @@
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from bm25 import BM25Index, hybrid_merge, keyword_search_for, reciprocal_rank_fusion, tokenize
+
+DOCS = {
+    'senha': "A senha deve ter no mínimo 12 caracteres e ser trocada a cada 90 dias.",
+    'vpn': "O acesso remoto exige VPN com autenticação multifator.",
+    'backup': "Os backups são diários e a senha do cofre fica com o time de segurança.",
+}
+
+
+def build_index() -> BM25Index:
+    return BM25Index.from_documents(list(DOCS), list(DOCS.values()), sources=["politica.pdf", "politica.pdf", "backup.pdf"])
+
+
+def test_tokenize_keeps_compound_terms_and_parts():
+    assert tokenize("Bloquear /etc/passwd e CVE-2021-44228") == [
+        "bloquear", "etc/passwd", "etc", "passwd", "e", "cve-2021-44228", "cve", "2021", "44228",
+    ]
+
+
+def test_search_ranks_by_bm25():
+    results = build_index().search("senha caracteres", k=3)
+    assert [doc_id for doc_id, _ in results] == ["senha", "backup"]
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_search_with_allowed_ids():
+    index = build_index()
+    assert [doc_id for doc_id, _ in index.search("senha", k=3)] == ["senha", "backup"]
+    assert [doc_id for doc_id, _ in index.search("senha", k=3, allowed={"backup", "vpn"})] == ["backup"]
+
+
+def test_reindex_delete_and_delete_source():
+    index = build_index()
+    index.add(["vpn"], ["Documento sobre firewall."])
+    assert index.search("vpn", k=3) == []
+    assert [doc_id for doc_id, _ in index.search("firewall", k=3)] == ["vpn"]
+
+    index.delete(["senha"])
+    index.delete_source("backup.pdf")
+    assert len(index) == 1
+    assert index.search("senha", k=3) == []
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    index = build_index()
+    index.delete(["vpn"])
+    path = str(tmp_path / "bm25.json")
+    index.save(path)
+
+    loaded = BM25Index.load(path)
+    assert len(loaded) == 2
+    assert loaded.search("senha caracteres", k=3) == index.search("senha caracteres", k=3)
+    assert BM25Index.load(str(tmp_path / "missing.json")) is None
+
+
+def test_load_invalid_file_returns_none(tmp_path):
+    path = tmp_path / "bm25.json"
+    path.write_text("{not json", encoding="utf-8")
+    assert BM25Index.load(str(path)) is None
+
+
+def test_reciprocal_rank_fusion():
+    # c: 1/63 + 1/61 > b: 2/62 > a: 1/61 > d: 1/63
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"]]) == ["c", "b", "a", "d"]
+    # Empate entre "a" e "c": mantém a ordem do primeiro ranking
+    assert reciprocal_rank_fusion([["a", "c"], ["c", "a"]]) == ["a", "c"]
+    assert reciprocal_rank_fusion([["x"], []]) == ["x"]
+
+
+def test_hybrid_merge_deduplicates_by_id():
+    vector = [Document(id="1", page_content="um"), Document(id="2", page_content="dois")]
+    lexical = [Document(id="3", page_content="três"), Document(id="1", page_content="um")]
+    merged = hybrid_merge(vector, lexical, k=2)
+    assert [doc.id for doc in merged] == ["1", "3"]
+
+
+def test_keyword_search_for_faiss_docstore():
+    vectorstore = FAISS.from_texts(list(DOCS.values()), DeterministicFakeEmbedding(size=8))
+    keyword_search = keyword_search_for(vectorstore)
+    assert keyword_search("multifator", 2)[0].page_content == DOCS['vpn']
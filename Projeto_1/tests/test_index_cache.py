@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from index_cache import META_FILENAME, IndexCache
+
+
+class FakeVectorStore:
+    """Grava um arquivo de `size` bytes no lugar do índice."""
+
+    def __init__(self, size: int = 10):
+        self.size = size
+
+    def save_local(self, path: str):
+        os.makedirs(path)
+        with open(os.path.join(path, "index.faiss"), "wb") as f:
+            f.write(b"x" * self.size)
+
+
+def age(cache: IndexCache, key: str, seconds: float):
+    meta_path = os.path.join(cache.cache_dir, key, META_FILENAME)
+    os.utime(meta_path, (time.time() - seconds,) * 2)
+
+
+def keys(cache: IndexCache) -> set[str]:
+    return set(os.listdir(cache.cache_dir))
+
+
+@pytest.fixture
+def embeddings():
+    return DeterministicFakeEmbedding(size=16)
+
+
+def test_make_key_depends_on_every_parameter():
+    base = IndexCache.make_key("abc", 1000, 200, "minilm")
+    assert base == IndexCache.make_key("abc", 1000, 200, "minilm", "flat")
+    assert len({
+        base,
+        IndexCache.make_key("abd", 1000, 200, "minilm"),
+        IndexCache.make_key("abc", 500, 200, "minilm"),
+        IndexCache.make_key("abc", 1000, 100, "minilm"),
+        IndexCache.make_key("abc", 1000, 200, "mpnet"),
+        IndexCache.make_key("abc", 1000, 200, "minilm", "ivf"),
+    }) == 6
+
+
+def test_evicts_least_recently_used_beyond_max_entries(tmp_path):
+    cache = IndexCache(str(tmp_path), max_entries=2, max_bytes=10**9)
+    cache.save("a", FakeVectorStore())
+    age(cache, "a", 300)
+    cache.save("b", FakeVectorStore())
+    age(cache, "b", 200)
+    cache.save("c", FakeVectorStore())
+    assert keys(cache) == {"b", "c"}
+
+
+def test_evicts_by_total_bytes(tmp_path):
+    cache = IndexCache(str(tmp_path), max_entries=10, max_bytes=2500)
+    cache.save("a", FakeVectorStore(1000))
+    age(cache, "a", 300)
+    cache.save("b", FakeVectorStore(1000))
+    age(cache, "b", 200)
+    cache.save("c", FakeVectorStore(1000))
+    assert keys(cache) == {"b", "c"}
+
+
+def test_load_marks_entry_as_recently_used(tmp_path, embeddings):
+    cache = IndexCache(str(tmp_path), max_entries=2, max_bytes=10**9)
+    for key in ("a", "b"):
+        cache.save(key, FAISS.from_texts([f"texto {key}"], embeddings))
+    age(cache, "a", 300)
+    age(cache, "b", 200)
+
+    loaded = cache.load("a", embeddings)
+    cache.save("c", FAISS.from_texts(["texto c"], embeddings))
+
+    assert loaded.similarity_search("texto a", k=1)[0].page_content == "texto a"
+    assert keys(cache) == {"a", "c"}
+
+
+def test_load_miss_and_corrupted_entry(tmp_path, embeddings):
+    cache = IndexCache(str(tmp_path))
+    assert cache.load("missing", embeddings) is None
+
+    cache.save("broken", FakeVectorStore())
+    assert cache.load("broken", embeddings) is None
+    assert "broken" not in keys(cache)
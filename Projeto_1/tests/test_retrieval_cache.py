@@ -0,0 +1,74 @@
+import pytest
+
+from retrieval_cache import RetrievalCache
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        return [1.0, 0.0]
+
+
+class CountingVectorStore:
+    def __init__(self, on_search=None):
+        self.searches = 0
+        self.on_search = on_search
+
+    def similarity_search_by_vector(self, vector, k: int = 4):
+        self.searches += 1
+        if self.on_search:
+            self.on_search()
+        return [f"doc-{self.searches}-{i}" for i in range(k)]
+
+
+@pytest.fixture
+def embeddings():
+    return CountingEmbeddings()
+
+
+def test_retrieval_cache_reuses_embedding_and_search(embeddings):
+    cache = RetrievalCache(embeddings, max_queries=10, max_results=10, enabled=True)
+    store = CountingVectorStore()
+
+    first = cache.search("idx", store, "Política de senhas", {'k': 2})
+    second = cache.search("idx", store, "política  de SENHAS", {'k': 2})
+    other_k = cache.search("idx", store, "Política de senhas", {'k': 3})
+
+    assert first == second
+    assert len(other_k) == 3
+    assert store.searches == 2
+    assert embeddings.calls == 1
+
+
+def test_retrieval_cache_invalidate_by_index(embeddings):
+    cache = RetrievalCache(embeddings, max_queries=10, max_results=10, enabled=True)
+    store_a, store_b = CountingVectorStore(), CountingVectorStore()
+    cache.search("a", store_a, "consulta", {'k': 1})
+    cache.search("b", store_b, "consulta", {'k': 1})
+
+    assert cache.invalidate("a") == 1
+    cache.search("a", store_a, "consulta", {'k': 1})
+    cache.search("b", store_b, "consulta", {'k': 1})
+    assert (store_a.searches, store_b.searches) == (2, 1)
+
+
+def test_retrieval_cache_drops_search_started_before_invalidation(embeddings):
+    cache = RetrievalCache(embeddings, max_queries=10, max_results=10, enabled=True)
+    store = CountingVectorStore(on_search=lambda: cache.invalidate("idx"))
+
+    cache.search("idx", store, "consulta", {'k': 1})
+    store.on_search = None
+    cache.search("idx", store, "consulta", {'k': 1})
+    assert store.searches == 2
+
+
+def test_retrieval_cache_disabled_always_searches(embeddings):
+    cache = RetrievalCache(embeddings, enabled=False)
+    store = CountingVectorStore()
+    cache.search("idx", store, "consulta", {'k': 1})
+    cache.search("idx", store, "consulta", {'k': 1})
+    assert store.searches == 2
+    assert cache.stats()['results'] == 0
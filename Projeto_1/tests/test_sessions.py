@@ -0,0 +1,87 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from session_backend import InMemorySessionBackend
+from sessions import AGENT_OVERHEAD_BYTES, SessionManager
+
+MB = 1024 * 1024
+
+
+def retriever(size_bytes: int = 0):
+    """Retriever falso: sessões fora do FAISS são estimadas pelo `size_bytes` do vectorstore."""
+    return SimpleNamespace(vectorstore=SimpleNamespace(size_bytes=size_bytes), search_kwargs={'k': 4})
+
+
+@pytest.fixture
+def backend():
+    return InMemorySessionBackend()
+
+
+def manager(backend, **kwargs) -> SessionManager:
+    options = {'idle_ttl': 60, 'max_sessions': 10, 'max_bytes': 100 * MB, 'index_dir': ""}
+    return SessionManager(lambda retriever, index_id=None: object(), backend=backend, **{**options, **kwargs})
+
+
+def test_add_and_get(backend):
+    sessions = manager(backend)
+    session = sessions.add("s1", retriever(MB), filename="a.pdf", doc_hash="h1")
+
+    assert sessions.get("s1") is session
+    assert session.size_bytes == AGENT_OVERHEAD_BYTES + MB
+    assert sessions.stats()['estimated_bytes'] == session.size_bytes
+    assert backend.load_session("s1")['filename'] == "a.pdf"
+
+
+def test_idle_session_expires(backend):
+    sessions = manager(backend, idle_ttl=60)
+    sessions.add("s1", retriever(), doc_hash="h1")
+    sessions.add("s2", retriever(), doc_hash="h2")
+    sessions._sessions["s1"].last_access = time.time() - 120
+
+    assert sessions.get("s1") is None
+    assert sessions.get("s2") is not None
+    # Sem índice em disco não há como reconstruir: o registro também sai
+    assert backend.load_session("s1") is None
+
+
+def test_evicts_least_recently_used_beyond_max_sessions(backend):
+    sessions = manager(backend, max_sessions=2)
+    sessions.add("a", retriever())
+    sessions.add("b", retriever())
+    sessions.get("a")
+    sessions.add("c", retriever())
+
+    assert list(sessions._sessions) == ["a", "c"]
+    assert sessions.get("b") is None
+
+
+def test_evicts_until_under_max_bytes(backend):
+    sessions = manager(backend, max_bytes=5 * MB)
+    sessions.add("a", retriever(2 * MB))
+    sessions.add("b", retriever(2 * MB))
+    sessions.add("c", retriever(2 * MB))
+
+    assert list(sessions._sessions) == ["b", "c"]
+    assert sessions.stats()['estimated_bytes'] <= 5 * MB
+
+
+def test_replacing_session_does_not_double_count_bytes(backend):
+    sessions = manager(backend)
+    sessions.add("s1", retriever(MB))
+    sessions.add("s1", retriever(3 * MB))
+
+    assert sessions.stats()['active_sessions'] == 1
+    assert sessions.stats()['estimated_bytes'] == AGENT_OVERHEAD_BYTES + 3 * MB
+
+
+def test_remove_drops_session_and_history(backend):
+    sessions = manager(backend)
+    sessions.add("s1", retriever())
+    sessions.append_message("s1", {'role': 'user', 'content': 'oi'})
+    sessions.remove("s1")
+
+    assert sessions.get("s1") is None
+    assert sessions.history("s1") == []
+    assert sessions.stats()['estimated_bytes'] == 0
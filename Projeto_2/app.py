@@ -1,10 +1,17 @@
 import os
 import sys
-from flask import Flask, request, jsonify, render_template
+import hmac
+import zlib
+import threading
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
 from datetime import datetime
 import json
 from rag_agent import RAGAgent
+from log_filter import iter_text_blocks
+from streaming import AnalysisStream, SSE_HEADERS, sse
+from embeddings import embedding_config, embedding_id, warmup_embeddings
+from llm_gateway import get_gateway
 from log import get_logger
 
 logger = get_logger(__name__)
@@ -14,16 +21,44 @@ app = Flask(__name__)
 CORS(app)
 
 rag_agent = None
+rag_agent_lock = threading.Lock()
 
 def init_rag_agent():
     """Inicializa o RAG Agent de forma lazy"""
     global rag_agent
     if rag_agent is None:
-        logger.info("Inicializando RAG Agent...")
-        rag_agent = RAGAgent()
-        logger.info("RAG Agent inicializado com sucesso!")
+        # Requisições simultâneas na primeira chamada não criam dois agentes
+        with rag_agent_lock:
+            if rag_agent is None:
+                logger.info("Inicializando RAG Agent...")
+                rag_agent = RAGAgent()
+                logger.info("RAG Agent inicializado com sucesso!")
     return rag_agent
 
+def check_admin_token():
+    """Retorna a resposta de erro se a requisição não traz o `ADMIN_TOKEN`, ou None se autorizada.
+
+    Sem `ADMIN_TOKEN` configurado as operações administrativas ficam desativadas.
+    """
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if not admin_token:
+        return jsonify({'error': 'Operação administrativa desativada: defina ADMIN_TOKEN'}), 403
+    provided = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(provided.encode(), admin_token.encode()):
+        return jsonify({'error': 'Não autorizado'}), 401
+    return None
+
+def parse_max_concurrency(value):
+    """Valida o `max_concurrency` enviado pelo cliente: None (usa o limite do servidor) ou inteiro positivo."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or isinstance(value, float):
+        raise ValueError(value)
+    value = int(value)
+    if value < 1:
+        raise ValueError(value)
+    return value
+
 @app.route('/')
 def index():
     """Renderiza a interface principal"""
@@ -69,6 +104,7 @@ def analyze_logs():
             'timestamp': datetime.now().isoformat(),
             'results': {
                 'cleaned_logs': result.get('cleaned_logs', ''),
+                'log_summary': result.get('log_summary', ''),
                 'retrieved_context': result.get('retrieved_context', ''),
                 'analysis_report': result.get('analysis_report', '')
             }
@@ -80,6 +116,204 @@ def analyze_logs():
             'error': f'Erro ao processar logs: {str(e)}'
         }), 500
 
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_logs_stream():
+    """Análise de logs com o relatório enviado token a token via Server-Sent Events"""
+    data = request.get_json(silent=True)
+    
+    if not data or 'logs' not in data:
+        return jsonify({
+            'error': 'Campo "logs" é obrigatório'
+        }), 400
+    
+    raw_logs = data['logs']
+    
+    if not raw_logs.strip():
+        return jsonify({
+            'error': 'Logs não podem estar vazios'
+        }), 400
+    
+    logger.info(f"Iniciando análise em streaming de {len(raw_logs)} caracteres de logs...")
+    
+    def generate():
+        stream = AnalysisStream()
+        try:
+            agent = init_rag_agent()
+            for mode, payload in agent.stream(raw_logs):
+                yield from stream.events(mode, payload)
+        except Exception as e:
+            logger.error(f"Erro durante análise em streaming: {str(e)}", exc_info=True)
+            yield sse('error', {'error': f'Erro ao processar logs: {str(e)}'})
+            return
+        yield stream.done()
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/api/analyze/upload', methods=['POST'])
+def analyze_log_upload():
+    """Análise de logs enviados em streaming (texto ou gzip, corpo chunked ou arquivo multipart)"""
+    try:
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('file')
+            if upload is None:
+                return jsonify({
+                    'error': 'Campo "file" é obrigatório'
+                }), 400
+            stream = upload.stream
+        else:
+            stream = request.stream
+        
+        # Só as linhas suspeitas são mantidas; o log bruto nunca fica inteiro na memória
+        agent = init_rag_agent()
+        max_lines = int(os.environ.get('LOG_UPLOAD_MAX_LINES', 20000))
+        cleaned_logs, stats = agent.log_filter.filter_stream(stream, max_lines=max_lines)
+        
+        if stats['bytes'] == 0:
+            return jsonify({
+                'error': 'Logs não podem estar vazios'
+            }), 400
+        
+        logger.info(
+            f"Upload filtrado: {stats['bytes']} bytes, {stats['lines']} linhas, "
+            f"{stats['suspicious_lines']} suspeitas{' (truncado)' if stats['truncated'] else ''}"
+        )
+        
+        result = agent.execute_filtered(cleaned_logs)
+        
+        logger.info("Análise concluída com sucesso!")
+        
+        return jsonify({
+            'success': True,
+            'timestamp': datetime.now().isoformat(),
+            'stats': stats,
+            'results': {
+                'cleaned_logs': result.get('cleaned_logs', ''),
+                'log_summary': result.get('log_summary', ''),
+                'retrieved_context': result.get('retrieved_context', ''),
+                'analysis_report': result.get('analysis_report', '')
+            }
+        })
+        
+    except zlib.error as e:
+        logger.warning(f"Upload gzip inválido: {str(e)}")
+        return jsonify({
+            'error': f'Arquivo gzip inválido: {str(e)}'
+        }), 400
+    except Exception as e:
+        logger.error(f"Erro durante análise do upload: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': f'Erro ao processar logs: {str(e)}'
+        }), 500
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Análise de vários logs; cada resultado é enviado em NDJSON assim que fica pronto"""
+    try:
+        if request.mimetype == 'multipart/form-data':
+            files = request.files.getlist('files')
+            ids = [f.filename for f in files]
+            # Arquivos .gz são descompactados como no upload em streaming
+            sources = ["".join(iter_text_blocks(f.stream)) for f in files]
+            max_concurrency = request.form.get('max_concurrency')
+        else:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                data = {}
+            items = data.get('items') or []
+            if not isinstance(items, list):
+                return jsonify({
+                    'error': '"items" deve ser uma lista de objetos'
+                }), 400
+            for i, item in enumerate(items):
+                if not isinstance(item, dict) or not isinstance(item.get('logs', ''), str):
+                    return jsonify({
+                        'error': f'"items[{i}]" deve ser um objeto com "logs" em texto'
+                    }), 400
+            ids = [item.get('id', str(i)) for i, item in enumerate(items)]
+            sources = [item.get('logs', '') for item in items]
+            max_concurrency = data.get('max_concurrency')
+        
+        try:
+            max_concurrency = parse_max_concurrency(max_concurrency)
+        except (TypeError, ValueError):
+            return jsonify({
+                'error': '"max_concurrency" deve ser um inteiro positivo'
+            }), 400
+        
+        if not sources:
+            return jsonify({
+                'error': 'Envie "items" (JSON) ou "files" (multipart)'
+            }), 400
+        
+        empty = [item_id for item_id, source in zip(ids, sources) if not source.strip()]
+        if empty:
+            return jsonify({
+                'error': f'Logs não podem estar vazios: {", ".join(map(str, empty))}'
+            }), 400
+        
+        agent = init_rag_agent()
+        
+    except zlib.error as e:
+        return jsonify({
+            'error': f'Arquivo gzip inválido: {str(e)}'
+        }), 400
+    except Exception as e:
+        logger.error(f"Erro ao preparar análise em lote: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': f'Erro ao processar logs: {str(e)}'
+        }), 500
+    
+    logger.info(f"Iniciando análise em lote de {len(sources)} logs...")
+    
+    def generate():
+        try:
+            for index, result in agent.execute_batch(sources, max_concurrency=max_concurrency):
+                item = {'index': index, 'id': ids[index], 'timestamp': datetime.now().isoformat()}
+                if 'error' in result:
+                    item.update(success=False, error=f'Erro ao processar logs: {result["error"]}')
+                else:
+                    item.update(success=True, results={
+                        'cleaned_logs': result.get('cleaned_logs', ''),
+                        'log_summary': result.get('log_summary', ''),
+                        'retrieved_context': result.get('retrieved_context', ''),
+                        'analysis_report': result.get('analysis_report', '')
+                    })
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        except Exception as e:
+            # O status 200 já foi enviado: o erro vira o último item do NDJSON
+            logger.error(f"Erro na análise em lote: {str(e)}", exc_info=True)
+            yield json.dumps({
+                'error': f'Erro ao processar lote: {str(e)}',
+                'timestamp': datetime.now().isoformat()
+            }, ensure_ascii=False) + "\n"
+            return
+        logger.info("Análise em lote concluída!")
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/admin/sync', methods=['POST'])
+def sync_knowledge_base():
+    """Sincroniza incrementalmente a base de conhecimento com o vector store"""
+    denied = check_admin_token()
+    if denied:
+        return denied
+    
+    try:
+        agent = init_rag_agent()
+        counts = agent.sync_knowledge_base()
+        
+        return jsonify({
+            'success': True,
+            'timestamp': datetime.now().isoformat(),
+            'sync': counts
+        })
+        
+    except Exception as e:
+        logger.error(f"Erro ao sincronizar base de conhecimento: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': f'Erro ao sincronizar base de conhecimento: {str(e)}'
+        }), 500
+
 @app.route('/api/sample', methods=['GET'])
 def get_sample_logs():
     """Retorna logs de exemplo para teste"""
@@ -111,7 +345,11 @@ def get_stats():
             'vector_store_exists': os.path.exists(persist_dir),
             'knowledge_base_path': kb_dir,
             'model': 'google/gemma-3-12b',
-            'embedding_model': 'sentence-transformers/all-MiniLM-L6-v2',
+            'embedding_model': embedding_id(),
+            'embedding_backend': embedding_config()['backend'],
+            'retrieval_cache': agent.retrieval_cache.stats(),
+            'reranker': agent.reranker.stats(),
+            'llm_gateway': get_gateway().stats(),
             'status': 'operational'
         }
         
@@ -134,5 +372,8 @@ if __name__ == '__main__':
     os.makedirs('./knowledge_base', exist_ok=True)
     os.makedirs('./logs', exist_ok=True)
     
+    # Carrega o modelo de embeddings antes da primeira análise
+    warmup_embeddings()
+
     logger.info("Iniciando servidor Flask...")
     app.run(host='0.0.0.0', port=5000, debug=True)
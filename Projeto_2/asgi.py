@@ -0,0 +1,124 @@
+"""Modo de execução assíncrono (ASGI).
+
+A rota de análise, que passa a maior parte do tempo esperando o LLM, roda em
+Quart com `ainvoke`: enquanto o LM Studio gera o relatório, o event loop
+atende outras requisições em vez de prender uma thread por análise. As
+demais rotas continuam no app Flask, servido pelo mesmo processo via
+adaptador WSGI, e compartilham o mesmo `RAGAgent`.
+
+Uso (a partir de Projeto_2/):
+    hypercorn asgi:application --bind 0.0.0.0:5000
+"""
+import asyncio
+from datetime import datetime
+
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart, request, jsonify
+
+from app import app as flask_app, init_rag_agent
+from embeddings import warmup_embeddings
+from streaming import AnalysisStream, SSE_HEADERS, sse
+from log import get_logger
+
+logger = get_logger(__name__)
+
+quart_app = Quart(__name__)
+# O padrão de 60s cortaria relatórios em streaming longos; o limite fica com o LLM_TIMEOUT
+quart_app.config['RESPONSE_TIMEOUT'] = None
+
+ASYNC_ROUTES = {'/api/analyze', '/api/analyze/stream'}
+
+
+@quart_app.before_serving
+async def startup():
+    await asyncio.to_thread(warmup_embeddings)
+
+
+@quart_app.route('/api/analyze', methods=['POST'])
+async def analyze_logs():
+    """Endpoint assíncrono para análise de logs"""
+    try:
+        data = await request.get_json()
+
+        if not data or 'logs' not in data:
+            return jsonify({
+                'error': 'Campo "logs" é obrigatório'
+            }), 400
+
+        raw_logs = data['logs']
+
+        if not raw_logs.strip():
+            return jsonify({
+                'error': 'Logs não podem estar vazios'
+            }), 400
+
+        logger.info(f"Iniciando análise de {len(raw_logs)} caracteres de logs...")
+
+        # A primeira chamada constrói o agente (Chroma e sincronização da KB): fora do event loop
+        agent = await asyncio.to_thread(init_rag_agent)
+        result = await agent.aexecute(raw_logs)
+
+        logger.info("Análise concluída com sucesso!")
+
+        return jsonify({
+            'success': True,
+            'timestamp': datetime.now().isoformat(),
+            'results': {
+                'cleaned_logs': result.get('cleaned_logs', ''),
+                'log_summary': result.get('log_summary', ''),
+                'retrieved_context': result.get('retrieved_context', ''),
+                'analysis_report': result.get('analysis_report', '')
+            }
+        })
+
+    except Exception as e:
+        logger.error(f"Erro durante análise: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': f'Erro ao processar logs: {str(e)}'
+        }), 500
+
+
+@quart_app.route('/api/analyze/stream', methods=['POST'])
+async def analyze_logs_stream():
+    """Análise assíncrona de logs com o relatório enviado token a token via Server-Sent Events"""
+    data = await request.get_json(silent=True)
+
+    if not data or 'logs' not in data:
+        return jsonify({
+            'error': 'Campo "logs" é obrigatório'
+        }), 400
+
+    raw_logs = data['logs']
+
+    if not raw_logs.strip():
+        return jsonify({
+            'error': 'Logs não podem estar vazios'
+        }), 400
+
+    logger.info(f"Iniciando análise em streaming de {len(raw_logs)} caracteres de logs...")
+
+    async def generate():
+        stream = AnalysisStream()
+        try:
+            agent = await asyncio.to_thread(init_rag_agent)
+            async for mode, payload in agent.astream(raw_logs):
+                for event in stream.events(mode, payload):
+                    yield event.encode()
+        except Exception as e:
+            logger.error(f"Erro durante análise em streaming: {str(e)}", exc_info=True)
+            yield sse('error', {'error': f'Erro ao processar logs: {str(e)}'}).encode()
+            return
+        yield stream.done().encode()
+
+    return generate(), 200, {'Content-Type': 'text/event-stream', **SSE_HEADERS}
+
+
+flask_asgi = WsgiToAsgi(flask_app)
+
+
+async def application(scope, receive, send):
+    """Encaminha as rotas assíncronas ao Quart e todo o resto ao Flask."""
+    if scope['type'] == 'http' and scope['path'] not in ASYNC_ROUTES:
+        await flask_asgi(scope, receive, send)
+    else:
+        await quart_app(scope, receive, send)
@@ -0,0 +1,65 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from log_filter import LogFilter, NO_SUSPICIOUS_ACTIVITY
+from log_aggregator import summarize_logs
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Abaixo disso o custo de enviar os logs aos processos supera o ganho do paralelismo
+PARALLEL_MIN_BYTES = 1024 * 1024
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Retorna o pool de processos compartilhado, recriando-o se o tamanho mudar."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # "spawn" evita herdar o estado de threads do PyTorch/Flask no fork
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def preprocess_logs(raw_logs: str) -> dict:
+    """Filtra e agrega um log: o mesmo trabalho dos nós preprocessor e aggregator do grafo."""
+    cleaned = LogFilter().filter(raw_logs) or NO_SUSPICIOUS_ACTIVITY
+    return {'cleaned_logs': cleaned, **summarize_logs(cleaned)}
+
+
+def preprocess_batch(sources: list[str], workers: int = None) -> list:
+    """Pré-processa os logs em paralelo, retornando na ordem de entrada o resultado ou a exceção de cada um.
+
+    A filtragem é limitada por CPU (a regex não libera o GIL), então usa um
+    pool de processos. Lotes pequenos são processados no próprio processo.
+    """
+    workers = workers or int(os.environ.get("LOG_PREPROCESS_WORKERS", os.cpu_count() or 1))
+    total_bytes = sum(len(source) for source in sources)
+
+    if workers <= 1 or len(sources) <= 1 or total_bytes < PARALLEL_MIN_BYTES:
+        results = []
+        for source in sources:
+            try:
+                results.append(preprocess_logs(source))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    logger.info(f"Pré-processando {len(sources)} logs ({total_bytes / 1024 / 1024:.1f}MB) em {workers} processos")
+    futures = [_get_pool(workers).submit(preprocess_logs, source) for source in sources]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
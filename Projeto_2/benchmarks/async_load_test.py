@@ -0,0 +1,139 @@
+"""Teste de carga da análise: servidor síncrono (gunicorn + threads) vs. modo ASGI.
+
+Sobe o servidor falso da OpenAI (`mock_openai_server.py`) com uma latência
+fixa e, para cada modo, um único processo do app apontando para ele via
+`LLM_BASE_URL`, e dispara `--concurrency` análises simultâneas de logs de
+exemplo. No modo síncrono cada análise prende uma thread durante a chamada
+ao LLM; no ASGI as chamadas ficam pendentes no event loop.
+
+Requer `pip install gunicorn hypercorn quart`.
+
+Uso (a partir de Projeto_2/):
+    python benchmarks/async_load_test.py --concurrency 200
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import subprocess
+import statistics
+import urllib.request
+
+import httpx
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SERVERS = {
+    'wsgi': lambda port, threads: ["gunicorn", "-w", "1", "--threads", str(threads), "-t", "600", "-b", f"127.0.0.1:{port}", "app:app"],
+    'asgi': lambda port, threads: ["hypercorn", "-w", "1", "-b", f"127.0.0.1:{port}", "asgi:application"],
+}
+
+
+def wait_for_server(base_url: str, timeout: float = 300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"{base_url}/api/health", timeout=2)
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError("Servidor não respondeu a tempo")
+
+
+async def run_analyses(base_url: str, logs: str, concurrency: int, requests: int) -> dict:
+    """Cada cliente envia `requests` análises em sequência; todos começam juntos."""
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=600) as client:
+        # Primeira análise isolada: inicializa o agente fora da medição
+        await client.post("/api/analyze", json={"logs": logs})
+
+        async def user():
+            nonlocal errors
+            for _ in range(requests):
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/api/analyze", json={"logs": logs})
+                    if response.status_code == 200 and response.json().get("success"):
+                        latencies.append(time.perf_counter() - start)
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'analyses': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 2),
+        'analyses_per_s': round(len(latencies) / elapsed, 1),
+        'p50_s': round(statistics.median(latencies), 2) if latencies else None,
+        'p95_s': round(latencies[int(len(latencies) * 0.95) - 1], 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", nargs="+", choices=list(SERVERS), default=["wsgi", "asgi"])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2, help="Análises por cliente")
+    parser.add_argument("--threads", type=int, default=8, help="Threads do gunicorn no modo wsgi")
+    parser.add_argument("--latency", type=float, default=2.0, help="Latência simulada do LLM (s)")
+    parser.add_argument("--port", type=int, default=5057)
+    parser.add_argument("--llm-port", type=int, default=1236)
+    args = parser.parse_args()
+
+    for server in args.servers:
+        executable = SERVERS[server](args.port, args.threads)[0]
+        if shutil.which(executable) is None:
+            sys.exit(f"{executable} não encontrado: pip install {executable}")
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = []
+
+    for server in args.servers:
+        env = {
+            **os.environ,
+            "LLM_BASE_URL": f"http://127.0.0.1:{args.llm_port}/v1",
+            "LLM_MAX_CONNECTIONS": str(max(args.concurrency, 100)),
+            "LLM_MAX_KEEPALIVE": str(max(args.concurrency, 20)),
+        }
+        mock = subprocess.Popen(
+            [sys.executable, os.path.join(BENCHMARK_DIR, "mock_openai_server.py"),
+             "--port", str(args.llm_port), "--latency", str(args.latency)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        app_server = subprocess.Popen(
+            SERVERS[server](args.port, args.threads),
+            cwd=PROJECT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_server(base_url)
+            logs = json.load(urllib.request.urlopen(f"{base_url}/api/sample"))["sample_logs"]
+            result = asyncio.run(run_analyses(base_url, logs, args.concurrency, args.requests))
+            llm_stats = json.load(urllib.request.urlopen(f"http://127.0.0.1:{args.llm_port}/stats"))
+            result['llm_max_in_flight'] = llm_stats['max_in_flight']
+            results.append({'server': server, **result})
+            print(f"{server}: {result}")
+        finally:
+            for process in (app_server, mock):
+                process.terminate()
+                process.wait()
+
+    print(f"\n{'modo':>6} {'análises/s':>11} {'p50 (s)':>9} {'p95 (s)':>9} {'LLM simult.':>12} {'erros':>7}")
+    for r in results:
+        print(f"{r['server']:>6} {r['analyses_per_s']:>11} {r['p50_s']!s:>9} {r['p95_s']!s:>9} {r['llm_max_in_flight']:>12} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Benchmark dos backends de embeddings: vazão e desvio em relação ao PyTorch.
+
+Para cada backend (`torch`, `onnx`, `openvino`, opcionalmente com o arquivo
+do modelo exportado, ex. `onnx:onnx/model_qint8_avx512_vnni.onnx`) e cada
+tamanho de lote, mede a vazão do embedding dos textos (sentenças/s) e a
+latência de consultas individuais, como as feitas na busca. O desvio é
+medido contra o PyTorch: cosseno médio e mínimo entre os embeddings de cada
+texto e a concordância dos top-k da busca exata com as mesmas consultas.
+Termina com código 1 se algum backend ficar abaixo de `--min-cosine`.
+
+Roda offline (`HF_HUB_OFFLINE=1`) a partir do cache local do modelo; baixe-o
+antes com `huggingface-cli download sentence-transformers/all-MiniLM-L6-v2`
+(o repositório já inclui as versões ONNX, int8 e OpenVINO).
+
+Sem `--texts`, usa sentenças sintéticas de políticas de segurança; com
+`--texts`, um arquivo (uma sentença por linha) ou diretório de .txt/.md
+(um texto por parágrafo).
+
+Uso (a partir do diretório do projeto):
+    python benchmarks/embedding_backend_benchmark.py
+    python benchmarks/embedding_backend_benchmark.py --backends onnx onnx:onnx/model_qint8_avx512_vnni.onnx \\
+        --batch-sizes 16 64 --threads 4 --texts knowledge_base/
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+# Antes de importar o huggingface_hub: nenhuma chamada à rede
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+import numpy as np  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embeddings import create_embedding_model, embedding_config  # noqa: E402
+
+SUBJECTS = ["A senha do usuário", "O acesso remoto", "O firewall de borda", "O backup diário", "A conta de serviço",
+            "O servidor de banco de dados", "O endpoint /wp-admin", "O certificado TLS", "A VPN corporativa"]
+RULES = ["deve ser revisado a cada 90 dias", "exige autenticação multifator", "não pode ser exposto à internet",
+         "deve registrar todas as tentativas de login", "precisa de aprovação do time de segurança",
+         "deve bloquear o IP após 5 falhas consecutivas", "tem de usar criptografia AES-256 em repouso"]
+DETAILS = ["conforme a norma ISO 27001.", "em todos os ambientes de produção.", "salvo exceção documentada.",
+           "e o incidente deve ser reportado em até 24 horas.", "com monitoramento contínuo do SOC.", ""]
+
+
+def synthetic_texts(count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [f"{rng.choice(SUBJECTS)} {rng.choice(RULES)} {rng.choice(DETAILS)}".strip() for _ in range(count)]
+
+
+def load_texts(path: str, count: int) -> list[str]:
+    """Uma sentença por linha de um arquivo, ou um texto por parágrafo dos .txt/.md de um diretório."""
+    if not os.path.isdir(path):
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            return [line.strip() for line in f if line.strip()][:count]
+
+    texts = []
+    for root, _, names in os.walk(path):
+        for name in sorted(names):
+            if not name.endswith((".txt", ".md")):
+                continue
+            with open(os.path.join(root, name), encoding="utf-8", errors="ignore") as f:
+                texts.extend(part.strip() for part in f.read().split("\n\n") if part.strip())
+            if len(texts) >= count:
+                return texts[:count]
+    return texts
+
+
+def parse_backend(spec: str) -> tuple[str, str]:
+    backend, _, model_file = spec.partition(":")
+    return backend, model_file or None
+
+
+def embed_matrix(model, texts: list[str]) -> np.ndarray:
+    vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def top_k(documents: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(queries @ documents.T), axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx:onnx/model_qint8_avx512_vnni.onnx"],
+                        help="backend[:arquivo do modelo]")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 32, 64])
+    parser.add_argument("--threads", type=int, default=0, help="Threads intra-op (0 = padrão do runtime)")
+    parser.add_argument("--texts", help="Arquivo ou diretório com os textos")
+    parser.add_argument("--count", type=int, default=1000, help="Textos embedados por medição")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Cosseno médio mínimo aceito contra o PyTorch")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = load_texts(args.texts, args.count) if args.texts else synthetic_texts(args.count, args.seed)
+    rng = random.Random(args.seed)
+    queries = [" ".join(text.split()[:6]) for text in rng.sample(texts, min(args.queries, len(texts)))]
+    print(f"{len(texts)} textos, {len(queries)} consultas, threads={args.threads or 'padrão'}\n")
+
+    baseline = None
+    results = []
+    # O PyTorch roda primeiro: é a referência do desvio
+    for spec in ["torch"] + [spec for spec in args.backends if spec != "torch"]:
+        backend, model_file = parse_backend(spec)
+        config = {**embedding_config(), 'backend': backend, 'model_file': model_file, 'threads': args.threads}
+
+        start = time.perf_counter()
+        model = create_embedding_model(config)
+        model.embed_query("warm-up")
+        load_s = time.perf_counter() - start
+
+        rates = {}
+        for batch_size in args.batch_sizes:
+            model.encode_kwargs = {**model.encode_kwargs, 'batch_size': batch_size}
+            start = time.perf_counter()
+            documents = embed_matrix(model, texts)
+            rates[batch_size] = len(texts) / (time.perf_counter() - start)
+
+        latencies = []
+        query_vectors = []
+        for query in queries:
+            start = time.perf_counter()
+            query_vectors.append(model.embed_query(query))
+            latencies.append((time.perf_counter() - start) * 1000)
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+        if baseline is None:
+            baseline = {'documents': documents, 'top_k': top_k(documents, query_vectors, args.k)}
+        cosines = (documents * baseline['documents']).sum(axis=1)
+        found = top_k(documents, query_vectors, args.k)
+        agreement = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, baseline['top_k'])])
+
+        results.append({
+            'backend': spec,
+            'load_s': load_s,
+            'rates': rates,
+            'query_p50_ms': statistics.median(latencies),
+            'cos_mean': float(cosines.mean()),
+            'cos_min': float(cosines.min()),
+            'agreement': float(agreement),
+        })
+        r = results[-1]
+        print(f"{spec:>42}  {max(rates.values()):.0f} sentenças/s  cosseno médio {r['cos_mean']:.4f}")
+
+    batches = "".join(f"{f'lote {b} (s/s)':>16}" for b in args.batch_sizes)
+    print(f"\n{'backend':>42} {'carga (s)':>10}{batches} {'consulta p50 (ms)':>18} {'cos médio':>10} {'cos mín':>8} {f'top-{args.k}':>7}")
+    for r in results:
+        rates = "".join(f"{r['rates'][b]:>16.0f}" for b in args.batch_sizes)
+        print(f"{r['backend']:>42} {r['load_s']:>10.1f}{rates} {r['query_p50_ms']:>18.2f} "
+              f"{r['cos_mean']:>10.4f} {r['cos_min']:>8.4f} {r['agreement']:>7.3f}")
+
+    drifted = [r['backend'] for r in results if r['cos_mean'] < args.min_cosine]
+    if drifted:
+        print(f"\nDesvio acima do aceito (cosseno médio < {args.min_cosine}): {', '.join(drifted)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
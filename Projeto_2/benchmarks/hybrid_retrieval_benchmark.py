@@ -0,0 +1,157 @@
+"""Benchmark da recuperação: busca vetorial vs. BM25 vs. híbrida (RRF).
+
+Gera uma base de conhecimento sintética de runbooks em que cada chunk trata
+de um tema genérico (SQLi, força bruta, path traversal...) e cita
+identificadores exatos: IP, CVE, host e path. As consultas seguem o formato
+das feitas pelo analista (`Análise de vulnerabilidade e remediação para:`
+seguido dos eventos) e citam o identificador de um chunk, que é a resposta
+esperada. Para cada modo mede o hit rate@k (o chunk esperado está entre os k
+resultados), o MRR e a latência por consulta, incluindo o embedding.
+
+A busca vetorial é exata (produto interno em numpy sobre os embeddings
+normalizados), para comparar a qualidade do ranking sem a influência do
+índice do Chroma.
+
+Uso (a partir de Projeto_2/):
+    python benchmarks/hybrid_retrieval_benchmark.py
+    python benchmarks/hybrid_retrieval_benchmark.py --chunks 5000 --queries 500 --k 5
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25 import BM25Index, hybrid_merge  # noqa: E402
+from embeddings import get_embeddings  # noqa: E402
+
+TOPICS = {
+    "sqli": "Tentativas de SQL injection com UNION SELECT devem ser bloqueadas no WAF e as queries parametrizadas.",
+    "bruteforce": "Força bruta no login: aplicar rate limit, bloqueio temporário da conta e MFA obrigatório.",
+    "traversal": "Path traversal com ../ indica leitura de arquivos do sistema; validar e normalizar os caminhos.",
+    "scanner": "Varreduras com muitos 404 vêm de scanners automatizados; bloquear o IP no firewall de borda.",
+    "rce": "Execução remota de código exige isolar o servidor, coletar evidências e aplicar o patch do fornecedor.",
+    "xss": "Cross-site scripting refletido: sanitizar a saída, usar Content-Security-Policy e revisar os templates.",
+}
+PATHS = ["/wp-admin/admin-ajax.php", "/etc/passwd", "/api/v1/login", "/cgi-bin/status", "/phpmyadmin/index.php", "/.env"]
+
+
+class Doc:
+    """Documento mínimo com `id` e `page_content`, como os do vector store."""
+
+    def __init__(self, doc_id: str, page_content: str):
+        self.id = doc_id
+        self.page_content = page_content
+
+
+def synthetic_corpus(count: int, seed: int):
+    """Chunks de runbook, cada um com identificadores exatos próprios."""
+    rng = random.Random(seed)
+    docs = []
+    for i in range(count):
+        topic = rng.choice(list(TOPICS))
+        ip = f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        cve = f"CVE-{rng.randint(2015, 2025)}-{rng.randint(1000, 99999)}"
+        host = f"srv-{topic}-{i:05d}.intra.example.com"
+        path = rng.choice(PATHS)
+        text = (
+            f"Runbook {i}: {TOPICS[topic]} Incidente com origem em {ip} explorando {cve} "
+            f"no host {host} via {path}."
+        )
+        docs.append({'id': f"chunk-{i}", 'text': text, 'ip': ip, 'cve': cve, 'host': host, 'path': path, 'topic': topic})
+    return docs
+
+
+def synthetic_queries(docs: list[dict], count: int, seed: int):
+    """Consultas no formato do analista citando um identificador de um chunk (a resposta esperada)."""
+    rng = random.Random(seed + 1)
+    queries = []
+    for doc in rng.sample(docs, min(count, len(docs))):
+        identifier = doc[rng.choice(('ip', 'cve', 'host'))]
+        event = f'[{rng.randint(2, 90)}x] {identifier} "GET {doc["path"]} HTTP/1.1" 404'
+        queries.append((f"Análise de vulnerabilidade e remediação para: {event}", doc['id']))
+    return queries
+
+
+def evaluate(name: str, search, queries: list, k: int) -> dict:
+    hits, reciprocal_ranks, latencies = 0, [], []
+    for query, expected in queries:
+        start = time.perf_counter()
+        ids = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        rank = ids.index(expected) + 1 if expected in ids else None
+        hits += rank is not None
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    latencies.sort()
+    return {
+        'mode': name,
+        'hit_rate': hits / len(queries),
+        'mrr': statistics.mean(reciprocal_ranks),
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=5, help="Resultados por consulta (o retriever usa 5)")
+    parser.add_argument("--fetch-k", type=int, default=20, help="Candidatos de cada lado na busca híbrida")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.chunks, args.seed)
+    queries = synthetic_queries(corpus, args.queries, args.seed)
+    embeddings = get_embeddings()
+
+    start = time.perf_counter()
+    matrix = np.asarray(embeddings.embed_documents([doc['text'] for doc in corpus]), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    embed_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bm25 = BM25Index.from_documents([doc['id'] for doc in corpus], [doc['text'] for doc in corpus])
+    bm25_s = time.perf_counter() - start
+    print(f"{len(corpus)} chunks, {len(queries)} consultas, k={args.k}")
+    print(f"Embeddings dos chunks: {embed_s:.1f}s | índice BM25: {bm25_s:.2f}s\n")
+
+    docs = [Doc(doc['id'], doc['text']) for doc in corpus]
+    by_id = {doc.id: doc for doc in docs}
+
+    def vector_docs(query: str, k: int) -> list:
+        vector = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+        scores = matrix @ (vector / np.linalg.norm(vector))
+        top = np.argpartition(-scores, k)[:k]
+        return [docs[i] for i in top[np.argsort(-scores[top])]]
+
+    def vector_search(query: str) -> list:
+        return [doc.id for doc in vector_docs(query, args.k)]
+
+    def bm25_search(query: str) -> list:
+        return [doc_id for doc_id, _ in bm25.search(query, args.k)]
+
+    def hybrid_search(query: str) -> list:
+        lexical = [by_id[doc_id] for doc_id, _ in bm25.search(query, args.fetch_k)]
+        return [doc.id for doc in hybrid_merge(vector_docs(query, args.fetch_k), lexical, args.k)]
+
+    # Aquece o modelo antes de medir
+    embeddings.embed_query("warm-up")
+    results = [
+        evaluate("vetorial", vector_search, queries, args.k),
+        evaluate("bm25", bm25_search, queries, args.k),
+        evaluate("híbrida (RRF)", hybrid_search, queries, args.k),
+    ]
+
+    print(f"{'modo':>14} {f'hit@{args.k}':>8} {'MRR':>6} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for r in results:
+        print(f"{r['mode']:>14} {r['hit_rate']:>8.3f} {r['mrr']:>6.3f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
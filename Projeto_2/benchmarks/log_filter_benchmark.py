@@ -0,0 +1,134 @@
+"""Benchmark do pré-filtro de logs: filtro antigo por substrings vs. LogFilter.
+
+Gera um access log sintético no Combined Log Format (1 GB por padrão) e mede,
+para cada modo, tempo, vazão, linhas selecionadas e pico de RSS. Cada modo roda
+em um subprocesso próprio para que o pico de RSS seja apenas o daquele modo.
+
+Modos:
+    legacy  split da string inteira + any() sobre sete substrings (implementação original)
+    regex   LogFilter.filter sobre a string inteira (uma passada com finditer)
+    stream  LogFilter.iter_suspicious_stream lendo o arquivo em blocos de 1 MB
+
+Uso (a partir de Projeto_2/):
+    python benchmarks/log_filter_benchmark.py
+    python benchmarks/log_filter_benchmark.py --size-mb 200 --log /tmp/access.log
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ("legacy", "regex", "stream")
+STREAM_BLOCK_SIZE = 1024 * 1024
+LEGACY_PATTERNS = [' 40', ' 50', 'SELECT', 'UNION', 'etc/passwd', 'admin', '../']
+
+PATHS = ["/index.php", "/style.css", "/script.js", "/images/logo.png", "/api/v1/items?page=2", "/login.php"]
+ATTACK_PATHS = [
+    "/admin' OR '1'='1",
+    "/../../../etc/passwd",
+    "/products?id=1 UNION SELECT password FROM users",
+    "/wp-admin/admin-ajax.php?img=../wp-config.php",
+]
+USER_AGENTS = ["Mozilla/5.0 (X11; Linux x86_64)", "curl/8.5.0", "Googlebot/2.1"]
+
+
+def make_synthetic_log(path: str, size_mb: int, seed: int = 42):
+    """Gera o log com ~2% de ataques e ~5% de respostas 4xx/5xx.
+
+    Horários e tamanhos de resposta incluem valores como " 404"/" 50" para
+    exercitar os falsos positivos do filtro por substrings.
+    """
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            lines = []
+            for _ in range(10000):
+                roll = rng.random()
+                request = rng.choice(ATTACK_PATHS) if roll < 0.02 else rng.choice(PATHS)
+                status = rng.choice((404, 403, 500, 502)) if roll > 0.95 else 200
+                lines.append(
+                    f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)} - - '
+                    f'[12/Feb/2026:10:{rng.randrange(60):02d}:{rng.randrange(60):02d} -0300] '
+                    f'"{rng.choice(("GET", "POST"))} {request} HTTP/1.1" {status} {rng.randrange(40, 60000)} '
+                    f'"-" "{rng.choice(USER_AGENTS)}"\n'
+                )
+            chunk = "".join(lines)
+            f.write(chunk)
+            written += len(chunk)
+
+
+def legacy_filter(text: str) -> str:
+    suspicious_lines = []
+    for line in text.split('\n'):
+        if any(p in line for p in LEGACY_PATTERNS):
+            suspicious_lines.append(line.strip())
+    return "\n".join(suspicious_lines)
+
+
+def run_mode(log_path: str, mode: str):
+    """Executa um modo no processo atual e imprime as métricas em JSON."""
+    from log_filter import LogFilter
+
+    log_filter = LogFilter()
+    size = os.path.getsize(log_path)
+    start = time.perf_counter()
+
+    if mode == "stream":
+        with open(log_path, "r", encoding="utf-8") as f:
+            blocks = iter(lambda: f.read(STREAM_BLOCK_SIZE), "")
+            matched = sum(1 for _ in log_filter.iter_suspicious_stream(blocks))
+        read_s = 0.0
+    else:
+        with open(log_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        read_s = time.perf_counter() - start
+        cleaned = legacy_filter(text) if mode == "legacy" else log_filter.filter(text)
+        matched = cleaned.count("\n") + 1 if cleaned else 0
+
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'mode': mode,
+        'elapsed_s': round(elapsed, 2),
+        'filter_s': round(elapsed - read_s, 2),
+        'mb_per_s': round(size / 1024 / 1024 / elapsed, 1),
+        'matched_lines': matched,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default="benchmarks/synthetic_access.log", help="Arquivo de log (gerado se não existir)")
+    parser.add_argument("--size-mb", type=int, default=1024, help="Tamanho do log sintético")
+    parser.add_argument("--modes", default=",".join(MODES), help="Modos separados por vírgula")
+    parser.add_argument("--run-mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        run_mode(args.log, args.run_mode)
+        return
+
+    if not os.path.exists(args.log):
+        print(f"Gerando log sintético de {args.size_mb}MB em {args.log}...")
+        start = time.perf_counter()
+        make_synthetic_log(args.log, args.size_mb)
+        print(f"Log gerado em {time.perf_counter() - start:.1f}s")
+
+    for mode in args.modes.split(","):
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--log", args.log, "--run-mode", mode],
+            capture_output=True, text=True, check=True,
+        )
+        print(result.stdout.strip())
+
+
+if __name__ == "__main__":
+    main()
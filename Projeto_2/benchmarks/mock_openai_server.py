@@ -0,0 +1,148 @@
+"""Servidor falso compatível com a API da OpenAI, para testes de carga sem o LM Studio.
+
+Responde `POST /v1/chat/completions` após uma latência fixa, simulando o
+tempo de geração, com ou sem `stream`, então cada análise custa uma única
+chamada ao LLM com a latência configurada.
+
+Com `--fail-rate`, uma fração das requisições recebe 503 (opcionalmente com
+`Retry-After`), simulando o LM Studio sobrecarregado. `GET /stats` mostra
+as requisições recebidas, as que falharam, o pico de requisições simultâneas
+e quantas vezes cada pergunta chegou ao servidor; `POST /stats/reset` zera
+as contagens e aceita `{"fail_rate": ..., "retry_after": ...}` para mudar a
+taxa de falhas sem reiniciar o servidor.
+
+Uso (a partir de Projeto_2/):
+    python benchmarks/mock_openai_server.py --port 1234 --latency 2
+    python benchmarks/mock_openai_server.py --port 1234 --latency 2 --fail-rate 0.2 --retry-after 1
+    LLM_BASE_URL=http://127.0.0.1:1234/v1 hypercorn asgi:application
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+from quart import Quart, request, jsonify
+
+app = Quart(__name__)
+app.config['LATENCY'] = 2.0
+app.config['TOKENS'] = 40
+app.config['FAIL_RATE'] = 0.0
+app.config['RETRY_AFTER'] = 0
+
+stats = {'requests': 0, 'failed': 0, 'in_flight': 0, 'max_in_flight': 0, 'prompts': {}}
+
+
+def completion_text(messages: list) -> str:
+    question = next((m.get('content') for m in reversed(messages) if m.get('role') == 'user'), '') or ''
+    words = [f"resposta{i}" for i in range(app.config['TOKENS'])]
+    return f"Sobre '{str(question)[:40]}': " + " ".join(words)
+
+
+@app.route('/v1/models', methods=['GET'])
+async def models():
+    return jsonify({'object': 'list', 'data': [{'id': 'mock-model', 'object': 'model'}]})
+
+
+@app.route('/v1/chat/completions', methods=['POST'])
+async def chat_completions():
+    body = await request.get_json()
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    text = completion_text(body.get('messages', []))
+    model = body.get('model', 'mock-model')
+
+    stats['requests'] += 1
+    # Quantas vezes cada pergunta chegou ao servidor (verifica o agrupamento de requisições idênticas)
+    question = text.split("': ")[0]
+    stats['prompts'][question] = stats['prompts'].get(question, 0) + 1
+    if random.random() < app.config['FAIL_RATE']:
+        # Simula o servidor sobrecarregado (verifica as novas tentativas com backoff)
+        stats['failed'] += 1
+        headers = {'Retry-After': str(app.config['RETRY_AFTER'])} if app.config['RETRY_AFTER'] else {}
+        return jsonify({'error': {'message': 'Servidor sobrecarregado', 'type': 'server_error'}}), 503, headers
+
+    stats['in_flight'] += 1
+    stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+
+    if not body.get('stream'):
+        try:
+            await asyncio.sleep(app.config['LATENCY'])
+        finally:
+            stats['in_flight'] -= 1
+        return jsonify({
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': app.config['TOKENS'], 'total_tokens': 10 + app.config['TOKENS']},
+        })
+
+    async def generate():
+        # A latência é distribuída entre os tokens, como em uma geração real
+        tokens = text.split(" ")
+        delay = app.config['LATENCY'] / max(len(tokens), 1)
+        try:
+            for i, token in enumerate(tokens):
+                await asyncio.sleep(delay)
+                chunk = {
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {'content': token if i == 0 else f" {token}"}, 'finish_reason': None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+            done = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+            }
+            yield f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode()
+        finally:
+            stats['in_flight'] -= 1
+
+    return generate(), 200, {'Content-Type': 'text/event-stream'}
+
+
+@app.route('/stats', methods=['GET'])
+async def get_stats():
+    return jsonify(stats)
+
+
+@app.route('/stats/reset', methods=['POST'])
+async def reset_stats():
+    body = await request.get_json(silent=True) or {}
+    app.config['FAIL_RATE'] = float(body.get('fail_rate', app.config['FAIL_RATE']))
+    app.config['RETRY_AFTER'] = int(body.get('retry_after', app.config['RETRY_AFTER']))
+    stats.update({'requests': 0, 'failed': 0, 'max_in_flight': stats['in_flight'], 'prompts': {}})
+    return jsonify(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency", type=float, default=2.0, help="Tempo de geração simulado (s)")
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens na resposta")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fração das requisições respondidas com 503")
+    parser.add_argument("--retry-after", type=int, default=0, help="Retry-After (s) enviado com o 503 (0 = sem cabeçalho)")
+    args = parser.parse_args()
+
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    app.config['LATENCY'] = args.latency
+    app.config['TOKENS'] = args.tokens
+    app.config['FAIL_RATE'] = args.fail_rate
+    app.config['RETRY_AFTER'] = args.retry_after
+    config = Config()
+    config.bind = [f"127.0.0.1:{args.port}"]
+    config.keep_alive_timeout = 75
+    asyncio.run(serve(app, config))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import os
+import re
+import json
+import math
+import heapq
+import threading
+from collections import Counter
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Termos com pontuação interna (IPs, CVEs, paths, hosts) são mantidos inteiros e também por partes
+TOKEN_PATTERN = re.compile(r"\w+(?:[.:/\\-]\w+)*")
+SEPARATOR_PATTERN = re.compile(r"[.:/\\-]")
+
+RRF_K = int(os.environ.get("RRF_K", 60))
+# Busca híbrida: candidatos de cada lado (vetorial e BM25) antes da fusão por RRF
+HYBRID_SEARCH = os.environ.get("HYBRID_SEARCH", "true").lower() == "true"
+HYBRID_FETCH_K = int(os.environ.get("HYBRID_FETCH_K", 20))
+
+
+def tokenize(text: str) -> list[str]:
+    """Divide o texto em termos minúsculos, preservando tokens exatos como `etc/passwd` e `cve-2021-44228`."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if SEPARATOR_PATTERN.search(token):
+            tokens.extend(part for part in SEPARATOR_PATTERN.split(token) if part)
+    return tokens
+
+
+class BM25Index:
+    """Índice invertido com ranqueamento BM25 para a busca lexical.
+
+    Cada documento é identificado pelo mesmo id do vector store e guarda as
+    frequências dos seus termos, o que permite remover documentos e
+    persistir o índice em JSON; as listas invertidas são reconstruídas ao
+    carregar. Buscas e alterações são serializadas por um lock.
+    """
+
+    def __init__(self, k1: float = None, b: float = None):
+        self.k1 = k1 if k1 is not None else float(os.environ.get("BM25_K1", 1.5))
+        self.b = b if b is not None else float(os.environ.get("BM25_B", 0.75))
+        self._docs = []
+        self._positions = {}
+        self._postings = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def add(self, ids: list[str], texts: list[str], sources: list[str] = None):
+        """Indexa (ou reindexa) os documentos com os ids informados."""
+        sources = sources or [None] * len(ids)
+        with self._lock:
+            for doc_id, text, source in zip(ids, texts, sources):
+                self._remove(doc_id)
+                tf = Counter(tokenize(text))
+                self._insert({'id': doc_id, 'source': source, 'length': sum(tf.values()), 'tf': dict(tf)})
+
+    def delete(self, ids: list[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def delete_source(self, source: str):
+        """Remove todos os documentos de um arquivo de origem."""
+        with self._lock:
+            for doc in [doc for doc in self._docs if doc is not None and doc['source'] == source]:
+                self._remove(doc['id'])
+
+    def _insert(self, doc: dict):
+        position = len(self._docs)
+        self._docs.append(doc)
+        self._positions[doc['id']] = position
+        self._total_length += doc['length']
+        for term, count in doc['tf'].items():
+            self._postings.setdefault(term, {})[position] = count
+
+    def _remove(self, doc_id: str):
+        position = self._positions.pop(doc_id, None)
+        if position is None:
+            return
+        doc = self._docs[position]
+        self._docs[position] = None
+        self._total_length -= doc['length']
+        for term in doc['tf']:
+            postings = self._postings[term]
+            del postings[position]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, k: int, allowed: set = None) -> list[tuple[str, float]]:
+        """Retorna até `k` pares (id, score) em ordem decrescente, opcionalmente só entre os ids de `allowed`."""
+        with self._lock:
+            count = len(self._positions)
+            if not count:
+                return []
+            avg_length = self._total_length / count
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for position, tf in postings.items():
+                    length = self._docs[position]['length']
+                    norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+                    scores[position] = scores.get(position, 0.0) + idf * norm
+
+            hits = ((self._docs[position]['id'], score) for position, score in scores.items())
+            if allowed is not None:
+                hits = ((doc_id, score) for doc_id, score in hits if doc_id in allowed)
+            return heapq.nlargest(k, hits, key=lambda hit: hit[1])
+
+    def save(self, path: str):
+        """Grava o índice em JSON de forma atômica."""
+        with self._lock:
+            data = {'k1': self.k1, 'b': self.b, 'docs': [doc for doc in self._docs if doc is not None]}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Carrega o índice salvo em `path`, ou retorna None se ele não existir."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Índice BM25 inválido em {path}, será reconstruído: {e}")
+            return None
+        index = cls(k1=data['k1'], b=data['b'])
+        for doc in data['docs']:
+            index._insert(doc)
+        return index
+
+    @classmethod
+    def from_documents(cls, ids: list[str], texts: list[str], sources: list[str] = None):
+        index = cls()
+        index.add(ids, texts, sources)
+        return index
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = RRF_K) -> list[str]:
+    """Combina rankings pela soma de 1 / (k + posição); empates mantêm a ordem do primeiro ranking."""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def hybrid_merge(vector_docs: list, lexical_docs: list, k: int) -> list:
+    """Funde os resultados da busca vetorial e da BM25 por RRF e retorna os `k` primeiros documentos."""
+    by_key = {}
+    rankings = []
+    for docs in (vector_docs, lexical_docs):
+        keys = []
+        for doc in docs:
+            key = doc.id or doc.page_content
+            by_key.setdefault(key, doc)
+            keys.append(key)
+        rankings.append(keys)
+    return [by_key[key] for key in reciprocal_rank_fusion(rankings)[:k]]
@@ -0,0 +1,42 @@
+import os
+
+from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
+
+HEADERS_TO_SPLIT_ON = [("#", "h1"), ("##", "h2"), ("###", "h3")]
+
+
+class DocumentChunker:
+    """Divide os documentos da base de conhecimento em chunks antes do embedding.
+
+    O all-MiniLM-L6-v2 trunca a entrada em 256 word pieces, então documentos
+    inteiros teriam a maior parte do texto ignorada. Arquivos Markdown são
+    primeiro separados pelas seções (#, ##, ###) e cada seção é então dividida
+    por tamanho, preservando os títulos no conteúdo e nos metadados.
+    """
+
+    def __init__(self, chunk_size: int = None, chunk_overlap: int = None):
+        self.chunk_size = chunk_size or int(os.environ.get("RAG_CHUNK_SIZE", 800))
+        self.chunk_overlap = chunk_overlap if chunk_overlap is not None else int(os.environ.get("RAG_CHUNK_OVERLAP", 100))
+        self.markdown_splitter = MarkdownHeaderTextSplitter(HEADERS_TO_SPLIT_ON, strip_headers=False)
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap
+        )
+
+    @property
+    def config(self) -> dict:
+        """Parâmetros que, se alterados, exigem reindexar toda a base."""
+        return {'chunk_size': self.chunk_size, 'chunk_overlap': self.chunk_overlap, 'markdown_headers': True}
+
+    def split(self, content: str, source: str) -> list[tuple[str, dict]]:
+        """Retorna os pares (texto, metadados) dos chunks de um documento."""
+        if source.lower().endswith(".md"):
+            sections = [(doc.page_content, doc.metadata) for doc in self.markdown_splitter.split_text(content)]
+        else:
+            sections = [(content, {})]
+
+        chunks = []
+        for section_text, section_metadata in sections:
+            for text in self.text_splitter.split_text(section_text):
+                if text.strip():
+                    chunks.append((text, {**section_metadata, "source": source, "chunk": len(chunks)}))
+        return chunks
@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKENDS = ("torch", "onnx", "openvino")
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+class SharedEmbeddings(Embeddings):
+    """Embeddings compartilhados pelo processo, seguros para uso entre threads.
+
+    O tokenizer do HuggingFace não suporta chamadas concorrentes, por isso as
+    requisições são serializadas; o runtime (PyTorch, ONNX Runtime ou
+    OpenVINO) já paraleliza cada chamada entre os núcleos da CPU.
+    """
+
+    def __init__(self, model: Embeddings):
+        self.model = model
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with self._lock:
+            return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        with self._lock:
+            return self.model.embed_query(text)
+
+
+def embedding_config() -> dict:
+    """Backend de inferência do modelo de embeddings lido do ambiente (`EMBEDDING_*`)."""
+    config = {
+        'backend': os.environ.get("EMBEDDING_BACKEND", "torch").lower(),
+        # Arquivo do modelo exportado no repositório do modelo, ex.: onnx/model_qint8_avx512_vnni.onnx
+        'model_file': os.environ.get("EMBEDDING_MODEL_FILE") or None,
+        'batch_size': int(os.environ.get("EMBEDDING_BATCH_SIZE", 32)),
+        # 0 mantém o padrão do runtime (um thread por núcleo)
+        'threads': int(os.environ.get("EMBEDDING_THREADS", 0)),
+    }
+    if config['backend'] not in EMBEDDING_BACKENDS:
+        raise ValueError(f"EMBEDDING_BACKEND inválido: {config['backend']} (opções: {', '.join(EMBEDDING_BACKENDS)})")
+    return config
+
+
+def embedding_id(config: dict = None) -> str:
+    """Identifica o modelo e a sua variante exportada nas chaves dos índices persistidos.
+
+    O PyTorch mantém só o nome do modelo, para que índices já salvos continuem válidos.
+    """
+    config = config or embedding_config()
+    if config['backend'] == "torch":
+        return EMBEDDING_MODEL
+    return f"{EMBEDDING_MODEL}|{config['backend']}|{config['model_file'] or 'default'}"
+
+
+def create_embedding_model(config: dict = None) -> HuggingFaceEmbeddings:
+    """Instancia o MiniLM no backend configurado: PyTorch, ONNX Runtime ou OpenVINO (inclusive int8)."""
+    config = config or embedding_config()
+    backend, threads = config['backend'], config['threads']
+    model_kwargs = {"device": "cpu"}
+    backend_kwargs = {}
+
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+    else:
+        model_kwargs["backend"] = backend
+        if config['model_file']:
+            backend_kwargs["file_name"] = config['model_file']
+        if threads and backend == "onnx":
+            import onnxruntime
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = threads
+            backend_kwargs["session_options"] = session_options
+        elif threads:
+            backend_kwargs["ov_config"] = {"INFERENCE_NUM_THREADS": threads}
+    if backend_kwargs:
+        model_kwargs["model_kwargs"] = backend_kwargs
+
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": config['batch_size']},
+    )
+
+
+def get_embeddings() -> SharedEmbeddings:
+    """Retorna o modelo de embeddings do processo, carregando-o na primeira chamada."""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                start = time.perf_counter()
+                config = embedding_config()
+                _instance = SharedEmbeddings(create_embedding_model(config))
+                logger.info(
+                    f"Modelo de embeddings carregado em {time.perf_counter() - start:.2f}s "
+                    f"(backend {config['backend']}, {config['model_file'] or 'modelo padrão'})"
+                )
+    return _instance
+
+
+def warmup_embeddings():
+    """Carrega o modelo e executa uma inferência inicial para aquecer o runtime."""
+    start = time.perf_counter()
+    get_embeddings().embed_query("warm-up")
+    logger.info(f"Embeddings aquecidos em {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,69 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Intervalo entre logs de progresso da carga (s)
+METRICS_LOG_INTERVAL = 10
+
+
+class LoaderMetrics:
+    """Contadores de vazão da carga da base de conhecimento."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.files = 0
+        self.bytes = 0
+        self.chunks = 0
+        self._last_log = self.start
+
+    def record(self, nbytes: int = 0, chunks: int = 0, files: int = 0):
+        self.files += files
+        self.bytes += nbytes
+        self.chunks += chunks
+        if time.perf_counter() - self._last_log >= METRICS_LOG_INTERVAL:
+            self._last_log = time.perf_counter()
+            self.log("Carga em andamento")
+
+    def summary(self) -> dict:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'files_per_s': round(self.files / elapsed, 1),
+            'mb_per_s': round(self.bytes / 1024 / 1024 / elapsed, 2),
+            'chunks_per_s': round(self.chunks / elapsed, 1),
+        }
+
+    def log(self, prefix: str):
+        s = self.summary()
+        logger.info(
+            f"{prefix}: {self.files} arquivos, {self.bytes / 1024 / 1024:.1f}MB, {self.chunks} chunks em {s['elapsed_s']}s "
+            f"({s['files_per_s']} arquivos/s, {s['mb_per_s']} MB/s, {s['chunks_per_s']} chunks/s)"
+        )
+
+
+def iter_concurrent(items, fn, workers: int = None, max_pending: int = None):
+    """Aplica `fn` aos itens em um pool de threads e produz os resultados conforme ficam prontos.
+
+    No máximo `max_pending` itens ficam em voo: se o consumidor (o embedding)
+    estiver mais lento que a leitura, os leitores esperam, limitando a memória.
+    """
+    workers = workers or int(os.environ.get("RAG_LOADER_WORKERS", 8))
+    max_pending = max_pending or int(os.environ.get("RAG_LOADER_QUEUE", 64))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kb-loader") as pool:
+        pending = set()
+        for item in items:
+            pending.add(pool.submit(fn, item))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bm25 import BM25Index
+from chunking import DocumentChunker
+from embeddings import EMBEDDING_MODEL, embedding_id
+from kb_loader import LoaderMetrics, iter_concurrent
+from log import get_logger
+
+logger = get_logger(__name__)
+
+SUPPORTED_EXTENSIONS = (".txt", ".md")
+PLACEHOLDER_SOURCE = "default_policy"
+PLACEHOLDER_TEXT = "Procedimentos padrão: Investigar 404 repetidos e bloquear IPs de SQLi."
+
+
+class KnowledgeBaseSync:
+    """Sincroniza incrementalmente os arquivos da base de conhecimento com o Chroma.
+
+    Um manifesto JSON guarda, por arquivo, o mtime, o tamanho e o SHA-256 do
+    conteúdo. Arquivos com mtime e tamanho inalterados nem são lidos; os
+    alterados só são reindexados se o hash mudar. Os vetores são identificados
+    pelo metadado `source`, então arquivos removidos têm seus vetores apagados.
+    Se os parâmetros de chunking ou o backend de embeddings mudarem, toda a
+    base é reindexada.
+
+    Os arquivos são lidos, comparados e divididos por um pool de threads e
+    chegam como fluxo ao embedding; os chunks são embedados em lotes e gravados
+    no Chroma em uma thread separada. Assim leitura, embedding e gravação se
+    sobrepõem.
+
+    O índice BM25 da busca híbrida acompanha o Chroma: recebe os mesmos ids e
+    fontes, é persistido em `lexical_index_path` ao fim de cada sincronização
+    com alterações e, se o arquivo não existir, é reconstruído a partir do Chroma.
+    """
+
+    def __init__(self, vector_store, kb_dir: str, manifest_path: str, chunker: DocumentChunker = None, batch_size: int = None,
+                 lexical_index_path: str = None):
+        self.vector_store = vector_store
+        self.kb_dir = kb_dir
+        self.manifest_path = manifest_path
+        self.chunker = chunker or DocumentChunker()
+        self.batch_size = batch_size or int(os.environ.get("RAG_EMBED_BATCH_SIZE", 64))
+        self.lexical_index_path = lexical_index_path or os.path.join(os.path.dirname(manifest_path), "bm25.json")
+        self.bm25 = self._load_lexical_index()
+        self._lock = threading.Lock()
+
+    def sync(self) -> dict:
+        """Executa a sincronização e retorna a contagem de arquivos por resultado."""
+        with self._lock:
+            start = time.perf_counter()
+            manifest = self._load_manifest()
+            files = manifest['files']
+            force = manifest['config'] != self.index_config
+            if force and files:
+                logger.info("Parâmetros de chunking ou embeddings alterados: reindexando toda a base de conhecimento")
+
+            counts = {'added': 0, 'updated': 0, 'skipped': 0, 'removed': 0, 'chunks': 0}
+            seen = set()
+            pending = []
+            metrics = LoaderMetrics()
+
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-writer") as writer:
+                previous_write = None
+
+                for loaded in iter_concurrent(self._scan(), lambda fpath: self._load_file(fpath, files.get(fpath), force)):
+                    fpath = loaded['path']
+                    seen.add(fpath)
+                    if loaded['error']:
+                        logger.warning(f"Erro ao sincronizar {fpath}: {loaded['error']}")
+                        continue
+
+                    counts[loaded['result']] += 1
+                    metrics.record(nbytes=loaded['bytes'], files=1)
+                    if loaded['result'] == 'skipped':
+                        if loaded['entry']:
+                            files[fpath] = loaded['entry']
+                        continue
+
+                    # Remove também vetores de stores criados antes do manifesto existir
+                    self.vector_store.delete(where={"source": fpath})
+                    self.bm25.delete_source(fpath)
+                    files[fpath] = loaded['entry']
+                    pending.extend(loaded['chunks'])
+
+                    while len(pending) >= self.batch_size:
+                        batch, pending = pending[:self.batch_size], pending[self.batch_size:]
+                        previous_write = self._embed_batch(batch, writer, previous_write)
+                        metrics.record(chunks=len(batch))
+
+                if pending:
+                    previous_write = self._embed_batch(pending, writer, previous_write)
+                    metrics.record(chunks=len(pending))
+                if previous_write is not None:
+                    previous_write.result()
+
+            counts['chunks'] = metrics.chunks
+            metrics.log("Carga da base de conhecimento concluída")
+
+            for fpath in set(files) - seen:
+                self.vector_store.delete(where={"source": fpath})
+                self.bm25.delete_source(fpath)
+                del files[fpath]
+                counts['removed'] += 1
+
+            self._sync_placeholder(has_documents=bool(files))
+            self._save_manifest({'config': self.index_config, 'files': files})
+            if counts['added'] or counts['updated'] or counts['removed'] or not os.path.exists(self.lexical_index_path):
+                self.bm25.save(self.lexical_index_path)
+
+            logger.info(
+                f"Base de conhecimento sincronizada em {time.perf_counter() - start:.2f}s: "
+                f"{counts['added']} novos, {counts['updated']} atualizados, "
+                f"{counts['skipped']} inalterados, {counts['removed']} removidos, "
+                f"{counts['chunks']} chunks indexados"
+            )
+            return counts
+
+    @property
+    def index_config(self) -> dict:
+        """Parâmetros gravados no manifesto; o modelo padrão não entra, mantendo válidos os manifestos existentes."""
+        config = dict(self.chunker.config)
+        if embedding_id() != EMBEDDING_MODEL:
+            config['embedding'] = embedding_id()
+        return config
+
+    def _scan(self):
+        """Lista os arquivos suportados do diretório da base de conhecimento."""
+        if not os.path.isdir(self.kb_dir):
+            return
+        for root, _, files in os.walk(self.kb_dir):
+            for fname in files:
+                if fname.lower().endswith(SUPPORTED_EXTENSIONS):
+                    yield os.path.join(root, fname)
+
+    def _load_file(self, fpath: str, entry: dict, force: bool) -> dict:
+        """Lê e compara o arquivo com sua entrada no manifesto, dividindo-o se mudou.
+
+        Executado nas threads de leitura: não altera o manifesto nem o vector store.
+        """
+        loaded = {'path': fpath, 'result': 'skipped', 'entry': None, 'chunks': [], 'bytes': 0, 'error': None}
+        try:
+            stat = os.stat(fpath)
+            if not force and entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+                return loaded
+
+            with open(fpath, "rb") as f:
+                raw = f.read()
+            loaded['bytes'] = len(raw)
+            sha256 = hashlib.sha256(raw).hexdigest()
+
+            if not force and entry and entry['sha256'] == sha256:
+                loaded['entry'] = {**entry, 'mtime': stat.st_mtime, 'size': stat.st_size}
+                return loaded
+
+            content = raw.decode("utf-8", errors="ignore")
+            chunks = self.chunker.split(content, fpath) if content.strip() else []
+
+            loaded.update(
+                result='updated' if entry else 'added',
+                chunks=chunks,
+                entry={'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': sha256, 'chunks': len(chunks)},
+            )
+        except Exception as e:
+            loaded['error'] = e
+        return loaded
+
+    def _embed_batch(self, batch: list, writer: ThreadPoolExecutor, previous_write):
+        """Agenda o embedding e a gravação do lote na thread de escrita, aguardando o lote anterior.
+
+        O `add_texts` do Chroma gera os embeddings e grava por upsert nos ids
+        determinísticos dos chunks; enquanto isso, a thread principal continua
+        lendo e dividindo os próximos arquivos.
+        """
+        texts = [text for text, _ in batch]
+        metadatas = [metadata for _, metadata in batch]
+        ids = [chunk_id(metadata['source'], metadata['chunk']) for metadata in metadatas]
+        self.bm25.add(ids, texts, [metadata['source'] for metadata in metadatas])
+
+        if previous_write is not None:
+            previous_write.result()
+        return writer.submit(self.vector_store.add_texts, texts, metadatas, ids=ids)
+
+    def _sync_placeholder(self, has_documents: bool):
+        """Mantém o documento padrão apenas enquanto a base estiver vazia."""
+        existing = self.vector_store.get(where={"source": PLACEHOLDER_SOURCE}, include=[])['ids']
+        if has_documents and existing:
+            self.vector_store.delete(ids=existing)
+            self.bm25.delete(existing)
+        elif not has_documents and not existing:
+            logger.warning("KB vazia. Usando placeholder de segurança.")
+            self.vector_store.add_texts(
+                texts=[PLACEHOLDER_TEXT], metadatas=[{"source": PLACEHOLDER_SOURCE}], ids=[PLACEHOLDER_SOURCE]
+            )
+            self.bm25.add([PLACEHOLDER_SOURCE], [PLACEHOLDER_TEXT], [PLACEHOLDER_SOURCE])
+
+    def _load_lexical_index(self) -> BM25Index:
+        bm25 = BM25Index.load(self.lexical_index_path)
+        if bm25 is not None:
+            return bm25
+
+        # Stores criados antes da busca híbrida: os textos dos chunks já estão no Chroma
+        start = time.perf_counter()
+        data = self.vector_store.get(include=["documents", "metadatas"])
+        sources = [(metadata or {}).get("source") for metadata in data['metadatas']]
+        bm25 = BM25Index.from_documents(data['ids'], data['documents'], sources)
+        if len(bm25):
+            logger.info(f"Índice BM25 reconstruído a partir do Chroma: {len(bm25)} chunks em {time.perf_counter() - start:.2f}s")
+        return bm25
+
+    def _load_manifest(self) -> dict:
+        empty = {'config': None, 'files': {}}
+        if not os.path.exists(self.manifest_path):
+            return empty
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Manifesto da base de conhecimento inválido, reconstruindo: {e}")
+            return empty
+        if 'files' not in manifest:
+            # Manifesto sem chunking: mantém os arquivos para detectar remoções e força reindexação
+            return {'config': None, 'files': manifest}
+        return manifest
+
+    def _save_manifest(self, manifest: dict):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def chunk_id(source: str, index: int) -> str:
+    """Id determinístico do chunk, para que reindexações façam upsert em vez de duplicar."""
+    return f"{hashlib.sha1(source.encode('utf-8')).hexdigest()}:{index}"
@@ -0,0 +1,434 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from collections import deque
+
+import httpx
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Respostas de servidor sobrecarregado ou indisponível, que valem nova tentativa
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Falhas antes de o servidor processar a requisição (ReadTimeout não entra: repetir só aumentaria a carga)
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+# Cabeçalhos que deixam de valer quando o corpo já lido é replicado para as requisições agrupadas
+DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+class GatewayBusy(httpx.TransportError):
+    """A fila do gateway está cheia ou a espera por uma vaga excedeu o limite."""
+
+
+class LLMGateway:
+    """Camada entre os clientes HTTP e o servidor do LLM (LM Studio).
+
+    Instalado como transporte do httpx, vale para todas as chamadas do
+    `ChatOpenAI`, síncronas, assíncronas e em streaming:
+
+    * Concorrência limitada: no máximo `max_concurrency` chamadas em andamento
+      por cliente (síncrono e assíncrono); as demais esperam em fila de até
+      `max_queue` chamadas por até `queue_timeout` segundos, e além disso são
+      recusadas com `GatewayBusy` em vez de sobrecarregar o servidor. A vaga só
+      é liberada quando a resposta termina, inclusive em streaming.
+    * Novas tentativas com backoff exponencial e jitter para erros de conexão
+      e respostas 429/5xx, respeitando o `Retry-After`.
+    * Requisições idênticas (mesmo corpo) em andamento ao mesmo tempo são
+      agrupadas: só a primeira vai ao servidor e as demais recebem uma cópia
+      da resposta. Se a primeira for cancelada (ex.: o cliente desconectou do
+      SSE), uma das agrupadas refaz a chamada em vez de herdar o cancelamento.
+      Requisições em streaming não são agrupadas.
+    * Métricas de latência das chamadas e de espera na fila em `stats()`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        max_queue: int = None,
+        queue_timeout: float = None,
+        max_retries: int = None,
+        backoff_base: float = None,
+        backoff_max: float = None,
+        coalesce: bool = None,
+        window: int = 1000,
+    ):
+        self.max_concurrency = max_concurrency or int(os.environ.get("LLM_GATEWAY_CONCURRENCY", 4))
+        self.max_queue = max_queue if max_queue is not None else int(os.environ.get("LLM_GATEWAY_MAX_QUEUE", 64))
+        self.queue_timeout = queue_timeout if queue_timeout is not None else float(os.environ.get("LLM_GATEWAY_QUEUE_TIMEOUT", 120))
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get("LLM_MAX_RETRIES", 3))
+        self.backoff_base = backoff_base if backoff_base is not None else float(os.environ.get("LLM_BACKOFF_BASE", 0.5))
+        self.backoff_max = backoff_max if backoff_max is not None else float(os.environ.get("LLM_BACKOFF_MAX", 10))
+        self.coalesce = coalesce if coalesce is not None else os.environ.get("LLM_COALESCE", "true").lower() == "true"
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        # Criado no event loop do cliente assíncrono, no primeiro uso
+        self._async_slots = None
+        self._pending = {}
+        self._async_pending = {}
+        self._lock = threading.Lock()
+
+        self._in_flight = 0
+        self._waiting = 0
+        self._latencies = deque(maxlen=window)
+        self._waits = deque(maxlen=window)
+        self.metrics = {'calls': 0, 'errors': 0, 'retries': 0, 'coalesced': 0, 'rejected': 0}
+
+    def transport(self, limits: httpx.Limits) -> "GatewayTransport":
+        return GatewayTransport(self, httpx.HTTPTransport(limits=limits))
+
+    def async_transport(self, limits: httpx.Limits) -> "AsyncGatewayTransport":
+        return AsyncGatewayTransport(self, httpx.AsyncHTTPTransport(limits=limits))
+
+    # --- Agrupamento de requisições idênticas ---
+
+    def _coalesce_key(self, request: httpx.Request):
+        if not self.coalesce or request.method != "POST":
+            return None
+        try:
+            body = request.content
+        except httpx.RequestNotRead:
+            return None
+        try:
+            if json.loads(body).get("stream"):
+                return None
+        except (ValueError, AttributeError):
+            return None
+        return str(request.url), hashlib.sha256(body).digest()
+
+    @staticmethod
+    def _snapshot(response: httpx.Response) -> tuple:
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in DROPPED_HEADERS]
+        return response.status_code, headers, response.content
+
+    @staticmethod
+    def _replay(snapshot: tuple, request: httpx.Request) -> httpx.Response:
+        status, headers, content = snapshot
+        return httpx.Response(status, headers=headers, content=content, request=request)
+
+    def send(self, request: httpx.Request, transport: httpx.BaseTransport) -> httpx.Response:
+        key = self._coalesce_key(request)
+        if key is None:
+            return self._send_limited(request, transport)
+
+        while True:
+            with self._lock:
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = {'event': threading.Event(), 'snapshot': None, 'error': None}
+                    break
+            pending['event'].wait()
+            if pending['error'] is not None:
+                raise pending['error']
+            if pending['snapshot'] is not None:
+                with self._lock:
+                    self.metrics['coalesced'] += 1
+                return self._replay(pending['snapshot'], request)
+            # A primeira requisição foi interrompida sem resposta nem erro: esta refaz a chamada
+
+        try:
+            response = self._send_limited(request, transport)
+            try:
+                response.read()
+            finally:
+                response.close()
+            pending['snapshot'] = self._snapshot(response)
+        except Exception as e:
+            pending['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending['event'].set()
+        return self._replay(pending['snapshot'], request)
+
+    async def asend(self, request: httpx.Request, transport: httpx.AsyncBaseTransport) -> httpx.Response:
+        key = self._coalesce_key(request)
+        if key is None:
+            return await self._asend_limited(request, transport)
+
+        while (future := self._async_pending.get(key)) is not None:
+            # O shield impede que o cancelamento desta requisição cancele a compartilhada
+            snapshot = await asyncio.shield(future)
+            if snapshot is not None:
+                with self._lock:
+                    self.metrics['coalesced'] += 1
+                return self._replay(snapshot, request)
+            # A primeira requisição foi cancelada: esta refaz a chamada (ou aguarda quem já a refez)
+
+        future = self._async_pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            response = await self._asend_limited(request, transport)
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+            future.set_result(self._snapshot(response))
+        except Exception as e:
+            future.set_exception(e)
+            # Evita o aviso de exceção não recuperada quando não há requisições agrupadas
+            future.exception()
+            raise
+        except BaseException:
+            # Cancelamento (ou interrupção) é desta requisição: as agrupadas não o herdam
+            future.set_result(None)
+            raise
+        finally:
+            del self._async_pending[key]
+        return self._replay(future.result(), request)
+
+    # --- Limite de concorrência, fila e novas tentativas ---
+
+    def _enter_queue(self):
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self.metrics['rejected'] += 1
+                raise GatewayBusy(f"Fila do LLM cheia ({self._waiting} chamadas aguardando)")
+            self._waiting += 1
+
+    def _leave_queue(self, rejected: bool = False):
+        with self._lock:
+            self._waiting -= 1
+            if rejected:
+                self.metrics['rejected'] += 1
+
+    def _acquired(self, queued_at: float):
+        with self._lock:
+            self._in_flight += 1
+            self.metrics['calls'] += 1
+            self._waits.append(time.perf_counter() - queued_at)
+
+    def _release_callback(self, release, started_at: float):
+        released = False
+
+        def done(error: bool = False):
+            nonlocal released
+            if released:
+                return
+            released = True
+            release()
+            with self._lock:
+                self._in_flight -= 1
+                self._latencies.append(time.perf_counter() - started_at)
+                if error:
+                    self.metrics['errors'] += 1
+
+        return done
+
+    def _send_limited(self, request: httpx.Request, transport: httpx.BaseTransport) -> httpx.Response:
+        queued_at = time.perf_counter()
+        # Só entra na fila (e conta no limite dela) quem não encontra vaga livre
+        if not self._slots.acquire(blocking=False):
+            self._enter_queue()
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+            self._leave_queue(rejected=not acquired)
+            if not acquired:
+                raise GatewayBusy(f"Nenhuma vaga para o LLM em {self.queue_timeout:.0f}s")
+        self._acquired(queued_at)
+
+        done = self._release_callback(self._slots.release, time.perf_counter())
+        try:
+            response = self._send_with_retries(request, transport)
+        except Exception:
+            done(error=True)
+            raise
+        response.stream = SlotStream(response.stream, done)
+        return response
+
+    async def _asend_limited(self, request: httpx.Request, transport: httpx.AsyncBaseTransport) -> httpx.Response:
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        queued_at = time.perf_counter()
+        if not self._async_slots.locked():
+            await self._async_slots.acquire()
+        else:
+            self._enter_queue()
+            try:
+                await asyncio.wait_for(self._async_slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._leave_queue(rejected=True)
+                raise GatewayBusy(f"Nenhuma vaga para o LLM em {self.queue_timeout:.0f}s")
+            except BaseException:
+                self._leave_queue()
+                raise
+            self._leave_queue()
+        self._acquired(queued_at)
+
+        done = self._release_callback(self._async_slots.release, time.perf_counter())
+        try:
+            response = await self._asend_with_retries(request, transport)
+        except Exception:
+            done(error=True)
+            raise
+        except BaseException:
+            # Cancelada pelo chamador: libera a vaga sem contar como erro
+            done()
+            raise
+        response.stream = AsyncSlotStream(response.stream, done)
+        return response
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+        try:
+            delay = max(delay, min(self.backoff_max, float(retry_after)))
+        except (TypeError, ValueError):
+            pass
+        return delay
+
+    def _retry_delay(self, attempt: int, response: httpx.Response = None, error: Exception = None):
+        """Espera antes da próxima tentativa, ou None se não houver nova tentativa."""
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            return None
+        if attempt >= self.max_retries:
+            if response is not None:
+                # Erros de transporte são contados ao liberar a vaga
+                with self._lock:
+                    self.metrics['errors'] += 1
+            return None
+        delay = self._backoff(attempt, response.headers.get("retry-after") if response is not None else None)
+        reason = f"HTTP {response.status_code}" if response is not None else type(error).__name__
+        with self._lock:
+            self.metrics['retries'] += 1
+        logger.warning(f"Chamada ao LLM falhou ({reason}); nova tentativa {attempt + 1}/{self.max_retries} em {delay:.2f}s")
+        return delay
+
+    def _send_with_retries(self, request: httpx.Request, transport: httpx.BaseTransport) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = transport.handle_request(request)
+            except RETRY_ERRORS as e:
+                delay = self._retry_delay(attempt, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(attempt, response=response)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    async def _asend_with_retries(self, request: httpx.Request, transport: httpx.AsyncBaseTransport) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await transport.handle_async_request(request)
+            except RETRY_ERRORS as e:
+                delay = self._retry_delay(attempt, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(attempt, response=response)
+                if delay is None:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            waits = sorted(self._waits)
+            return {
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'waiting': self._waiting,
+                **self.metrics,
+                'latency_p50_ms': _percentile_ms(latencies, 0.5),
+                'latency_p95_ms': _percentile_ms(latencies, 0.95),
+                'queue_wait_p50_ms': _percentile_ms(waits, 0.5),
+                'queue_wait_p95_ms': _percentile_ms(waits, 0.95),
+                'queue_wait_max_ms': _percentile_ms(waits, 1.0),
+            }
+
+
+def _percentile_ms(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 1)
+
+
+class SlotStream(httpx.SyncByteStream):
+    """Corpo da resposta que libera a vaga do gateway ao ser fechado."""
+
+    def __init__(self, stream, done):
+        self._stream = stream
+        self._done = done
+
+    def __iter__(self):
+        try:
+            yield from self._stream
+        except Exception:
+            self._done(error=True)
+            raise
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._done()
+
+
+class AsyncSlotStream(httpx.AsyncByteStream):
+    """Versão assíncrona de `SlotStream`."""
+
+    def __init__(self, stream, done):
+        self._stream = stream
+        self._done = done
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except Exception:
+            self._done(error=True)
+            raise
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._done()
+
+
+class GatewayTransport(httpx.BaseTransport):
+    def __init__(self, gateway: LLMGateway, transport: httpx.BaseTransport):
+        self.gateway = gateway
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.gateway.send(request, self.transport)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncGatewayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, gateway: LLMGateway, transport: httpx.AsyncBaseTransport):
+        self.gateway = gateway
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.gateway.asend(request, self.transport)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def get_gateway() -> LLMGateway:
+    """Retorna o gateway do LLM do processo, criando-o na primeira chamada."""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = LLMGateway()
+    return _instance
@@ -0,0 +1,212 @@
+import os
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from log_filter import NO_SUSPICIOUS_ACTIVITY, parse_line
+
+# Estimativa sem tokenizer: ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+
+NUMBER_PATTERN = re.compile(r'^\d+$')
+ID_PATTERN = re.compile(r'^(?:[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{16,})$', re.IGNORECASE)
+DIGITS_PATTERN = re.compile(r'\d+')
+
+# Paths de exemplo exibidos quando vários grupos são resumidos em uma linha
+ROLLUP_EXAMPLES = 3
+
+
+def path_template(path: str) -> str:
+    """Normaliza o path: ids numéricos/hex viram {num}/{id}, demais dígitos {n} e valores da query *."""
+    path, _, query = path.partition('?')
+    segments = []
+    for segment in path.split('/'):
+        if NUMBER_PATTERN.match(segment):
+            segment = '{num}'
+        elif ID_PATTERN.match(segment):
+            segment = '{id}'
+        else:
+            segment = DIGITS_PATTERN.sub('{n}', segment)
+        segments.append(segment)
+    template = '/'.join(segments)
+    if query:
+        params = sorted({param.partition('=')[0] for param in query.split('&')})
+        template += '?' + '&'.join(f"{name}=*" for name in params)
+    return template
+
+
+@lru_cache(maxsize=4096)
+def _timestamp_key(timestamp: str):
+    """Converte o timestamp do CLF em segundos para comparação, ou None se não reconhecido."""
+    for fmt in ("%d/%b/%Y:%H:%M:%S %z", "%d/%b/%Y:%H:%M:%S"):
+        try:
+            parsed = datetime.strptime(timestamp, fmt)
+        except ValueError:
+            continue
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return None
+
+
+class LogGroup:
+    """Linhas com a mesma assinatura (IP, método, template do path, status)."""
+
+    def __init__(self, signature: tuple, sample: str, sample_path: str = None):
+        self.signature = signature
+        self.sample = sample
+        self.sample_path = sample_path
+        self.count = 0
+        self.first_seen = None
+        self.last_seen = None
+
+    def add(self, timestamp: str = None):
+        self.count += 1
+        if timestamp is None:
+            return
+        if self.first_seen is None:
+            self.first_seen = self.last_seen = timestamp
+            return
+
+        key = _timestamp_key(timestamp)
+        if key is None:
+            # Formato desconhecido: vale a ordem de chegada
+            self.last_seen = timestamp
+        elif key < (_timestamp_key(self.first_seen) or key):
+            self.first_seen = timestamp
+        elif key > (_timestamp_key(self.last_seen) or key):
+            self.last_seen = timestamp
+
+    def describe(self) -> str:
+        ip, method, template, status = self.signature
+        if method is None:
+            return f"[{self.count}x] {self.sample}"
+
+        line = f"[{self.count}x] {ip} {method} {template} -> {status}"
+        if self.first_seen:
+            line += f" | {self.first_seen}"
+            if self.last_seen != self.first_seen:
+                line += f" .. {self.last_seen}"
+        if template != self.sample_path:
+            line += f" | ex.: {self.sample_path}"
+        return line
+
+
+def describe_rollup(groups: list[LogGroup]) -> str:
+    """Resume grupos do mesmo IP, método e status que diferem apenas no path."""
+    ip, method, _, status = groups[0].signature
+    count = sum(group.count for group in groups)
+    line = f"[{count}x] {ip} {method} ({len(groups)} paths distintos) -> {status}"
+
+    timestamps = [ts for group in groups for ts in (group.first_seen, group.last_seen) if ts]
+    keyed = [(_timestamp_key(ts), ts) for ts in timestamps if _timestamp_key(ts) is not None]
+    if keyed:
+        first, last = min(keyed)[1], max(keyed)[1]
+        line += f" | {first}" + (f" .. {last}" if last != first else "")
+    examples = ", ".join(group.sample_path for group in groups[:ROLLUP_EXAMPLES])
+    return line + f" | ex.: {examples}"
+
+
+class LogAggregator:
+    """Agrupa as linhas suspeitas por assinatura normalizada e resume dentro de um orçamento de tokens.
+
+    Um scanner que gera milhares de 404 quase idênticos vira uma única linha
+    com contagem e janela de tempo. Linhas fora do Common/Combined Log Format
+    são agrupadas pelo texto com os dígitos normalizados. Os grupos são
+    ordenados pela contagem (e pela assinatura, em caso de empate), então o
+    resumo e a consulta ao retriever são determinísticos.
+    """
+
+    def __init__(self, max_tokens: int = None):
+        self.max_tokens = max_tokens or int(os.environ.get("RAG_SUMMARY_MAX_TOKENS", 1500))
+        self.groups = {}
+        self.lines = 0
+
+    def add(self, line: str):
+        line = line.strip()
+        if not line:
+            return
+        self.lines += 1
+        fields = parse_line(line)
+        if fields:
+            signature = (fields['ip'], fields['method'], path_template(fields['path']), fields['status'])
+            timestamp, sample_path = fields['timestamp'], fields['path']
+        else:
+            signature = (None, None, DIGITS_PATTERN.sub('{n}', line), None)
+            timestamp, sample_path = None, None
+
+        group = self.groups.get(signature)
+        if group is None:
+            group = self.groups[signature] = LogGroup(signature, line, sample_path)
+        group.add(timestamp)
+
+    def add_text(self, text: str):
+        for line in text.split('\n'):
+            self.add(line)
+
+    def ranked(self) -> list[LogGroup]:
+        return sorted(self.groups.values(), key=lambda g: (-g.count, tuple(str(part) for part in g.signature)))
+
+    def top_samples(self, n: int = 5) -> list[str]:
+        """Linhas representativas dos grupos mais frequentes, para a consulta ao retriever."""
+        return [group.sample for group in self.ranked()[:n]]
+
+    def summary(self) -> str:
+        """Resumo compacto dos grupos, do mais ao menos frequente, limitado a `max_tokens`.
+
+        Se a lista detalhada não couber no orçamento, os grupos do mesmo IP,
+        método e status (ex.: um scanner testando milhares de paths) são
+        resumidos em uma linha com a contagem de paths distintos e exemplos.
+        """
+        ranked = self.ranked()
+        header = f"{self.lines} linhas suspeitas agrupadas em {len(ranked)} assinaturas (IP, método, path, status):"
+        budget = self.max_tokens * CHARS_PER_TOKEN - len(header)
+
+        entries = [(group.count, group.describe()) for group in ranked]
+        if sum(len(text) + 1 for _, text in entries) > budget:
+            entries = self._rollup_entries(ranked)
+
+        lines = [header]
+        shown = 0
+        for _, text in entries:
+            if len(text) + 1 > budget and shown:
+                break
+            lines.append(text)
+            budget -= len(text) + 1
+            shown += 1
+
+        omitted = entries[shown:]
+        if omitted:
+            lines.append(f"... {len(omitted)} entradas omitidas ({sum(count for count, _ in omitted)} linhas)")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _rollup_entries(ranked: list[LogGroup]) -> list[tuple[int, str]]:
+        rollups = {}
+        for group in ranked:
+            ip, method, _, status = group.signature
+            key = (ip, method, status) if method is not None else group.signature
+            rollups.setdefault(key, []).append(group)
+
+        entries = []
+        for groups in rollups.values():
+            if len(groups) == 1:
+                entries.append((groups[0].count, groups[0].describe()))
+            else:
+                entries.append((sum(group.count for group in groups), describe_rollup(groups)))
+        # sorted é estável: empates mantêm a ordem determinística de `ranked`
+        return sorted(entries, key=lambda entry: -entry[0])
+
+
+def summarize_logs(cleaned_logs: str, max_tokens: int = None) -> dict:
+    """Agrega os logs filtrados e retorna o resumo, os eventos principais e as contagens."""
+    if cleaned_logs == NO_SUSPICIOUS_ACTIVITY:
+        return {'log_summary': cleaned_logs, 'top_events': [], 'lines': 0, 'groups': 0}
+    aggregator = LogAggregator(max_tokens)
+    aggregator.add_text(cleaned_logs)
+    return {
+        'log_summary': aggregator.summary(),
+        'top_events': aggregator.top_samples(),
+        'lines': aggregator.lines,
+        'groups': len(aggregator.groups),
+    }
@@ -0,0 +1,214 @@
+import re
+import zlib
+import codecs
+from urllib.parse import unquote_plus
+
+# Separadores de palavras em payloads de SQLi na URL: espaço, '+', %20 ou comentário /**/
+SQL_SEPARATOR = r'(?:\s|\+|%20|/\*.*?\*/)+'
+
+
+def sql_word(word: str) -> str:
+    """Palavra SQL não precedida de letra.
+
+    Não usa \\b porque `%20` termina em dígito (ex.: `1%20union`), e o lookbehind
+    vem depois da palavra para o `re` manter a busca rápida pelo literal.
+    """
+    return rf'{word}(?<![a-z_]{word})'
+
+
+# Padrões de ataque (em minúsculas). Nas linhas do CLF valem só para o path/query da requisição
+DEFAULT_ATTACK_PATTERNS = [
+    rf'{sql_word("union")}{SQL_SEPARATOR}(?:all{SQL_SEPARATOR})?select\b',
+    rf'{sql_word("select")}{SQL_SEPARATOR}.{{0,200}}?{sql_word("from")}\b',
+    r'etc/passwd',
+    r'/wp-admin\b',
+    r'/phpmyadmin\b',
+    r'/admin(?=[/?#\s"]|$)',
+    r'\.\./',
+    r'%2e%2e(?:/|%2f)',
+]
+
+NO_SUSPICIOUS_ACTIVITY = "Nenhuma atividade suspeita detectada."
+
+# Status 4xx/5xx na posição do CLF, logo após a requisição entre aspas
+STATUS_ERROR_PATTERN = r'" [45]\d\d\b'
+
+GZIP_MAGIC = b'\x1f\x8b'
+STREAM_BLOCK_SIZE = 1024 * 1024
+# Tamanho dos blocos de linhas convertidos para minúsculas em iter_suspicious
+LOWERCASE_BLOCK_SIZE = 256 * 1024
+
+# Common/Combined Log Format; o path pode conter espaços (ex.: payloads de SQLi)
+CLF_PATTERN = re.compile(
+    r'^(?P<ip>\S+) \S+ \S+ \[(?P<timestamp>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<path>[^"]*?)(?: (?P<protocol>HTTP/[0-9.]+))?" '
+    r'(?P<status>\d{3}) (?P<size>\S+)'
+    r'(?: "(?P<referer>[^"]*)" "(?P<user_agent>[^"]*)")?'
+)
+
+
+def parse_line(line: str):
+    """Extrai os campos de uma linha no Common/Combined Log Format, ou None."""
+    match = CLF_PATTERN.match(line.strip())
+    if match is None:
+        return None
+    fields = match.groupdict()
+    fields['status'] = int(fields['status'])
+    return fields
+
+
+class LogFilter:
+    """Pré-filtro de logs compilado em uma única expressão regular.
+
+    Uma linha do Common/Combined Log Format é suspeita se o status HTTP é 4xx
+    ou 5xx, ou se algum padrão de ataque aparece no path/query da requisição
+    (também após decodificar `%xx` e `+`). Referer e user-agent não contam,
+    então `GET /selected-items` com um referer qualquer não é marcado. Linhas
+    fora do CLF são suspeitas se contêm algum padrão de ataque.
+
+    Os padrões formam uma só alternância, aplicada ao texto em minúsculas (o
+    IGNORECASE do `re` é várias vezes mais lento) para achar as linhas
+    candidatas; só elas são analisadas campo a campo. A conversão é feita em
+    blocos de linhas inteiras, então a cópia em minúsculas fica limitada a
+    `LOWERCASE_BLOCK_SIZE` em vez do tamanho do texto. A cada ocorrência a
+    busca salta para a linha seguinte, então o texto é percorrido uma única
+    vez e nenhuma lista de linhas é criada.
+    """
+
+    def __init__(self, attack_patterns: list[str] = None):
+        attack_patterns = attack_patterns or DEFAULT_ATTACK_PATTERNS
+        alternatives = '|'.join([STATUS_ERROR_PATTERN] + attack_patterns)
+        self._regex = re.compile(alternatives)
+        # Usada só quando lower() altera o tamanho do texto (alguns caracteres não ASCII)
+        self._regex_ignorecase = re.compile(alternatives, re.IGNORECASE)
+        self._attack_regex = re.compile('|'.join(attack_patterns))
+
+    def _confirm(self, line: str) -> bool:
+        """Confirma uma linha candidata pelos campos do CLF."""
+        fields = parse_line(line)
+        if fields is None:
+            return self._attack_regex.search(line.lower()) is not None
+        if fields['status'] >= 400:
+            return True
+        path = fields['path'].lower()
+        return self._attack_regex.search(path) is not None or self._attack_regex.search(unquote_plus(path)) is not None
+
+    def is_suspicious(self, line: str) -> bool:
+        return next(self.iter_suspicious(line), None) is not None
+
+    def iter_suspicious(self, text: str):
+        """Percorre o texto em uma passada, produzindo as linhas suspeitas sem espaços nas pontas."""
+        start = 0
+        while start < len(text):
+            end = text.find('\n', start + LOWERCASE_BLOCK_SIZE)
+            end = len(text) if end == -1 else end + 1
+            yield from self._iter_block(text[start:end])
+            start = end
+
+    def _iter_block(self, text: str):
+        """Busca as linhas suspeitas em um bloco de linhas inteiras."""
+        haystack = text.lower()
+        regex = self._regex
+        if len(haystack) != len(text):
+            haystack, regex = text, self._regex_ignorecase
+
+        search = regex.search
+        pos = 0
+        while True:
+            match = search(haystack, pos)
+            if match is None:
+                return
+            start = text.rfind('\n', 0, match.start()) + 1
+            end = text.find('\n', match.end())
+            if end == -1:
+                end = len(text)
+            line = text[start:end].strip()
+            # Ocorrência do status de erro já é conclusiva; as dos padrões de ataque são conferidas no path
+            if line and (haystack.startswith('" ', match.start()) or self._confirm(line)):
+                yield line
+            pos = end + 1
+
+    def iter_suspicious_stream(self, chunks):
+        """Filtra um fluxo de blocos de texto (ex.: um arquivo lido em blocos ou o corpo de uma requisição).
+
+        Os blocos são processados até a última quebra de linha; o restante é
+        guardado e completado pelo bloco seguinte, então a memória fica limitada
+        ao tamanho do bloco.
+        """
+        tail = ""
+        for chunk in chunks:
+            if not chunk:
+                continue
+            tail += chunk
+            cut = tail.rfind('\n') + 1
+            if cut:
+                yield from self.iter_suspicious(tail[:cut])
+                tail = tail[cut:]
+        if tail:
+            yield from self.iter_suspicious(tail)
+
+    def filter(self, text: str) -> str:
+        return "\n".join(self.iter_suspicious(text))
+
+    def filter_stream(self, stream, max_lines: int = None, block_size: int = STREAM_BLOCK_SIZE):
+        """Filtra um stream binário (texto ou gzip) sem carregá-lo inteiro na memória.
+
+        Apenas as linhas suspeitas são mantidas, até `max_lines`; as demais são
+        só contadas. Retorna o texto filtrado e as estatísticas da leitura.
+        """
+        stats = {'bytes': 0, 'lines': 0, 'suspicious_lines': 0, 'truncated': False}
+
+        def counted_blocks():
+            for block in iter_text_blocks(stream, block_size, stats):
+                stats['lines'] += block.count('\n')
+                yield block
+
+        kept = []
+        for line in self.iter_suspicious_stream(counted_blocks()):
+            stats['suspicious_lines'] += 1
+            if max_lines is None or len(kept) < max_lines:
+                kept.append(line)
+            else:
+                stats['truncated'] = True
+        return "\n".join(kept), stats
+
+
+def iter_text_blocks(stream, block_size: int = STREAM_BLOCK_SIZE, stats: dict = None):
+    """Lê um stream binário em blocos de texto UTF-8, descompactando gzip se necessário.
+
+    O gzip é detectado pelos bytes mágicos do primeiro bloco, então funciona
+    com `Content-Encoding: gzip`, arquivos .gz ou corpo chunked. A saída do
+    descompressor é limitada a `block_size` por chamada, e arquivos com vários
+    membros gzip concatenados (ex.: logrotate) são suportados.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    decompressor = None
+    first = True
+
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        if stats is not None:
+            stats['bytes'] += len(block)
+        if first:
+            first = False
+            if block[:2] == GZIP_MAGIC:
+                decompressor = zlib.decompressobj(wbits=31)
+        if decompressor is None:
+            yield decoder.decode(block)
+            continue
+
+        while block:
+            data = decompressor.decompress(block, block_size)
+            if data:
+                yield decoder.decode(data)
+            if decompressor.eof:
+                block = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=31)
+            else:
+                block = decompressor.unconsumed_tail
+
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
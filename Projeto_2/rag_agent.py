@@ -1,12 +1,23 @@
 import os
 import sys
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import TypedDict
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableLambda
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 
+from bm25 import HYBRID_FETCH_K, HYBRID_SEARCH, hybrid_merge
+from embeddings import get_embeddings
+from kb_sync import KnowledgeBaseSync
+from log_filter import LogFilter, NO_SUSPICIOUS_ACTIVITY
+from log_aggregator import summarize_logs
+from batch import preprocess_batch
+from llm_client import create_chat_model
+from llm_gateway import get_gateway
+from reranker import Reranker
+from retrieval_cache import get_retrieval_cache
 from log import get_logger
 
 logger = get_logger(__name__)
@@ -14,104 +25,162 @@ logger = get_logger(__name__)
 class AgentConfig(TypedDict):
     raw_logs: str
     cleaned_logs: str
+    log_summary: str
+    top_events: list[str]
     retrieved_context: str
     analysis_report: str
 
 class RAGAgent:
     def __init__(self):
-        # Configuração do LLM (Gemma-3 via LM Studio)
-        self.llm = ChatOpenAI(
-            model_name='google/gemma-3-12b',
-            openai_api_base="http://192.168.0.5:1234/v1",
-            openai_api_key="lm-studio",
-            temperature=0.0,
-            max_tokens=500
-        )
+        # Configuração do LLM (Gemma-3 via LM Studio) com o pool HTTP compartilhado
+        self.llm = create_chat_model(temperature=0.0, max_tokens=500)
         
-        # Inicialização única dos Embeddings e Retriever para performance
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'}
-        )
+        # Embeddings compartilhados pelo processo e Retriever inicializado uma única vez
+        self.embeddings = get_embeddings()
+        self.retrieval_cache = get_retrieval_cache()
         self.retriever = self._setup_retriever()
+        # Over-fetch de candidatos e reranking antes de montar o contexto do prompt
+        self.reranker = Reranker()
+        self.log_filter = LogFilter()
         
         # Compilação do grafo na inicialização
         self.app = self._build_graph()
 
     def _setup_retriever(self):
-        """Configura o banco de vetores Chroma de forma persistente."""
+        """Configura o banco de vetores Chroma de forma persistente e sincroniza a KB."""
         persist_dir = os.environ.get("RAG_PERSIST_DIR", "./rag_store")
         kb_dir = os.environ.get("RAG_KB_DIR", "./knowledge_base")
 
-        if os.path.exists(persist_dir) and os.path.exists(os.path.join(persist_dir, "chroma.sqlite3")):
-            logger.info("Carregando store de vetores Chroma existente...")
-            vector_store = Chroma(persist_directory=persist_dir, embedding_function=self.embeddings)
-        else:
-            logger.info("Criando nova base de conhecimento...")
-            texts, metadatas = self._load_kb_documents(kb_dir)
-            vector_store = Chroma.from_texts(
-                texts=texts, 
-                embedding=self.embeddings, 
-                metadatas=metadatas, 
-                persist_directory=persist_dir
-            )
-        
-        return vector_store.as_retriever(search_kwargs={"k": 5})
-
-    def _load_kb_documents(self, kb_dir):
-        """Varre o diretório da base de conhecimento por arquivos suportados."""
-        texts, metadatas = [], []
-        if os.path.isdir(kb_dir):
-            for root, _, files in os.walk(kb_dir):
-                for fname in files:
-                    if fname.lower().endswith((".txt", ".md")):
-                        fpath = os.path.join(root, fname)
-                        try:
-                            with open(fpath, "r", encoding="utf-8", errors="ignore") as f:
-                                content = f.read()
-                                if content.strip():
-                                    texts.append(content)
-                                    metadatas.append({"source": fpath})
-                        except Exception as e:
-                            logger.warning(f"Erro ao ler {fpath}: {e}")
+        logger.info("Carregando store de vetores Chroma...")
+        # Identifica o índice no cache de buscas, invalidado a cada sincronização com alterações
+        self.index_id = os.path.abspath(persist_dir)
+        self.vector_store = Chroma(persist_directory=persist_dir, embedding_function=self.embeddings)
+        self.kb_sync = KnowledgeBaseSync(
+            self.vector_store, kb_dir, os.path.join(persist_dir, "kb_manifest.json")
+        )
+
+        if os.environ.get("RAG_SYNC_ON_STARTUP", "true").lower() == "true":
+            self.kb_sync.sync()
         
-        if not texts:
-            logger.warning("KB vazia. Usando placeholder de segurança.")
-            texts = ["Procedimentos padrão: Investigar 404 repetidos e bloquear IPs de SQLi."]
-            metadatas = [{"source": "default_policy"}]
-            
-        return texts, metadatas
+        return self.vector_store.as_retriever(search_kwargs={"k": 5})
+
+    def sync_knowledge_base(self) -> dict:
+        """Reindexa apenas os arquivos novos, alterados ou removidos da base de conhecimento."""
+        counts = self.kb_sync.sync()
+        if counts['added'] or counts['updated'] or counts['removed']:
+            self.retrieval_cache.invalidate(self.index_id)
+        return counts
 
     def process_data_agent(self, state: AgentConfig) -> dict:
         """Filtra logs usando lógica programática (muito mais rápido que LLM)."""
-        logger.info("Iniciando pré-processamento de logs via Regex...")
+        if state.get("cleaned_logs"):
+            # Logs já filtrados durante o upload em streaming
+            return {"cleaned_logs": state["cleaned_logs"]}
         
-        raw_lines = state["raw_logs"].split('\n')
-        suspicious_lines = []
-        
-        # Padrões comuns de ataques e erros
-        patterns = [' 40', ' 50', 'SELECT', 'UNION', 'etc/passwd', 'admin', '../']
+        logger.info("Iniciando pré-processamento de logs via Regex...")
         
-        for line in raw_lines:
-            if any(p in line for p in patterns):
-                suspicious_lines.append(line.strip())
-                
-        cleaned = "\n".join(suspicious_lines)
+        # Regex única compilada: uma passada pelo texto, sem lista intermediária de linhas
+        cleaned = self.log_filter.filter(state["raw_logs"])
         if not cleaned:
-            cleaned = "Nenhuma atividade suspeita detectada."
+            cleaned = NO_SUSPICIOUS_ACTIVITY
             
         return {"cleaned_logs": cleaned}
 
+    def aggregate_data_agent(self, state: AgentConfig) -> dict:
+        """Agrupa as linhas suspeitas por assinatura para que o prompt não cresça com o volume de logs."""
+        cleaned = state["cleaned_logs"]
+        summary = summarize_logs(cleaned)
+        logger.info(
+            f"Agregação: {summary['lines']} linhas em {summary['groups']} assinaturas "
+            f"({len(cleaned)} -> {len(summary['log_summary'])} caracteres)"
+        )
+        return {"log_summary": summary['log_summary'], "top_events": summary['top_events']}
+
     def analysis_data_agent(self, state: AgentConfig) -> dict:
         """Agente analista que utiliza RAG para gerar o relatório final."""
         logger.info("Iniciando análise de ameaças com RAG...")
         
         # Recuperação de contexto
-        unique_errors = list(set([line for line in state['cleaned_logs'].split('\n') if line]))[:5]
-        query = f"Análise de vulnerabilidade e remediação para: {' '.join(unique_errors)}"
-        docs = self.retriever.invoke(query)
-        context = "\n\n".join([f"[Fonte: {d.metadata.get('source')}] {d.page_content}" for d in docs])
+        docs = self._search(self._retrieval_query(state['top_events']))
+        context = self._format_context(docs)
+        report = self._generate_report(state["log_summary"], context)
+
+        return {"retrieved_context": context, "analysis_report": report}
+
+    async def aanalysis_data_agent(self, state: AgentConfig) -> dict:
+        """Versão assíncrona do analista, usada quando o grafo roda com ainvoke."""
+        logger.info("Iniciando análise de ameaças com RAG (async)...")
+        
+        docs = await self._asearch(self._retrieval_query(state['top_events']))
+        context = self._format_context(docs)
+        report = await self._agenerate_report(state["log_summary"], context)
+
+        return {"retrieved_context": context, "analysis_report": report}
+
+    def _search(self, query: str) -> list:
+        # Assinaturas de ataque recorrentes geram a mesma consulta: embedding e busca em cache
+        docs = self.retrieval_cache.search(self.index_id, self.vector_store, query, self._vector_search_kwargs())
+        return self._rerank(query, self._fuse(query, docs))
+
+    async def _asearch(self, query: str) -> list:
+        # Embedding e buscas usam a CPU: fora do event loop
+        return await asyncio.to_thread(self._search, query)
+
+    def _candidates(self) -> int:
+        """Chunks retornados pela busca: com o reranker ativo, mais do que os que entram no contexto."""
+        k = self.retriever.search_kwargs.get('k', 4)
+        return max(k, self.reranker.candidates) if self.reranker.enabled else k
+
+    def _vector_search_kwargs(self) -> dict:
+        """Parâmetros da busca vetorial; na busca híbrida, ela traz mais candidatos para a fusão."""
+        search_kwargs = self.retriever.search_kwargs
+        fetch_k = max(self._candidates(), HYBRID_FETCH_K) if HYBRID_SEARCH else self._candidates()
+        return {**search_kwargs, 'k': fetch_k}
 
+    def _fuse(self, query: str, vector_docs: list) -> list:
+        """Funde por RRF os resultados vetoriais com os da BM25, que acha IPs, CVEs e paths exatos."""
+        if not HYBRID_SEARCH:
+            return vector_docs
+        k = self._candidates()
+        hits = [doc_id for doc_id, _ in self.kb_sync.bm25.search(query, max(k, HYBRID_FETCH_K))]
+
+        # Só os chunks que a busca vetorial não trouxe são lidos do Chroma
+        by_id = {doc.id: doc for doc in vector_docs}
+        missing = [doc_id for doc_id in hits if doc_id not in by_id]
+        if missing:
+            by_id.update({doc.id: doc for doc in self.vector_store.get_by_ids(missing)})
+        return hybrid_merge(vector_docs, [by_id[doc_id] for doc_id in hits if doc_id in by_id], k)
+
+    def _rerank(self, query: str, docs: list) -> list:
+        """Reordena os candidatos e mantém só os que cabem no orçamento de contexto."""
+        vectors = None
+        if self.reranker.mode == "mmr" and len(docs) > 1:
+            # Os embeddings dos chunks já estão no Chroma: nenhuma chamada ao modelo
+            ids = [doc.id for doc in docs]
+            stored = self.vector_store.get(ids=ids, include=["embeddings"])
+            by_id = dict(zip(stored['ids'], stored['embeddings']))
+            if all(doc_id in by_id for doc_id in ids):
+                vectors = [by_id[doc_id] for doc_id in ids]
+        return self.reranker.select(query, docs, vectors)
+
+    @staticmethod
+    def _retrieval_query(top_events: list[str]) -> str:
+        # Eventos mais frequentes primeiro: mesma consulta para os mesmos logs
+        return f"Análise de vulnerabilidade e remediação para: {' '.join(top_events)}"
+
+    @staticmethod
+    def _format_context(docs) -> str:
+        return "\n\n".join([f"[Fonte: {d.metadata.get('source')}] {d.page_content}" for d in docs])
+
+    def _generate_report(self, log_summary: str, context: str) -> str:
+        response = self._report_chain().invoke({"logs": log_summary, "context": context})
+        return response.content
+
+    async def _agenerate_report(self, log_summary: str, context: str) -> str:
+        response = await self._report_chain().ainvoke({"logs": log_summary, "context": context})
+        return response.content
+
+    def _report_chain(self):
         system_prompt = """
         Você é o 'ThreatRAG Sentinel'. Gere um relatório em Markdown com:
         1. Resumo Executivo
@@ -124,23 +193,23 @@ class RAGAgent:
 
         prompt = ChatPromptTemplate.from_messages([
             ("system", system_prompt),
-            ("human", "Logs Suspeitos:\n{logs}\n\nContexto Interno:\n{context}")
+            ("human", "Logs Suspeitos (agrupados por assinatura; [Nx] = ocorrências):\n{logs}\n\nContexto Interno:\n{context}")
         ])
 
-        chain = prompt | self.llm
-        response = chain.invoke({"logs": state["cleaned_logs"], "context": context})
-
-        return {"retrieved_context": context, "analysis_report": response.content}
+        return prompt | self.llm
 
     def _build_graph(self):
         """Constrói a estrutura do LangGraph."""
         workflow = StateGraph(AgentConfig)
         
         workflow.add_node("preprocessor", self.process_data_agent)
-        workflow.add_node("analyst", self.analysis_data_agent)
+        workflow.add_node("aggregator", self.aggregate_data_agent)
+        # invoke usa analysis_data_agent e ainvoke a versão assíncrona; os nós síncronos rodam em threads
+        workflow.add_node("analyst", RunnableLambda(self.analysis_data_agent, afunc=self.aanalysis_data_agent, name="analyst"))
         
         workflow.set_entry_point("preprocessor")
-        workflow.add_edge("preprocessor", "analyst")
+        workflow.add_edge("preprocessor", "aggregator")
+        workflow.add_edge("aggregator", "analyst")
         workflow.add_edge("analyst", END)
         
         return workflow.compile()
@@ -151,6 +220,71 @@ class RAGAgent:
         inputs = {"raw_logs": raw_logs}
         return self.app.invoke(inputs)
 
+    async def aexecute(self, raw_logs: str) -> dict:
+        """Executa o pipeline completo sem bloquear o event loop durante a chamada ao LLM."""
+        logger.info("Executando workflow de análise (async)...")
+        return await self.app.ainvoke({"raw_logs": raw_logs})
+
+    def stream(self, raw_logs: str, stream_mode=("updates", "messages")):
+        """Executa o pipeline produzindo as atualizações de cada nó e os tokens do relatório."""
+        logger.info("Executando workflow de análise em streaming...")
+        yield from self.app.stream({"raw_logs": raw_logs}, stream_mode=list(stream_mode))
+
+    async def astream(self, raw_logs: str, stream_mode=("updates", "messages")):
+        """Versão assíncrona de `stream`."""
+        logger.info("Executando workflow de análise em streaming (async)...")
+        async for item in self.app.astream({"raw_logs": raw_logs}, stream_mode=list(stream_mode)):
+            yield item
+
+    def execute_batch(self, sources: list[str], max_concurrency: int = None):
+        """Analisa vários logs, produzindo (índice, resultado) conforme cada análise termina.
+
+        O pré-processamento roda em paralelo para todos os logs, as consultas ao
+        retriever fora do cache são embedadas em uma única chamada e as chamadas ao LLM são
+        concorrentes, limitadas por `max_concurrency`, que só pode reduzir o
+        limite do gateway de LLM (`LLM_GATEWAY_CONCURRENCY`).
+        Um item com erro produz {'error': ...} sem interromper os demais.
+        """
+        limit = get_gateway().max_concurrency
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError(f"max_concurrency inválido: {max_concurrency}")
+        max_concurrency = min(max_concurrency, limit) if max_concurrency else limit
+        logger.info(f"Executando análise em lote de {len(sources)} logs (concorrência {max_concurrency})...")
+
+        states = preprocess_batch(sources)
+        ready = []
+        for index, state in enumerate(states):
+            if isinstance(state, Exception):
+                yield index, {'error': str(state)}
+            else:
+                ready.append(index)
+        if not ready:
+            return
+
+        queries = [self._retrieval_query(states[i]['top_events']) for i in ready]
+        results = self.retrieval_cache.search_batch(self.index_id, self.vector_store, queries, self._vector_search_kwargs())
+        for index, query, docs in zip(ready, queries, results):
+            states[index]['retrieved_context'] = self._format_context(self._rerank(query, self._fuse(query, docs)))
+
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm") as pool:
+            futures = {
+                pool.submit(self._generate_report, states[i]['log_summary'], states[i]['retrieved_context']): i
+                for i in ready
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    yield index, {**states[index], 'analysis_report': future.result()}
+                except Exception as e:
+                    logger.error(f"Erro na análise do item {index} do lote: {e}")
+                    yield index, {'error': str(e)}
+
+    def execute_filtered(self, cleaned_logs: str) -> dict:
+        """Executa o pipeline a partir de logs já filtrados, sem manter os logs brutos."""
+        logger.info("Executando workflow de análise com logs pré-filtrados...")
+        inputs = {"raw_logs": "", "cleaned_logs": cleaned_logs or NO_SUSPICIOUS_ACTIVITY}
+        return self.app.invoke(inputs)
+
 # # Exemplo de uso
 # if __name__ == "__main__":
 #     agent = RAGAgent()
@@ -0,0 +1,171 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.documents import Document
+
+from log_aggregator import CHARS_PER_TOKEN
+from log import get_logger
+
+logger = get_logger(__name__)
+
+RERANK_MODES = ("none", "mmr", "cross-encoder")
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# "[Fonte: <source>] " e a separação entre os trechos no contexto
+CONTEXT_ENTRY_OVERHEAD = len("[Fonte: ] \n\n")
+
+
+class Reranker:
+    """Segunda etapa da recuperação: reordena os candidatos e corta o contexto no orçamento.
+
+    A busca (vetorial ou híbrida) traz `candidates` chunks; o reranker os
+    reordena e mantém, na nova ordem, até `max_docs` chunks que caibam em
+    `max_tokens`. Modos:
+
+    * `mmr`: Maximal Marginal Relevance. A relevância vem da posição na busca
+      e a redundância da similaridade entre os embeddings dos candidatos, de
+      modo que chunks quase idênticos (sobreposição do chunking) não ocupam o
+      orçamento duas vezes. Não carrega nenhum modelo.
+    * `cross-encoder`: pontua cada par (consulta, chunk) com um cross-encoder
+      local em lotes; as pontuações de consultas repetidas ficam em cache.
+    * `none`: mantém a ordem da busca e só aplica o orçamento.
+    """
+
+    def __init__(
+        self,
+        mode: str = None,
+        candidates: int = None,
+        max_docs: int = None,
+        max_tokens: int = None,
+        mmr_lambda: float = None,
+        model_name: str = None,
+        batch_size: int = None,
+        cache_size: int = 1024,
+    ):
+        self.mode = (mode or os.environ.get("RERANKER", "mmr")).lower()
+        if self.mode not in RERANK_MODES:
+            raise ValueError(f"RERANKER inválido: {self.mode} (opções: {', '.join(RERANK_MODES)})")
+        self.candidates = candidates or int(os.environ.get("RERANK_CANDIDATES", 20))
+        self.max_docs = max_docs or int(os.environ.get("RAG_CONTEXT_MAX_DOCS", 5))
+        self.max_tokens = max_tokens if max_tokens is not None else int(os.environ.get("RAG_CONTEXT_MAX_TOKENS", 800))
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else float(os.environ.get("RERANK_MMR_LAMBDA", 0.7))
+        self.model_name = model_name or os.environ.get("RERANKER_MODEL", CROSS_ENCODER_MODEL)
+        self.batch_size = batch_size or int(os.environ.get("RERANKER_BATCH_SIZE", 32))
+        self.cache_size = cache_size
+
+        self._model = None
+        self._scores = OrderedDict()
+        # O tokenizer do cross-encoder não suporta chamadas concorrentes
+        self._lock = threading.Lock()
+        self.metrics = {'calls': 0, 'candidates': 0, 'kept': 0, 'context_chars': 0, 'rerank_seconds': 0.0}
+        if self.mode == "cross-encoder":
+            # Carregado na inicialização, como o modelo de embeddings
+            self._load_model()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "none"
+
+    def select(self, query: str, docs: list, vectors=None) -> list:
+        """Reordena os candidatos e retorna os que entram no contexto.
+
+        `vectors` são os embeddings dos candidatos, na mesma ordem (usados pelo MMR).
+        """
+        start = time.perf_counter()
+        if self.mode == "cross-encoder":
+            ranked = self._cross_encoder_rank(query, docs)
+        elif self.mode == "mmr" and vectors is not None and len(docs) > 1:
+            ranked = [docs[i] for i in self._mmr_order(np.asarray(vectors, dtype=np.float32))]
+        else:
+            ranked = docs
+        selected = self.fit_budget(ranked)
+
+        with self._lock:
+            self.metrics['calls'] += 1
+            self.metrics['candidates'] += len(docs)
+            self.metrics['kept'] += len(selected)
+            self.metrics['context_chars'] += sum(len(doc.page_content) for doc in selected)
+            self.metrics['rerank_seconds'] += time.perf_counter() - start
+        return selected
+
+    def fit_budget(self, docs: list) -> list:
+        """Mantém, na ordem recebida, até `max_docs` chunks dentro de `max_tokens` (0 desativa o limite de tokens).
+
+        Chunks que não cabem são pulados em favor dos seguintes; se nem o
+        primeiro couber, ele entra truncado.
+        """
+        if not self.max_tokens:
+            return docs[:self.max_docs]
+
+        budget = self.max_tokens * CHARS_PER_TOKEN
+        selected = []
+        for doc in docs:
+            if len(selected) >= self.max_docs:
+                break
+            cost = len(doc.page_content) + len(str(doc.metadata.get('source', ''))) + CONTEXT_ENTRY_OVERHEAD
+            if cost <= budget:
+                selected.append(doc)
+                budget -= cost
+            elif not selected:
+                text = doc.page_content[:max(0, budget - (cost - len(doc.page_content)))]
+                selected.append(Document(id=doc.id, page_content=text, metadata=doc.metadata))
+                break
+        return selected
+
+    def _mmr_order(self, vectors: np.ndarray) -> list[int]:
+        count = len(vectors)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        similarity = vectors @ vectors.T
+        # Relevância pela posição na busca (já fundida com a BM25): 1 para o primeiro, 0 para o último
+        relevance = 1.0 - np.arange(count) / count
+
+        order = [0]
+        remaining = list(range(1, count))
+        while remaining:
+            redundancy = similarity[np.ix_(remaining, order)].max(axis=1)
+            scores = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy
+            order.append(remaining.pop(int(np.argmax(scores))))
+        return order
+
+    def _cross_encoder_rank(self, query: str, docs: list) -> list:
+        key = (" ".join(query.lower().split()), tuple(doc.id or doc.page_content for doc in docs))
+        with self._lock:
+            scores = self._scores.get(key)
+            if scores is not None:
+                self._scores.move_to_end(key)
+            else:
+                scores = self._load_model().predict(
+                    [(query, doc.page_content) for doc in docs], batch_size=self.batch_size, show_progress_bar=False
+                )
+                self._scores[key] = scores
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+        # Ordenação estável: empates mantêm a ordem da busca
+        return [docs[i] for i in sorted(range(len(docs)), key=lambda i: -float(scores[i]))]
+
+    def _load_model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+
+            start = time.perf_counter()
+            self._model = CrossEncoder(self.model_name, device="cpu")
+            logger.info(f"Cross-encoder {self.model_name} carregado em {time.perf_counter() - start:.2f}s")
+        return self._model
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self.metrics)
+        calls = metrics['calls']
+        return {
+            'mode': self.mode,
+            'candidates': self.candidates,
+            'max_docs': self.max_docs,
+            'max_tokens': self.max_tokens,
+            'calls': calls,
+            'avg_candidates': round(metrics['candidates'] / calls, 1) if calls else 0.0,
+            'avg_kept': round(metrics['kept'] / calls, 1) if calls else 0.0,
+            'avg_context_tokens': round(metrics['context_chars'] / CHARS_PER_TOKEN / calls) if calls else 0,
+            'rerank_seconds': round(metrics['rerank_seconds'], 3),
+        }
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+from embeddings import get_embeddings
+from log import get_logger
+
+logger = get_logger(__name__)
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+class RetrievalCache:
+    """Memoização das consultas ao retriever: embedding da consulta e resultado da busca.
+
+    São dois níveis LRU. O embedding depende só do texto da consulta e é
+    compartilhado entre índices; o resultado da busca é guardado por índice
+    (`index_id`), consulta e parâmetros da busca, e pode ser invalidado por
+    índice quando ele muda (ex.: após sincronizar a base de conhecimento).
+    Uma consulta repetida, como a de uma assinatura de ataque recorrente, não
+    passa pelo modelo de embeddings nem pela busca no índice. As consultas são comparadas sem
+    diferenciar maiúsculas e espaços, pois o MiniLM não diferencia maiúsculas.
+    """
+
+    def __init__(self, embeddings, max_queries: int = None, max_results: int = None, enabled: bool = None):
+        self.embeddings = embeddings
+        self.max_queries = max_queries if max_queries is not None else int(os.environ.get("RETRIEVAL_CACHE_MAX_QUERIES", 2048))
+        self.max_results = max_results if max_results is not None else int(os.environ.get("RETRIEVAL_CACHE_MAX_RESULTS", 1024))
+        self.enabled = enabled if enabled is not None else os.environ.get("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+
+        self._vectors = OrderedDict()
+        self._results = OrderedDict()
+        # Geração por índice: uma busca iniciada antes de uma invalidação não é guardada
+        self._generations = {}
+        self._lock = threading.Lock()
+
+        self.metrics = {
+            'embed_hits': 0, 'embed_misses': 0, 'embed_seconds': 0.0,
+            'search_hits': 0, 'search_misses': 0, 'search_seconds': 0.0,
+            'invalidations': 0,
+        }
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def embed_query(self, query: str) -> list[float]:
+        """Embedding da consulta, calculado uma única vez por texto."""
+        key = self._normalize(query)
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is not None:
+                self._vectors.move_to_end(key)
+                self.metrics['embed_hits'] += 1
+                return vector
+
+        start = time.perf_counter()
+        vector = self.embeddings.embed_query(query)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.metrics['embed_misses'] += 1
+            self.metrics['embed_seconds'] += elapsed
+            if self.enabled:
+                self._vectors[key] = vector
+                while len(self._vectors) > self.max_queries:
+                    self._vectors.popitem(last=False)
+        return vector
+
+    def search(self, index_id: str, vectorstore, query: str, search_kwargs: dict) -> list:
+        """Busca por similaridade no `vectorstore`, reaproveitando o resultado de consultas repetidas."""
+        if not self.enabled or index_id is None:
+            return vectorstore.similarity_search_by_vector(self.embeddings.embed_query(query), **search_kwargs)
+
+        return self.search_batch(index_id, vectorstore, [query], search_kwargs)[0]
+
+    def search_batch(self, index_id: str, vectorstore, queries: list[str], search_kwargs: dict) -> list[list]:
+        """Busca várias consultas; as que não estão em cache são embedadas em uma única chamada."""
+        if not self.enabled or index_id is None:
+            vectors = self.embeddings.embed_documents(queries)
+            return [vectorstore.similarity_search_by_vector(vector, **search_kwargs) for vector in vectors]
+
+        params = json.dumps(search_kwargs, sort_keys=True, default=str)
+        keys = [(index_id, self._normalize(query), params) for query in queries]
+        cached = {}
+        vectors = {}
+
+        with self._lock:
+            generation = self._generations.get(index_id, 0)
+            for key in dict.fromkeys(keys):
+                docs = self._results.get(key)
+                if docs is not None:
+                    self._results.move_to_end(key)
+                    self.metrics['search_hits'] += 1
+                    cached[key] = docs
+                elif key[1] in self._vectors:
+                    self._vectors.move_to_end(key[1])
+                    self.metrics['embed_hits'] += 1
+                    vectors[key] = self._vectors[key[1]]
+
+        # Consultas repetidas dentro do lote são embedadas e buscadas uma única vez
+        missing = {key: query for key, query in zip(keys, queries) if key not in cached and key not in vectors}
+        if missing:
+            start = time.perf_counter()
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            elapsed = time.perf_counter() - start
+            vectors.update(zip(missing, embedded))
+            with self._lock:
+                self.metrics['embed_misses'] += len(missing)
+                self.metrics['embed_seconds'] += elapsed
+                for key in missing:
+                    self._vectors[key[1]] = vectors[key]
+                while len(self._vectors) > self.max_queries:
+                    self._vectors.popitem(last=False)
+
+        for key, vector in vectors.items():
+            start = time.perf_counter()
+            docs = vectorstore.similarity_search_by_vector(vector, **search_kwargs)
+            elapsed = time.perf_counter() - start
+            cached[key] = docs
+
+            with self._lock:
+                self.metrics['search_misses'] += 1
+                self.metrics['search_seconds'] += elapsed
+                if self._generations.get(index_id, 0) == generation:
+                    self._results[key] = tuple(docs)
+                    while len(self._results) > self.max_results:
+                        self._results.popitem(last=False)
+        return [list(cached[key]) for key in keys]
+
+    async def asearch(self, index_id: str, vectorstore, query: str, search_kwargs: dict) -> list:
+        # Embedding e busca usam a CPU: fora do event loop
+        return await asyncio.to_thread(self.search, index_id, vectorstore, query, search_kwargs)
+
+    def invalidate(self, index_id: str = None) -> int:
+        """Descarta os resultados de busca de um índice, ou de todos, e retorna quantos foram removidos."""
+        with self._lock:
+            keys = [key for key in self._results if index_id is None or key[0] == index_id]
+            for key in keys:
+                del self._results[key]
+            for generation_id in ([index_id] if index_id is not None else list(self._generations)):
+                self._generations[generation_id] = self._generations.get(generation_id, 0) + 1
+            self.metrics['invalidations'] += 1
+
+        logger.info(f"Cache de buscas invalidado ({index_id[:12] if index_id else 'todos'}): {len(keys)} entradas")
+        return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self.metrics)
+            embed_lookups = metrics['embed_hits'] + metrics['embed_misses']
+            search_lookups = metrics['search_hits'] + metrics['search_misses']
+            return {
+                'enabled': self.enabled,
+                'queries': len(self._vectors),
+                'results': len(self._results),
+                'max_queries': self.max_queries,
+                'max_results': self.max_results,
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in metrics.items()},
+                'embed_hit_rate': round(metrics['embed_hits'] / embed_lookups, 3) if embed_lookups else 0.0,
+                'search_hit_rate': round(metrics['search_hits'] / search_lookups, 3) if search_lookups else 0.0,
+            }
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """Retorna o cache de buscas do processo, criando-o na primeira chamada."""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = RetrievalCache(get_embeddings())
+    return _instance
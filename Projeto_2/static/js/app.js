@@ -10,6 +10,8 @@ const elements = {
     logInput: document.getElementById('logInput'),
     analyzeBtn: document.getElementById('analyzeBtn'),
     loadSampleBtn: document.getElementById('loadSampleBtn'),
+    uploadLogBtn: document.getElementById('uploadLogBtn'),
+    logFileInput: document.getElementById('logFileInput'),
     charCount: document.getElementById('charCount'),
     resultsSection: document.getElementById('resultsSection'),
     cleanedLogs: document.getElementById('cleanedLogs'),
@@ -149,7 +151,7 @@ async function analyzeLogs() {
     elements.analyzeBtn.disabled = true;
     
     try {
-        const response = await fetch('/api/analyze', {
+        const response = await fetch('/api/analyze/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -157,13 +159,32 @@ async function analyzeLogs() {
             body: JSON.stringify({ logs })
         });
         
-        const data = await response.json();
-        
         if (!response.ok) {
+            const data = await response.json();
             throw new Error(data.error || 'Analysis failed');
         }
         
-        displayResults(data.results);
+        // Render the report incrementally as tokens arrive
+        let report = '';
+        let streamError = null;
+        await readServerSentEvents(response, (event, data) => {
+            if (event === 'summary') {
+                elements.loadingOverlay.style.display = 'none';
+                showPartialResults(data);
+            } else if (event === 'token') {
+                report += data.content;
+                elements.analysisReport.innerHTML = parseMarkdown(report);
+            } else if (event === 'done') {
+                displayResults(data.results);
+            } else if (event === 'error') {
+                streamError = data.error;
+            }
+        });
+        
+        if (streamError) {
+            throw new Error(streamError);
+        }
+        
         updateStats();
         toast.show('Analysis completed successfully', 'success');
         
@@ -177,6 +198,91 @@ async function analyzeLogs() {
     }
 }
 
+async function analyzeLogFile(file) {
+    if (state.isAnalyzing) {
+        toast.show('Analysis already in progress', 'warning');
+        return;
+    }
+    
+    state.isAnalyzing = true;
+    elements.loadingOverlay.style.display = 'flex';
+    elements.analyzeBtn.disabled = true;
+    
+    try {
+        // The file is sent as the raw body and filtered server-side as it arrives
+        const response = await fetch('/api/analyze/upload', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/octet-stream'
+            },
+            body: file
+        });
+        
+        const data = await response.json();
+        
+        if (!response.ok) {
+            throw new Error(data.error || 'Analysis failed');
+        }
+        
+        displayResults(data.results);
+        updateStats();
+        
+        const { lines, suspicious_lines, truncated } = data.stats;
+        toast.show(
+            `Analyzed ${lines.toLocaleString()} lines, ${suspicious_lines.toLocaleString()} suspicious${truncated ? ' (truncated)' : ''}`,
+            'success'
+        );
+        
+    } catch (error) {
+        console.error('Upload analysis error:', error);
+        toast.show(error.message || 'Failed to analyze log file', 'error');
+    } finally {
+        state.isAnalyzing = false;
+        elements.loadingOverlay.style.display = 'none';
+        elements.analyzeBtn.disabled = false;
+        elements.logFileInput.value = '';
+    }
+}
+
+// Read a Server-Sent Events stream from a fetch response
+async function readServerSentEvents(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
+function showPartialResults(summary) {
+    // Filtered logs are ready before the report: show them while the LLM streams
+    elements.resultsSection.style.display = 'block';
+    elements.cleanedLogs.textContent = summary.cleaned_logs || 'No suspicious activity detected.';
+    elements.analysisReport.innerHTML = '';
+    elements.retrievedContext.textContent = '';
+    
+    setTimeout(() => {
+        elements.resultsSection.scrollIntoView({ behavior: 'smooth', block: 'start' });
+    }, 100);
+}
+
 function displayResults(results) {
     // Show results section
     elements.resultsSection.style.display = 'block';
@@ -259,6 +365,12 @@ function toggleContext() {
 // Event Listeners
 elements.analyzeBtn.addEventListener('click', analyzeLogs);
 elements.loadSampleBtn.addEventListener('click', loadSampleLogs);
+elements.uploadLogBtn.addEventListener('click', () => elements.logFileInput.click());
+elements.logFileInput.addEventListener('change', () => {
+    if (elements.logFileInput.files.length) {
+        analyzeLogFile(elements.logFileInput.files[0]);
+    }
+});
 elements.logInput.addEventListener('input', updateCharCount);
 elements.copyReportBtn.addEventListener('click', copyReport);
 elements.downloadReportBtn.addEventListener('click', downloadReportBtn);
@@ -302,6 +414,7 @@ window.app = {
     elements,
     toast,
     analyzeLogs,
+    analyzeLogFile,
     loadSampleLogs,
     checkHealth
 };
@@ -0,0 +1,68 @@
+import json
+import time
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def sse(event: str, data: dict) -> str:
+    """Formata um evento Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class AnalysisStream:
+    """Converte o stream do grafo de análise em eventos SSE.
+
+    Produz `stage` ao fim de cada nó, `summary` com os logs filtrados e o
+    resumo agregado assim que ficam prontos, `token` para cada pedaço do
+    relatório gerado pelo analista e `done` com o contexto e o relatório
+    completo. Mede e registra o tempo até o primeiro token do relatório.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.ttft = None
+        self.results = {}
+
+    def events(self, mode: str, payload) -> list[str]:
+        """Eventos SSE para um item de `RAGAgent.stream` ("updates" traz a saída de cada nó e "messages" os tokens)."""
+        if mode == "updates":
+            events = []
+            for node, update in payload.items():
+                self.results.update(update or {})
+                events.append(sse('stage', {'node': node, 'elapsed_ms': self._elapsed_ms()}))
+                if node == 'aggregator':
+                    events.append(sse('summary', {
+                        'cleaned_logs': self.results.get('cleaned_logs', ''),
+                        'log_summary': self.results.get('log_summary', ''),
+                    }))
+            return events
+
+        chunk, metadata = payload
+        if metadata.get('langgraph_node') != 'analyst' or not isinstance(chunk.content, str) or not chunk.content:
+            return []
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.start
+            logger.info(f"Primeiro token do relatório em {self.ttft:.3f}s")
+        return [sse('token', {'content': chunk.content})]
+
+    def done(self) -> str:
+        elapsed = time.perf_counter() - self.start
+        ttft = f"{self.ttft:.3f}s" if self.ttft is not None else "n/d"
+        logger.info(f"Análise em streaming concluída: primeiro token {ttft}, total {elapsed:.3f}s")
+        return sse('done', {
+            'results': {
+                'cleaned_logs': self.results.get('cleaned_logs', ''),
+                'log_summary': self.results.get('log_summary', ''),
+                'retrieved_context': self.results.get('retrieved_context', ''),
+                'analysis_report': self.results.get('analysis_report', ''),
+            },
+            'ttft_ms': round(self.ttft * 1000) if self.ttft is not None else None,
+            'total_ms': round(elapsed * 1000),
+        })
+
+    def _elapsed_ms(self) -> int:
+        return round((time.perf_counter() - self.start) * 1000)
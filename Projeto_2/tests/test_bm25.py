@@ -0,0 +1,58 @@
+from langchain_core.documents import Document
+
+from bm25 import BM25Index, hybrid_merge, reciprocal_rank_fusion, tokenize
+
+LINES = {
+    'passwd': '203.0.113.7 GET /static/../../etc/passwd 404',
+    'log4j': 'Tentativa de exploração da CVE-2021-44228 (log4j) via user-agent',
+    'login': '198.51.100.2 POST /login 401 senha incorreta',
+}
+
+
+def build_index() -> BM25Index:
+    return BM25Index.from_documents(list(LINES), list(LINES.values()), sources=["a.log", "a.log", "b.log"])
+
+
+def test_tokenize_keeps_ips_and_cves_whole():
+    tokens = tokenize("Acesso de 203.0.113.7 à CVE-2021-44228")
+    assert "203.0.113.7" in tokens
+    assert "cve-2021-44228" in tokens
+    assert {"203", "113", "cve", "44228"} <= set(tokens)
+
+
+def test_exact_terms_are_found():
+    index = build_index()
+    assert [doc_id for doc_id, _ in index.search("cve-2021-44228", k=3)] == ["log4j"]
+    assert [doc_id for doc_id, _ in index.search("etc/passwd", k=3)] == ["passwd"]
+    assert index.search("inexistente", k=3) == []
+
+
+def test_allowed_delete_and_delete_source():
+    index = build_index()
+    assert [doc_id for doc_id, _ in index.search("203.0.113.7 401", k=3, allowed={"login"})] == ["login"]
+
+    index.delete_source("a.log")
+    assert len(index) == 1
+    assert index.search("cve-2021-44228", k=3) == []
+    index.delete(["login"])
+    assert index.search("login", k=3) == []
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    index = build_index()
+    path = str(tmp_path / "bm25.json")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.search("203.0.113.7 passwd", k=3) == index.search("203.0.113.7 passwd", k=3)
+
+
+def test_reciprocal_rank_fusion():
+    # c: 1/63 + 1/61 > b: 2/62 > a: 1/61 > d: 1/63
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"]]) == ["c", "b", "a", "d"]
+    assert reciprocal_rank_fusion([["a", "c"], ["c", "a"]]) == ["a", "c"]
+
+
+def test_hybrid_merge_uses_content_when_id_is_missing():
+    vector = [Document(page_content="um"), Document(page_content="dois")]
+    lexical = [Document(page_content="dois"), Document(page_content="três")]
+    assert [doc.page_content for doc in hybrid_merge(vector, lexical, k=3)] == ["dois", "um", "três"]
@@ -0,0 +1,78 @@
+import pytest
+
+from log_aggregator import LogAggregator, path_template, summarize_logs
+from log_filter import NO_SUSPICIOUS_ACTIVITY
+
+
+def clf(ip: str, path: str, status: int = 404, second: int = 0, method: str = "GET") -> str:
+    return f'{ip} - - [10/Oct/2024:13:55:{second:02d} +0000] "{method} {path} HTTP/1.1" {status} 512'
+
+
+@pytest.mark.parametrize("path, template", [
+    ("/users/123/orders", "/users/{num}/orders"),
+    ("/files/3f2a9c1e4b5d6a7f", "/files/{id}"),
+    ("/s/550e8400-e29b-41d4-a716-446655440000", "/s/{id}"),
+    ("/backup2024.zip", "/backup{n}.zip"),
+    ("/search?q=a&page=2&q=b", "/search?page=*&q=*"),
+])
+def test_path_template(path, template):
+    assert path_template(path) == template
+
+
+def test_groups_by_signature_with_time_window():
+    aggregator = LogAggregator(max_tokens=1000)
+    for second in (30, 10, 20):
+        aggregator.add(clf("203.0.113.7", f"/users/{second}", second=second))
+    aggregator.add(clf("203.0.113.7", "/users/1", status=500))
+    aggregator.add(clf("198.51.100.2", "/users/1"))
+
+    ranked = aggregator.ranked()
+    assert aggregator.lines == 5
+    assert len(ranked) == 3
+    top = ranked[0]
+    assert top.signature == ("203.0.113.7", "GET", "/users/{num}", 404)
+    assert top.count == 3
+    assert top.first_seen.startswith("10/Oct/2024:13:55:10")
+    assert top.last_seen.startswith("10/Oct/2024:13:55:30")
+    assert top.describe().startswith("[3x] 203.0.113.7 GET /users/{num} -> 404 | ")
+
+
+def test_non_clf_lines_group_by_normalized_text():
+    aggregator = LogAggregator(max_tokens=1000)
+    aggregator.add_text("erro no worker 1\nerro no worker 2\n\nfalha de disco")
+    assert aggregator.lines == 3
+    assert aggregator.ranked()[0].describe() == "[2x] erro no worker 1"
+
+
+def test_summary_rolls_up_scanner_paths_to_fit_budget():
+    aggregator = LogAggregator(max_tokens=80)
+    for i in range(200):
+        aggregator.add(clf("203.0.113.7", f"/probe-{chr(97 + i % 26)}{chr(97 + i // 26)}.php"))
+    aggregator.add(clf("198.51.100.2", "/login", status=401, method="POST"))
+
+    summary = aggregator.summary()
+    assert len(summary) <= 80 * 4
+    assert "[200x] 203.0.113.7 GET (200 paths distintos) -> 404" in summary
+    assert "[1x] 198.51.100.2 POST /login -> 401" in summary
+    assert "omitidas" not in summary
+    assert summary.startswith("201 linhas suspeitas agrupadas em 201 assinaturas")
+
+
+def test_summary_reports_omitted_entries():
+    aggregator = LogAggregator(max_tokens=40)
+    for i in range(20):
+        aggregator.add(clf(f"10.0.0.{i}", "/admin", status=403))
+    summary = aggregator.summary()
+    assert "entradas omitidas" in summary
+    assert summary.count("[1x]") < 20
+
+
+def test_summarize_logs():
+    assert summarize_logs(NO_SUSPICIOUS_ACTIVITY) == {
+        'log_summary': NO_SUSPICIOUS_ACTIVITY, 'top_events': [], 'lines': 0, 'groups': 0,
+    }
+    lines = [clf("203.0.113.7", "/wp-admin/"), clf("203.0.113.7", "/wp-admin/")]
+    result = summarize_logs("\n".join(lines), max_tokens=500)
+    assert result['lines'] == 2
+    assert result['groups'] == 1
+    assert result['top_events'] == [lines[0]]
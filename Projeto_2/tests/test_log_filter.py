@@ -0,0 +1,110 @@
+import gzip
+import io
+
+import pytest
+
+from log_filter import LogFilter, iter_text_blocks, parse_line
+
+REFERER_UA = '"https://shop.example.com/admin/?q=union select" "Mozilla/5.0 (select; admin)"'
+
+
+def clf(path: str, status: int = 200, extra: str = "") -> str:
+    line = f'203.0.113.7 - - [10/Oct/2024:13:55:36 +0000] "GET {path} HTTP/1.1" {status} 4051'
+    return f"{line} {extra}" if extra else line
+
+
+@pytest.fixture
+def log_filter():
+    return LogFilter()
+
+
+@pytest.mark.parametrize("path", [
+    "/selected-items",
+    "/administrator-guide.pdf",
+    "/union-station/tickets",
+    "/reunion-selection.html",
+    "/products?sort=select",
+    "/wp-administrators-club",
+])
+def test_benign_paths_are_not_flagged(log_filter, path):
+    assert not log_filter.is_suspicious(clf(path))
+
+
+def test_referer_and_user_agent_are_ignored(log_filter):
+    assert not log_filter.is_suspicious(clf("/selected-items", extra=REFERER_UA))
+
+
+@pytest.mark.parametrize("path", [
+    "/items?id=1 UNION SELECT password FROM users",
+    "/items?id=1+UNION+ALL+SELECT+1,2",
+    "/items?id=1%20union%20select%201",
+    "/items?id=1/**/UNION/**/SELECT/**/1",
+    "/search?q=select+*+from+users",
+    "/wp-admin/admin-ajax.php",
+    "/admin",
+    "/admin/users?page=2",
+    "/static/../../etc/passwd",
+    "/static/%2e%2e%2fconfig",
+])
+def test_attacks_in_path_are_flagged(log_filter, path):
+    assert log_filter.is_suspicious(clf(path))
+
+
+def test_error_status_is_flagged_but_not_size_or_time(log_filter):
+    assert log_filter.is_suspicious(clf("/missing", status=404))
+    assert log_filter.is_suspicious(clf("/api", status=503))
+    # " 40"/" 50" em tamanhos e horários não são status de erro
+    line = '198.51.100.2 - - [10/Oct/2024:13:40:50 +0000] "GET /index.html HTTP/1.1" 200 40500'
+    assert not log_filter.is_suspicious(line)
+
+
+def test_non_clf_lines_fall_back_to_whole_line(log_filter):
+    assert log_filter.is_suspicious("app error: SELECT * FROM users WHERE id = 1")
+    assert not log_filter.is_suspicious("app info: selected items rendered")
+
+
+def test_filter_keeps_only_suspicious_lines_in_order(log_filter):
+    lines = [clf("/ok"), clf("/missing", status=404), clf("/selected-items"), clf("/wp-admin/")]
+    assert log_filter.filter("\n".join(lines)).splitlines() == [lines[1], lines[3]]
+
+
+def test_stream_matches_whole_text_across_block_boundaries(log_filter):
+    lines = [clf(f"/page/{i}", status=404 if i % 3 == 0 else 200) for i in range(50)]
+    text = "\n".join(lines) + "\n"
+    blocks = [text[i:i + 37] for i in range(0, len(text), 37)]
+    assert list(log_filter.iter_suspicious_stream(blocks)) == list(log_filter.iter_suspicious(text))
+
+
+def test_lowercase_blocks_match_whole_text(log_filter, monkeypatch):
+    lines = [clf(f"/p{i}", status=404 if i % 4 == 0 else 200) for i in range(30)]
+    lines[7] = clf("/İstanbul/../../etc/passwd")
+    text = "\n".join(lines)
+    expected = list(log_filter.iter_suspicious(text))
+    monkeypatch.setattr("log_filter.LOWERCASE_BLOCK_SIZE", 50)
+    assert list(log_filter.iter_suspicious(text)) == expected
+    assert lines[7] in expected
+
+
+def test_filter_stream_reads_gzip_and_truncates(log_filter):
+    text = "\n".join(clf(f"/x{i}", status=500) for i in range(10)) + "\n"
+    stream = io.BytesIO(gzip.compress(text.encode()))
+    cleaned, stats = log_filter.filter_stream(stream, max_lines=3, block_size=64)
+    assert len(cleaned.splitlines()) == 3
+    assert stats['lines'] == 10
+    assert stats['suspicious_lines'] == 10
+    assert stats['truncated'] is True
+
+
+def test_iter_text_blocks_handles_concatenated_gzip_members():
+    data = gzip.compress(b"first\n") + gzip.compress("segundo ção\n".encode())
+    assert "".join(iter_text_blocks(io.BytesIO(data), block_size=4)) == "first\nsegundo ção\n"
+
+
+def test_parse_line_extracts_fields():
+    fields = parse_line(clf("/login?user=a b", status=401, extra='"-" "curl/8.0"'))
+    assert fields['ip'] == "203.0.113.7"
+    assert fields['method'] == "GET"
+    assert fields['path'] == "/login?user=a b"
+    assert fields['status'] == 401
+    assert fields['user_agent'] == "curl/8.0"
+    assert parse_line("not a log line") is None
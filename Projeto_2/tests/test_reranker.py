@@ -0,0 +1,66 @@
+import pytest
+from langchain_core.documents import Document
+
+from reranker import CONTEXT_ENTRY_OVERHEAD, Reranker
+
+
+def doc(doc_id: str, size: int, source: str = "") -> Document:
+    metadata = {'source': source} if source else {}
+    return Document(id=doc_id, page_content=doc_id[0] * size, metadata=metadata)
+
+
+def reranker(mode: str = "none", max_docs: int = 5, max_tokens: int = 25) -> Reranker:
+    # max_tokens=25 equivale a 100 caracteres de contexto
+    return Reranker(mode=mode, candidates=20, max_docs=max_docs, max_tokens=max_tokens, mmr_lambda=0.7)
+
+
+def test_fit_budget_skips_chunks_that_do_not_fit():
+    docs = [doc("a", 40), doc("b", 60), doc("c", 30)]
+    # a: 40 + 12 = 52; b (72) não cabe nos 48 restantes; c: 42 cabe
+    assert CONTEXT_ENTRY_OVERHEAD == 12
+    assert [d.id for d in reranker().fit_budget(docs)] == ["a", "c"]
+
+
+def test_fit_budget_counts_source_name():
+    docs = [doc("a", 40, source="x" * 30), doc("c", 30)]
+    # a: 40 + 30 + 12 = 82; c (42) não cabe nos 18 restantes
+    assert [d.id for d in reranker().fit_budget(docs)] == ["a"]
+
+
+def test_fit_budget_truncates_first_chunk_when_nothing_fits():
+    docs = [doc("a", 200), doc("b", 10)]
+    selected = reranker().fit_budget(docs)
+    assert len(selected) == 1
+    assert selected[0].id == "a"
+    assert len(selected[0].page_content) == 100 - CONTEXT_ENTRY_OVERHEAD
+
+
+def test_fit_budget_respects_max_docs():
+    docs = [doc(f"{i}", 1) for i in range(10)]
+    assert [d.id for d in reranker(max_docs=3).fit_budget(docs)] == ["0", "1", "2"]
+
+
+def test_fit_budget_without_token_limit():
+    docs = [doc("a", 1000), doc("b", 1000), doc("c", 1000)]
+    assert [d.id for d in reranker(max_docs=2, max_tokens=0).fit_budget(docs)] == ["a", "b"]
+
+
+def test_mmr_pushes_near_duplicates_down():
+    docs = [doc("a", 10), doc("b", 10), doc("c", 10)]
+    vectors = [[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]]
+    selected = reranker(mode="mmr", max_tokens=0).select("consulta", docs, vectors)
+    assert [d.id for d in selected] == ["a", "c", "b"]
+
+
+def test_select_without_vectors_keeps_search_order_and_counts_metrics():
+    docs = [doc("a", 40), doc("b", 60), doc("c", 30)]
+    instance = reranker(mode="mmr")
+    assert [d.id for d in instance.select("consulta", docs)] == ["a", "c"]
+    assert instance.metrics['candidates'] == 3
+    assert instance.metrics['kept'] == 2
+    assert instance.metrics['context_chars'] == 70
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        Reranker(mode="bm25")